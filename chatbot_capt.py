@@ -5,20 +5,714 @@ Production-ready chatbot for captain registration support.
 Supports: Arabic, English, Arabizi
 """
 
+import json
+import os
 import re
-from typing import Optional, Dict, List
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate, zip_longest
+from json.encoder import encode_basestring as _json_string
+from string import Formatter
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple, Union
 from dataclasses import dataclass
 from datetime import datetime
+from time import monotonic, perf_counter
+
+
+# ============================================
+# LRU CACHE
+# ============================================
+
+class LRUCache:
+    """
+    Size-bounded LRU cache with hit/miss/eviction counters.
+    
+    Bounded both by entry count and by an estimated memory budget
+    (sys.getsizeof of key and value plus a fixed per-entry overhead).
+    
+    Safe to share between threads, with or without the GIL: get() is
+    lock-free (two OrderedDict operations, a concurrent eviction just
+    turns it into a miss) and put()/clear() hold a lock so the byte
+    accounting stays exact. Hit/miss counters may drift under races.
+    """
+    
+    # Approximate cost of one OrderedDict slot and its linked-list node
+    ENTRY_OVERHEAD = 100
+    
+    def __init__(self, max_entries: int = 4096, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict = OrderedDict()
+        self._sizes: Dict = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key, default=None):
+        """Return the cached value (marking it recently used) or default."""
+        try:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+    
+    def put(self, key, value, size: Optional[int] = None) -> None:
+        """
+        Insert a value, evicting least recently used entries if over budget.
+        
+        size overrides the sys.getsizeof estimate of the value (for values
+        that own more memory than their shallow size).
+        """
+        if self.max_entries <= 0:
+            return
+        size = sys.getsizeof(key) + (sys.getsizeof(value) if size is None else size) + self.ENTRY_OVERHEAD
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self.bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                old_key, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every entry (counted as an invalidation if any were held)."""
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+    
+    def stats(self) -> Dict:
+        """Counters for sizing the cache from production metrics."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'bytes': self.bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
 
 
 # ============================================
 # BAD WORDS FILTER
 # ============================================
 
+# Characters dropped before moderation: Arabic diacritics (tashkeel),
+# Quranic annotation marks, superscript alef and tatweel (ـ)
+ARABIC_DELETIONS = (
+    [chr(c) for c in range(0x0610, 0x061B)]
+    + [chr(c) for c in range(0x064B, 0x0660)]
+    + ['\u0670', '\u0640']
+    + [chr(c) for c in range(0x06D6, 0x06EE)]
+)
+# One-to-one letter folds: alef/hamza forms, alef maqsura, ta marbuta,
+# Persian kaf/ya
+ARABIC_FOLDS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ی': 'ي',
+    'ؤ': 'و', 'ة': 'ه', 'ک': 'ك',
+}
+NORMALIZATION_TABLE = str.maketrans(
+    {**ARABIC_FOLDS, **dict.fromkeys(ARABIC_DELETIONS)}
+)
+_DELETED_CHARS = re.compile('[' + ''.join(re.escape(c) for c in ARABIC_DELETIONS) + ']')
+_NORMALIZABLE_CHARS = re.compile(
+    '[' + ''.join(re.escape(chr(c)) for c in NORMALIZATION_TABLE) + ']'
+)
+# Arabizi digits with an unambiguous Latin spelling ('7mar' == 'hmar');
+# 2 and 3 (hamza/ayn) are left alone because they are dropped or vowelled
+# inconsistently and would collide with ordinary names.
+ARABIZI_DIGITS = {'5': ('kh',), '6': ('t',), '7': ('h',), '8': ('gh',)}
+# Latin spellings that are ordinary words and must not become bad words
+ARABIZI_EXCEPTIONS = {'aha'}
+
+
+def _fold(match: re.Match) -> str:
+    return NORMALIZATION_TABLE[ord(match.group())] or ''
+
+
+def normalize_for_matching(text: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    Canonicalize text for moderation in one pass over NORMALIZATION_TABLE.
+    
+    The table is applied through a character-class regex rather than
+    str.translate, which does a dict lookup for every character and is
+    several times slower on messages where few characters need folding.
+
+    Returns (canonical, shifts). shifts is None when no characters were
+    deleted (offsets are unchanged); otherwise pass it to
+    original_offset() to map canonical offsets back to the input.
+    """
+    canonical = _NORMALIZABLE_CHARS.sub(_fold, text)
+    if len(canonical) == len(text):
+        return canonical, None
+    # Canonical index of the kept character following each deletion
+    return canonical, [
+        match.start() - i for i, match in enumerate(_DELETED_CHARS.finditer(text))
+    ]
+
+
+def original_offset(offset: int, shifts: Optional[List[int]]) -> int:
+    """Map a canonical offset back to the original text."""
+    return offset if shifts is None else offset + bisect_right(shifts, offset)
+
+
+class BadWordMatcher:
+    """
+    Single-pass matcher over an ordered bad-word list.
+
+    All words are folded into one trie-shaped regex, so a text is scanned
+    once from left to right regardless of how many words are configured.
+    Masking reproduces the legacy per-word ``pattern.sub`` loop exactly:
+    words earlier in the list win when two hits overlap.
+    
+    With normalize=True the text is first canonicalized by
+    normalize_for_matching() (diacritics and tatweel removed, letter
+    variants folded), elongated letters match any run length ('shiiit'),
+    and Arabizi digits also match their Latin spelling ('hmar'). Hits are
+    mapped back to offsets in the original text, and overlapping hits are
+    resolved leftmost-first instead of by list order.
+    """
+
+    MASK = '***'
+
+    def __init__(self, words: List[str], normalize: bool = False):
+        self.normalize = normalize
+        self.words = self._prune(words)
+        if normalize:
+            trie = self._build_trie(
+                self._run_lengths(variant)
+                for word in self.words for variant in self._variants(word)
+            )
+        else:
+            trie = self._build_trie(((char, 0) for char in word.lower()) for word in self.words)
+        body = self._trie_pattern(trie)
+        flags = re.IGNORECASE | re.UNICODE
+        # Plain form for existence checks, lookahead form to report the
+        # longest hit at every start position (including overlapping ones).
+        # Normalized matching resolves overlaps leftmost-first, which is
+        # what a plain finditer already does, so one pattern serves both.
+        self._search = self._finditer = None
+        if body and normalize:
+            pattern = re.compile(rf'\b({body})\b', flags)
+            self._search, self._finditer = pattern.search, pattern.finditer
+        elif body:
+            self._search = re.compile(rf'\b(?:{body})\b', flags).search
+            self._finditer = re.compile(rf'(?=\b({body})\b)', flags).finditer
+        # Words that start or end with a non-word character change how
+        # ``\b`` behaves next to a mask, so those lists use the legacy loop.
+        self._exact = not normalize and all(
+            re.match(r'\w', word) and re.search(r'\w$', word) for word in self.words
+        )
+        self._legacy = None
+
+    @staticmethod
+    def _prune(words: List[str]) -> List[str]:
+        """
+        Drop duplicates and words that can never match as a whole.
+
+        A word that contains an earlier word at word boundaries is always
+        partially masked by that earlier word first, so it is unreachable.
+        """
+        kept, seen = [], set()
+        for word in words:
+            key = word.lower()
+            if not key or key in seen:
+                continue
+            # Only multi-token words can contain another word at boundaries.
+            bounds = [m.start() for m in re.finditer(r'\b', key)]
+            if any(
+                key[i:j] in seen
+                for i in bounds for j in bounds if i < j and (i, j) != (0, len(key))
+            ):
+                continue
+            seen.add(key)
+            kept.append(word)
+        return kept
+
+    @staticmethod
+    def _variants(word: str) -> List[str]:
+        """The canonical word plus its Arabizi digit-to-letter spellings."""
+        variants = [word.lower().translate(NORMALIZATION_TABLE)]
+        for digit, spellings in ARABIZI_DIGITS.items():
+            if digit in variants[0]:
+                variants += [v.replace(digit, s) for v in variants for s in spellings]
+        return [v for v in variants if v not in ARABIZI_EXCEPTIONS]
+
+    @staticmethod
+    def _run_lengths(word: str) -> List[Tuple[str, int]]:
+        """Run-length encode a word: 'ass' -> [('a', 1), ('s', 2)]."""
+        return [(match.group(1), len(match.group(0))) for match in re.finditer(r'(.)\1*', word, re.S)]
+
+    @staticmethod
+    def _build_trie(words: Iterable[Iterable[Tuple[str, int]]]) -> Dict:
+        """
+        Build a trie keyed by (char, run) pairs.
+        
+        run is 0 for an exact character, or the minimum repeat count of
+        an elongatable letter run.
+        """
+        trie: Dict = {}
+        for word in words:
+            node = trie
+            for key in word:
+                node = node.setdefault(key, {})
+            node[''] = {}
+        return trie
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict) -> str:
+        """Render a trie as a regex that prefers the longest continuation."""
+        terminal = '' in node
+        branches = []
+        # Longer minimum runs first so 'ss+' is tried before 's+'
+        for key in sorted((k for k in node if k), key=lambda k: (k[0], -k[1])):
+            char, run = key
+            atom = re.escape(char)
+            if run == 1:
+                atom += '+'
+            elif run > 1:
+                atom = f'{atom}{{{run},}}'
+            branches.append(atom + cls._trie_pattern(node[key]))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            return body + '?' if len(branches) == 1 and len(branches[0]) == 1 else f'(?:{body})?'
+        return body
+
+    def _legacy_patterns(self) -> List[re.Pattern]:
+        if self._legacy is None:
+            self._legacy = [
+                re.compile(rf'\b{re.escape(word)}\b', re.IGNORECASE | re.UNICODE)
+                for word in self.words
+            ]
+        return self._legacy
+
+    def _legacy_mask(self, text: str) -> str:
+        for pattern in self._legacy_patterns():
+            text = pattern.sub(self.MASK, text)
+        return text
+
+    def _normalized_spans(self, text: str) -> List[tuple]:
+        """Non-overlapping hit spans (original offsets) on the canonical text."""
+        canonical, shifts = normalize_for_matching(text)
+        if shifts is None:
+            return [match.span() for match in self._finditer(canonical)]
+        return [
+            (original_offset(match.start(), shifts), original_offset(match.end(), shifts))
+            for match in self._finditer(canonical)
+        ]
+
+    def spans(self, text: str) -> Optional[List[tuple]]:
+        """
+        Return the (start, end) spans the legacy loop would mask.
+
+        Returns None when hits overlap, in which case only the sequential
+        per-word loop reproduces the legacy result.
+        """
+        spans = []
+        if self._finditer is None:
+            return spans
+        if self.normalize:
+            return self._normalized_spans(text)
+        last_end = -1
+        for match in self._finditer(text):
+            start, end = match.span(1)
+            if start < last_end:
+                return None
+            spans.append((start, end))
+            last_end = end
+        return spans
+
+    def mask(self, text: str) -> str:
+        """Replace every hit with the mask in a single output build."""
+        if self.normalize:
+            spans = self.spans(text)
+            if not spans:
+                return text
+        elif not self.search(text):
+            return text
+        else:
+            spans = self.spans(text) if self._exact else None
+            if spans is None:
+                return self._legacy_mask(text)
+        parts = []
+        last = 0
+        for start, end in spans:
+            parts.append(text[last:start])
+            parts.append(self.MASK)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def search(self, text: str) -> bool:
+        """Return True if any word occurs in the text."""
+        if self._search is None:
+            return False
+        if self.normalize:
+            text = normalize_for_matching(text)[0]
+        return self._search(text) is not None
+    
+    def find(self, text: str) -> List[str]:
+        """Return every hit as it appears in the text (longest per position)."""
+        if self._finditer is None:
+            return []
+        if self.normalize:
+            return [text[start:end] for start, end in self._normalized_spans(text)]
+        return [match.group(1) for match in self._finditer(text)]
+
+
+# Invisible characters inserted to split words: zero-width space/joiners,
+# word joiner, BOM, soft hyphen, plus everything normalization deletes
+INVISIBLE_CHARS = frozenset(['\u200b', '\u200c', '\u200d', '\u2060', '\ufeff', '\u00ad', *ARABIC_DELETIONS])
+# Look-alike characters and the letters they may stand for. Digits keep
+# themselves as a candidate because Arabizi words are spelled with them.
+CONFUSABLES = {
+    '0': ('0', 'o'), '1': ('1', 'i', 'l'), '3': ('3', 'e'), '4': ('4', 'a'),
+    '5': ('5', 's'), '7': ('7', 't'),
+    '@': ('a',), '$': ('s',), '!': ('i',), '|': ('l',), '+': ('t',), '€': ('e',),
+    # Cyrillic and Greek homoglyphs
+    'а': ('a',), 'е': ('e',), 'о': ('o',), 'р': ('p',), 'с': ('c',), 'у': ('y',),
+    'х': ('x',), 'к': ('k',), 'і': ('i',), 'ѕ': ('s',), 'һ': ('h',), 'ԁ': ('d',),
+    'α': ('a',), 'ο': ('o',), 'ι': ('i',), 'κ': ('k',), 'ν': ('v',), 'τ': ('t',),
+}
+# Punctuation look-alikes still end a word ("shit!" is a hit)
+CONFUSABLE_PUNCTUATION = frozenset(c for c in CONFUSABLES if not c.isalnum())
+
+
+class ObfuscationMatcher(BadWordMatcher):
+    """
+    Obfuscation-resistant matcher: "f.u.c.k", "s h i t", "a$$", "ـكلب".
+
+    Words are stored in a character trie and the text is scanned once,
+    left to right, keeping the set of trie nodes reachable so far. Each
+    character is classified through a cached table as a separator (skipped,
+    up to max_gap in a row, see below), an invisible character (ignored),
+    or a tuple of candidate letters after confusable, case and Arabic
+    folding. Repeated letters stay on the same node, so elongation is
+    accepted too.
+
+    Separators are only skipped between single-letter tokens ("s h i t",
+    not "sh it"), and such a spaced-out hit must cover its whole run of
+    single letters, so "a s s e t" is no hit.
+
+    The active set holds at most one entry per trie node, so a scan costs
+    O(len(text) * nodes) in the worst case and never backtracks. A hit must
+    start and end at a separator, like the ``\b`` of the regex matcher, and
+    overlapping hits are resolved leftmost-longest.
+    """
+
+    def __init__(self, words: List[str], max_gap: int = 4):
+        super().__init__(words, normalize=True)
+        self.max_gap = max_gap
+        self._children: List[Dict[str, int]] = [{}]
+        self._labels = ['']
+        self._terminal = [False]
+        for word in self.words:
+            for variant in self._variants(word):
+                self._insert(variant)
+        self._classes: Dict[str, Optional[tuple]] = {}
+
+    def _insert(self, word: str):
+        node = 0
+        for char in word:
+            symbols = self._classify(char)
+            if not symbols:
+                continue  # 'ya kelb' is stored as 'yakelb'
+            child = self._children[node].get(symbols[0])
+            if child is None:
+                child = len(self._children)
+                self._children[node][symbols[0]] = child
+                self._children.append({})
+                self._labels.append(symbols[0])
+                self._terminal.append(False)
+            node = child
+        if node:
+            self._terminal[node] = True
+
+    @staticmethod
+    def _classify(char: str) -> Optional[tuple]:
+        """None for a separator, () for an invisible character, else candidate letters."""
+        if char in INVISIBLE_CHARS:
+            return ()
+        if char in CONFUSABLES:
+            return CONFUSABLES[char]
+        code = ord(char)
+        if 0xFF01 <= code <= 0xFF5E:  # fullwidth ASCII
+            return ObfuscationMatcher._classify(chr(code - 0xFEE0))
+        if char.isalnum() or char in "'’":
+            lowered = char.lower()
+            return (ARABIC_FOLDS.get(lowered, lowered),)
+        return None
+
+    def spans(self, text: str) -> List[tuple]:
+        """Non-overlapping (start, end) spans of every hit in the original text."""
+        classes = self._classes
+        children = self._children
+        labels = self._labels
+        terminal = self._terminal
+        root = children[0]
+        max_gap = self.max_gap
+        states: Dict[int, int] = {}  # trie node -> earliest start offset
+        candidates = []              # hits waiting for a trailing separator
+        pending = []                 # spaced-out hits waiting for their letter run to end
+        hits = []
+        gap = 0                      # separators since the last visible character
+        token_start = token_len = 0  # visible characters since the last separator
+        token_end = 0
+        run_start = None             # start of the current run of single-letter tokens
+        run_end = 0
+        for i, char in enumerate(text + ' '):
+            symbols = classes.get(char, False)
+            if symbols is False:
+                symbols = self._classify(char)
+                if len(classes) < 65536:
+                    classes[char] = symbols
+            if symbols is None:
+                if token_len:
+                    if token_len == 1:
+                        if run_start is None:
+                            run_start = token_start
+                        run_end = token_end
+                    for hit in candidates:
+                        (hits if hit[0] >= token_start else pending).append(hit)
+                    candidates = []
+                    if token_len > 1:
+                        states = {}  # only a single letter continues past a separator
+                    token_len = 0
+                gap += 1
+                if gap > max_gap:
+                    states = {}
+                continue
+            if not symbols:
+                continue
+            if candidates:
+                if char in CONFUSABLE_PUNCTUATION:
+                    hits += [hit for hit in candidates if hit[0] >= token_start or hit[0] == run_start]
+                candidates = []
+            if token_len == 0:
+                token_start = i
+                if gap > max_gap and run_start is not None:
+                    hits += [hit for hit in pending if hit == (run_start, run_end)]
+                    pending, run_start = [], None
+            elif token_len == 1:
+                # A word, not a spaced-out letter: the run ends before it
+                # and nothing started before the separator continues into it
+                if run_start is not None:
+                    hits += [hit for hit in pending if hit == (run_start, run_end)]
+                    pending, run_start = [], None
+                states = {node: start for node, start in states.items() if start >= token_start}
+            token_len += 1
+            advanced: Dict[int, int] = {}
+            for node, start in states.items():
+                kids = children[node]
+                # Elongation only within a run ("fuuck", not "fu u ck")
+                label = None if gap else labels[node]
+                for symbol in symbols:
+                    child = kids.get(symbol)
+                    if child is not None and start < advanced.get(child, i + 1):
+                        advanced[child] = start
+                    if symbol == label and start < advanced.get(node, i + 1):
+                        advanced[node] = start
+            if token_len == 1:
+                for symbol in symbols:
+                    child = root.get(symbol)
+                    if child is not None and child not in advanced:
+                        advanced[child] = i
+            states = advanced
+            gap = 0
+            token_end = i + 1
+            for node, start in states.items():
+                if terminal[node]:
+                    candidates.append((start, i + 1))
+        hits += [hit for hit in pending if hit == (run_start, run_end)]
+        return self._leftmost_longest(hits)
+    
+    @staticmethod
+    def _leftmost_longest(hits: List[tuple]) -> List[tuple]:
+        spans = []
+        last_end = 0
+        for start, end in sorted(hits, key=lambda hit: (hit[0], -hit[1])):
+            if start >= last_end:
+                spans.append((start, end))
+                last_end = end
+        return spans
+
+    def search(self, text: str) -> bool:
+        return bool(self.spans(text))
+
+    def find(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.spans(text)]
+
+
+# Clitics attached to a word without a space. Combined forms are listed
+# explicitly so a lookup never needs more than one table entry.
+CLITIC_PREFIXES = {
+    'arabic': (
+        'ال', 'و', 'ف', 'ب', 'ك', 'ل', 'يا', 'وال', 'فال', 'بال', 'كال',
+        'لل', 'وبال', 'ولل', 'ويا', 'ليا',
+    ),
+    'arabizi': ('el', 'il', 'l', 'ya', 'w', 'we', 'wel', 'b', 'bel', 'fel'),
+}
+CLITIC_SUFFIXES = {
+    'arabic': ('ه', 'ها', 'هم', 'هن', 'ك', 'كم', 'كن', 'ي', 'نا', 'ين', 'ات', 'ون'),
+    'arabizi': ('ak', 'ek', 'o', 'ha', 'hom', 'na', 'y'),
+}
+# Words shorter than this are only matched bare: 'كس' + 'ب' is 'بكس' (box)
+MIN_CLITIC_STEM = 3
+_TOKEN = re.compile(r'\w+')
+
+
+class TokenHashMatcher:
+    """
+    Token-hash engine: tokenize once and look every token up in a set.
+
+    Each word is expanded ahead of time with its clitic prefixes and
+    suffixes (and Arabizi digit spellings), so 'والكلب' or 'كلبك' is a
+    single frozenset lookup and the cost is O(tokens) regardless of list
+    size. Multi-word entries ('ابن الكلب', 'ibn el kalb') live in an
+    n-gram index keyed by their first token. Text goes through
+    normalize_for_matching() first and spans map back to the original.
+    """
+
+    MASK = '***'
+
+    def __init__(self, words: List[str], prefixes: Iterable[str] = (), suffixes: Iterable[str] = ()):
+        self.words = list(dict.fromkeys(word.lower() for word in words if word))
+        prefixes, suffixes = [''] + list(prefixes), [''] + list(suffixes)
+        singles = set()
+        ngrams: Dict[str, set] = {}
+        for word in self.words:
+            for variant in BadWordMatcher._variants(word):
+                tokens = _TOKEN.findall(variant)
+                if not tokens:
+                    continue
+                first = [tokens[0]] if len(tokens[0]) < MIN_CLITIC_STEM else [p + tokens[0] for p in prefixes]
+                last = [tokens[-1]] if len(tokens[-1]) < MIN_CLITIC_STEM else [tokens[-1] + s for s in suffixes]
+                if len(tokens) == 1:
+                    if len(tokens[0]) < MIN_CLITIC_STEM:
+                        singles.add(tokens[0])
+                    else:
+                        singles.update(p + tokens[0] + s for p in prefixes for s in suffixes)
+                    continue
+                for head in first:
+                    for tail in last:
+                        ngrams.setdefault(head, set()).add((head, *tokens[1:-1], tail))
+        self.singles = frozenset(singles)
+        # First token -> candidate n-grams, longest first
+        self.ngrams = {
+            head: sorted(grams, key=len, reverse=True) for head, grams in ngrams.items()
+        }
+
+    def spans(self, text: str) -> List[tuple]:
+        """Non-overlapping (start, end) spans of every hit in the original text."""
+        canonical, shifts = normalize_for_matching(text)
+        singles, ngrams = self.singles, self.ngrams
+        lowered = canonical.lower()
+        if len(lowered) != len(canonical):
+            # Rare case mappings change length ('İ'); lower token by token
+            matches = list(_TOKEN.finditer(canonical))
+            tokens = [match.group().lower() for match in matches]
+        else:
+            tokens = _TOKEN.findall(lowered)
+            matches = None
+        if singles.isdisjoint(tokens) and ngrams.keys().isdisjoint(tokens):
+            return []
+        positions = [match.span() for match in matches or _TOKEN.finditer(lowered)]
+        spans = []
+        i, count = 0, len(tokens)
+        while i < count:
+            token = tokens[i]
+            length = 1 if token in singles else 0
+            for gram in ngrams.get(token, ()):
+                if len(gram) > length and tuple(tokens[i:i + len(gram)]) == gram:
+                    length = len(gram)
+                    break
+            if length:
+                start, end = positions[i][0], positions[i + length - 1][1]
+                spans.append((original_offset(start, shifts), original_offset(end, shifts)))
+                i += length
+            else:
+                i += 1
+        return spans
+
+    def mask(self, text: str) -> str:
+        """Replace every hit with the mask in a single output build."""
+        spans = self.spans(text)
+        if not spans:
+            return text
+        parts = []
+        last = 0
+        for start, end in spans:
+            parts.append(text[last:start])
+            parts.append(self.MASK)
+            last = end
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def search(self, text: str) -> bool:
+        """Return True if any word occurs in the text."""
+        return bool(self.spans(text))
+
+    def find(self, text: str) -> List[str]:
+        """Return every hit as it appears in the text."""
+        return [text[start:end] for start, end in self.spans(text)]
+
+
 class BadWordsFilter:
-    """Filter inappropriate language in all 3 supported languages."""
+    """
+    Filter inappropriate language in all 3 supported languages.
+    
+    Matching is lock-free: matchers are immutable once built and every
+    call reads self.matchers once. Building them on first use and the
+    configuration setters take self._lock, so concurrent first calls
+    build once. Cached names are stored with the matchers that cleaned
+    them and only served while those are current, so a name cleaned with
+    an old word list is never returned after set_bad_words()/set_engine().
+    """
+    
+    ENGINES = ('regex', 'token')
     
-    def __init__(self):
+    def __init__(
+        self,
+        name_cache_size: int = 4096,
+        name_cache_bytes: Optional[int] = 1 << 20,
+        normalize: bool = False,
+        detect_obfuscation: bool = False,
+        engines: Optional[Dict[str, str]] = None
+    ):
+        # Match on the canonical form (tashkeel, letter variants, elongation)
+        self.normalize = normalize
+        # Also see through separators, look-alikes and zero-width characters
+        self.detect_obfuscation = detect_obfuscation
+        # Captains contact support repeatedly, so cleaned names are cached
+        self.name_cache = LRUCache(name_cache_size, name_cache_bytes)
         self.bad_words = {
             'english': [
                 'damn', 'shit', 'fuck', 'ass', 'bitch', 'hell', 'crap',
@@ -39,36 +733,110 @@ class BadWordsFilter:
                 'kharا', '5awal', 'mot5alef', 'ghabi', '8abi'
             ]
         }
-        self._compile_patterns()
+        # Matching engine per language: 'regex' (one combined trie regex)
+        # or 'token' (TokenHashMatcher with clitic stripping)
+        self.engines = dict.fromkeys(self.bad_words, 'regex')
+        for language, engine in (engines or {}).items():
+            self._check_engine(engine)
+            self.engines[language] = engine
+        self._patterns = None
+        self._lock = threading.RLock()
+    
+    def __getattr__(self, name: str):
+        # Matchers are built on first use, so constructing a filter (and
+        # importing this module) does not compile any regex.
+        if name == 'matchers':
+            with self._lock:
+                if 'matchers' not in self.__dict__:
+                    self._compile_patterns()
+                return self.__dict__['matchers']
+        raise AttributeError(name)
+    
+    @classmethod
+    def _check_engine(cls, engine: str):
+        if engine not in cls.ENGINES:
+            raise ValueError(f"Unknown engine: {engine!r} (expected one of {cls.ENGINES})")
     
     def _compile_patterns(self):
-        """Compile regex patterns for efficient matching."""
-        self.patterns = []
-        for lang_words in self.bad_words.values():
-            for word in lang_words:
-                self.patterns.append(
-                    re.compile(rf'\b{re.escape(word)}\b', re.IGNORECASE | re.UNICODE)
-                )
+        """Compile all word lists into one matcher per engine."""
+        regex_words = [
+            word for language, lang_words in self.bad_words.items()
+            if self.engines.get(language, 'regex') == 'regex' for word in lang_words
+        ]
+        matchers = []
+        if regex_words or all(engine == 'regex' for engine in self.engines.values()):
+            if self.detect_obfuscation:
+                matchers.append(ObfuscationMatcher(regex_words))
+            else:
+                matchers.append(BadWordMatcher(regex_words, normalize=self.normalize))
+        for language, lang_words in self.bad_words.items():
+            if self.engines.get(language) == 'token':
+                matchers.append(TokenHashMatcher(
+                    lang_words, CLITIC_PREFIXES.get(language, ()), CLITIC_SUFFIXES.get(language, ())
+                ))
+        self.matchers = matchers
+    
+    def set_bad_words(self, language: str, words: List[str]):
+        """Replace one language's word list and recompile (drops cached names)."""
+        with self._lock:
+            # Copy on write: a matcher being built keeps a consistent snapshot
+            self.bad_words = {**self.bad_words, language: list(words)}
+            self._invalidate()
+    
+    def set_engine(self, language: str, engine: str):
+        """Switch one language between the 'regex' and 'token' engines."""
+        self._check_engine(engine)
+        with self._lock:
+            self.engines = {**self.engines, language: engine}
+            self._invalidate()
+    
+    def _invalidate(self):
+        """Drop compiled matchers (rebuilt on next use) and cached names."""
+        with self._lock:
+            self.__dict__.pop('matchers', None)
+            self._patterns = None
+            self.name_cache.clear()
+    
+    @property
+    def patterns(self) -> List[re.Pattern]:
+        """Per-word regexes over every list, compiled on first use (legacy interface)."""
+        if self._patterns is None:
+            words = [word for lang_words in self.bad_words.values() for word in lang_words]
+            self._patterns = BadWordMatcher(words)._legacy_patterns()
+        return self._patterns
     
     def filter_text(self, text: str) -> str:
         """Replace bad words with asterisks."""
-        filtered = text
-        for pattern in self.patterns:
-            filtered = pattern.sub('***', filtered)
-        return filtered
+        for matcher in self.matchers:
+            text = matcher.mask(text)
+        return text
     
     def contains_bad_words(self, text: str) -> bool:
         """Check if text contains any bad words."""
-        for pattern in self.patterns:
-            if pattern.search(text):
+        for matcher in self.matchers:
+            if matcher.search(text):
                 return True
         return False
     
+    def find_bad_words(self, text: str) -> List[str]:
+        """List the bad words found in text."""
+        return [word for matcher in self.matchers for word in matcher.find(text)]
+    
     def clean_name(self, name: str) -> str:
         """Clean captain name from bad words and normalize."""
-        cleaned = self.filter_text(name)
+        matchers = self.matchers
+        entry = self.name_cache.get(name)
+        # An entry cleaned with replaced matchers is a miss (no lock needed)
+        if entry is not None and entry[0] is matchers:
+            return entry[1]
+        cleaned = name
+        for matcher in matchers:
+            cleaned = matcher.mask(cleaned)
         cleaned = ' '.join(cleaned.split())  # Normalize whitespace
-        return cleaned[:50] if len(cleaned) > 50 else cleaned  # Limit length
+        cleaned = cleaned[:50] if len(cleaned) > 50 else cleaned  # Limit length
+        entry = (matchers, cleaned)
+        self.name_cache.put(name, entry, sys.getsizeof(entry) + sys.getsizeof(cleaned))
+        return cleaned
 
 
 # ============================================
@@ -420,12 +1188,1257 @@ E7na hena 3ashan nesa3dak!"""
 }
 
 
+# ============================================
+# TEMPLATE COMPILER
+# ============================================
+
+TEMPLATE_FIELDS = ('captain_name',)
+
+
+def split_template(source: str, fields: Tuple[str, ...] = TEMPLATE_FIELDS) -> Tuple[List[str], List[int]]:
+    """
+    Split a template into literal fragments and slot indexes into fields.
+    
+    Raises ValueError for an unknown placeholder or a format spec.
+    """
+    fragments, slots, literal = [], [], []
+    for text, field, format_spec, conversion in Formatter().parse(source):
+        literal.append(text)
+        if field is None:
+            continue
+        if field not in fields:
+            raise ValueError(f"Unknown placeholder {{{field}}} in template: {source[:40]!r}")
+        if format_spec or conversion:
+            raise ValueError(f"Unsupported format spec on {{{field}}} in template: {source[:40]!r}")
+        fragments.append(''.join(literal))
+        slots.append(fields.index(field))
+        literal = []
+    fragments.append(''.join(literal))
+    return fragments, slots
+
+
+class CompiledTemplate:
+    """
+    A response template split once into literal fragments and slots.
+    
+    Rendering joins the fragments with the slot values instead of parsing
+    the format string on every call. With encode=True the fragments are
+    also kept as UTF-8 bytes for writing straight into an output buffer.
+    """
+    
+    __slots__ = ('source', 'fields', 'fragments', 'slots', 'encoded', 'json_fragments')
+    
+    def __init__(self, source: str, fields: Tuple[str, ...] = TEMPLATE_FIELDS, encode: bool = False):
+        fragments, slots = split_template(source, fields)
+        self.source = source
+        self.fields = fields
+        self.fragments = tuple(fragments)
+        self.slots = tuple(slots)
+        self.encoded = tuple(f.encode('utf-8') for f in fragments) if encode else None
+        # JSON-escaped UTF-8 fragments for ChatbotResponse.to_json_bytes()
+        self.json_fragments = tuple(_json_string(f)[1:-1].encode('utf-8') for f in fragments)
+    
+    def render(self, *values: str) -> str:
+        """Render with values given in the order of self.fields."""
+        fragments, slots = self.fragments, self.slots
+        if len(slots) == 1:
+            return fragments[0] + values[slots[0]] + fragments[1]
+        parts = [fragments[0]]
+        for slot, fragment in zip(slots, fragments[1:]):
+            parts.append(values[slot])
+            parts.append(fragment)
+        return ''.join(parts)
+    
+    def render_bytes(self, *values: str) -> bytes:
+        """Render straight to UTF-8, reusing pre-encoded fragments if present."""
+        if self.encoded is None:
+            return self.render(*values).encode('utf-8')
+        encoded, slots = self.encoded, self.slots
+        if len(slots) == 1:
+            return encoded[0] + values[slots[0]].encode('utf-8') + encoded[1]
+        parts = [encoded[0]]
+        for slot, fragment in zip(slots, encoded[1:]):
+            parts.append(values[slot].encode('utf-8'))
+            parts.append(fragment)
+        return b''.join(parts)
+    
+    def render_json(self, *json_values: bytes) -> bytes:
+        """Render as JSON string contents from already-escaped UTF-8 values."""
+        fragments, slots = self.json_fragments, self.slots
+        if len(slots) == 1:
+            return fragments[0] + json_values[slots[0]] + fragments[1]
+        parts = [fragments[0]]
+        for slot, fragment in zip(slots, fragments[1:]):
+            parts.append(json_values[slot])
+            parts.append(fragment)
+        return b''.join(parts)
+    
+    def write_to(self, buffer, *values: str) -> None:
+        """Write the rendered template into a text or (if encoded) bytes buffer."""
+        fragments = self.encoded if self.encoded is not None else self.fragments
+        buffer.write(fragments[0])
+        for slot, fragment in zip(self.slots, fragments[1:]):
+            value = values[slot]
+            buffer.write(value.encode('utf-8') if self.encoded is not None else value)
+            buffer.write(fragment)
+
+
+class LazyTemplates(dict):
+    """{language: CompiledTemplate} that compiles each language on first use."""
+    
+    def __init__(self, sources: Dict[str, str], encode: bool = False):
+        super().__init__()
+        self.sources = sources
+        self.encode = encode
+    
+    def __missing__(self, language: str) -> CompiledTemplate:
+        template = self[language] = CompiledTemplate(self.sources[language], encode=self.encode)
+        return template
+
+
+def compile_templates(
+    templates: Dict[str, Dict[str, str]],
+    keys: Iterable[str],
+    languages: Iterable[str],
+    encode: bool = False,
+    lazy: bool = False
+) -> Dict[str, Dict[str, CompiledTemplate]]:
+    """
+    Compile a {key: {language: template}} table.
+    
+    Raises ValueError if any expected key/language is missing or a
+    template uses an unknown placeholder, so bad templates fail at startup.
+    With lazy=True the placeholders are still checked now (a cheap parse),
+    but each language is compiled the first time it is rendered.
+    """
+    compiled = {}
+    for key in keys:
+        for language in languages:
+            try:
+                source = templates[key][language]
+            except KeyError:
+                raise ValueError(f"Missing template: {key}/{language}") from None
+            if lazy:
+                split_template(source)
+                compiled.setdefault(key, LazyTemplates(templates[key], encode))
+            else:
+                compiled.setdefault(key, {})[language] = CompiledTemplate(source, encode=encode)
+    return compiled
+
+
+# ============================================
+# TEMPLATE CATALOG
+# ============================================
+
+class TemplateCatalog:
+    """
+    One immutable, validated set of status and general templates.
+    
+    Every template is checked on construction; by default each language
+    is compiled the first time it is rendered (lazy=False compiles all
+    now, compile_all() does so later). The chatbot holds a single
+    reference to its catalog and every request reads it once, so
+    replacing the reference swaps all templates at once without locks on
+    the read path.
+    """
+    
+    __slots__ = ('responses', 'general_responses', 'templates', 'general_templates', 'source')
+    
+    def __init__(
+        self,
+        responses: Dict[str, Dict[str, str]],
+        general_responses: Dict[str, Dict[str, str]],
+        statuses: Iterable[str],
+        general_keys: Iterable[str],
+        languages: Iterable[str],
+        encode: bool = False,
+        source: Optional[str] = None,
+        lazy: bool = True
+    ):
+        for table in (responses, general_responses):
+            if not isinstance(table, dict) or not all(
+                isinstance(by_language, dict) and all(isinstance(text, str) for text in by_language.values())
+                for by_language in table.values()
+            ):
+                raise ValueError("Templates must be {key: {language: text}} objects")
+        # Checked here, compiled per language on first use (or here if not lazy)
+        self.templates = compile_templates(responses, statuses, languages, encode, lazy)
+        self.general_templates = compile_templates(general_responses, general_keys, languages, encode, lazy)
+        self.responses = responses
+        self.general_responses = general_responses
+        self.source = source
+    
+    @classmethod
+    def from_file(cls, path: str, *args, **kwargs) -> 'TemplateCatalog':
+        """
+        Load a JSON catalog {"responses": {...}, "general_responses": {...}}.
+        
+        Raises ValueError for invalid JSON or templates and OSError if the
+        file cannot be read; remaining arguments go to the constructor.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("Catalog must be a JSON object")
+        return cls(data.get('responses'), data.get('general_responses'), *args, source=path, **kwargs)
+    
+    def compile_all(self) -> 'TemplateCatalog':
+        """Compile every lazy template now (prefork warm-up, so workers share them)."""
+        for table in (self.templates, self.general_templates):
+            for by_language in table.values():
+                for language in getattr(by_language, 'sources', ()):
+                    by_language[language]
+        return self
+    
+    def save(self, path: str):
+        """Write the catalog as JSON, replacing path atomically."""
+        data = {'responses': self.responses, 'general_responses': self.general_responses}
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+class CatalogWatcher:
+    """
+    Poll a catalog file and hot-swap it into a chatbot when it changes.
+    
+    A change is a different (mtime, size, inode) from os.stat, which costs
+    one syscall per interval. A catalog that fails to load or compile is
+    rejected and the chatbot keeps serving the previous one; the broken
+    file is not retried until it changes again.
+    """
+    
+    def __init__(self, chatbot: 'CaptainSupportChatbot', path: str, interval: float = 1.0):
+        self.chatbot = chatbot
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def poll(self) -> bool:
+        """Check the file once; return True if a new catalog was swapped in."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False  # Mid-rename or removed; keep the current catalog
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            self.chatbot.load_catalog(self.path)
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️ template catalog {self.path} rejected, keeping previous: {e}", file=sys.stderr)
+            return False
+        self.reloads += 1
+        self.last_error = None
+        return True
+    
+    def start(self) -> 'CatalogWatcher':
+        """Keep polling from a daemon thread (loading now if never polled)."""
+        if self._signature is None:
+            self.poll()
+        self._thread = threading.Thread(target=self._run, name='catalog-watcher', daemon=True)
+        self._thread.start()
+        return self
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# ============================================
+# METRICS
+# ============================================
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+STAGE_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2
+)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class ChatbotMetrics:
+    """
+    Per-stage latency histograms and outcome counters for the chatbot.
+    
+    Stages: clean_name, validate, render, timestamp, moderation. Updates
+    are plain integer increments without a lock; under heavy threading a
+    few increments may be lost, which is acceptable for monitoring.
+    """
+    
+    STAGES = ('clean_name', 'validate', 'render', 'timestamp', 'moderation')
+    
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self.stage_counts = {stage: [0] * (len(buckets) + 1) for stage in self.STAGES}
+        self.stage_sums = dict.fromkeys(self.STAGES, 0.0)
+        self.responses: Dict[Tuple[str, str], int] = {}
+        self.errors: Dict[str, int] = {}
+        self.unknown_fallbacks = 0
+        self.language_fallbacks = 0
+        self.moderation_hits = 0
+    
+    def observe(self, stage: str, seconds: float) -> None:
+        self.stage_counts[stage][bisect_left(self.buckets, seconds)] += 1
+        self.stage_sums[stage] += seconds
+    
+    def count_response(self, language: str, status: str) -> None:
+        key = (status, language)
+        self.responses[key] = self.responses.get(key, 0) + 1
+    
+    def count_error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+    
+    def render_prometheus(self, prefix: str = 'captain_chatbot') -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each hot-path stage.',
+            f'# TYPE {prefix}_stage_seconds histogram',
+        ]
+        for stage in self.STAGES:
+            cumulative = 0
+            counts = self.stage_counts[stage]
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {self.stage_sums[stage]:.9f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+        lines += [
+            f'# HELP {prefix}_responses_total Responses by status and language.',
+            f'# TYPE {prefix}_responses_total counter',
+        ]
+        for (status, language), count in sorted(self.responses.items()):
+            lines.append(f'{prefix}_responses_total{{status="{status}",language="{language}"}} {count}')
+        lines += [
+            f'# HELP {prefix}_errors_total Failed responses by error kind.',
+            f'# TYPE {prefix}_errors_total counter',
+        ]
+        for kind, count in sorted(self.errors.items()):
+            lines.append(f'{prefix}_errors_total{{error="{kind}"}} {count}')
+        for name, help_text, value in (
+            ('unknown_fallbacks_total', "Responses that fell back to the 'unknown' template.", self.unknown_fallbacks),
+            ('language_fallbacks_total', "Requests whose language fell back to 'english'.", self.language_fallbacks),
+            ('moderation_hits_total', 'User messages containing bad words.', self.moderation_hits),
+        ):
+            lines += [
+                f'# HELP {prefix}_{name} {help_text}',
+                f'# TYPE {prefix}_{name} counter',
+                f'{prefix}_{name} {value}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def _render_cache_metrics(cache: LRUCache, prefix: str) -> str:
+    stats = cache.stats()
+    lines = []
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'),
+                      ('invalidations', 'counter'), ('entries', 'gauge'), ('bytes', 'gauge')):
+        name = f'{prefix}_{key}_total' if kind == 'counter' else f'{prefix}_{key}'
+        lines += [f'# TYPE {name} {kind}', f'{name} {stats[key]}']
+    return '\n'.join(lines) + '\n'
+
+
+# ============================================
+# MODERATION INCIDENT LOG
+# ============================================
+
+class IncidentLog:
+    """
+    Buffered JSONL log of abusive user messages.
+    
+    report() only appends to a bounded in-memory queue; a background
+    thread extracts the matched terms and writes batches of records,
+    flushing when batch_size records are pending or flush_interval
+    seconds have passed, and rotating the file at max_bytes. When the
+    queue is full, policy='drop' discards the record (counted in
+    dropped) and policy='block' waits up to block_timeout for space.
+    
+    Terms are matched with words_filter. A CaptainSupportChatbot given a
+    log without one hands over its own filter, so the logged terms are
+    what the chatbot matched; a log used on its own falls back to a
+    default BadWordsFilter.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        words_filter: Optional[BadWordsFilter] = None,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        policy: str = 'drop',
+        block_timeout: float = 0.01,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5
+    ):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.path = path
+        self.filter = words_filter
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.reported = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.rotations = 0
+        self._queue: deque = deque()
+        self._stop = threading.Event()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name='incident-log', daemon=True)
+        self._thread.start()
+    
+    def report(self, captain_name: str, language: str, message: str) -> bool:
+        """Queue an incident without doing any I/O; False if it was dropped."""
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            if self.policy == 'drop':
+                self.dropped += 1
+                return False
+            deadline = perf_counter() + self.block_timeout
+            while len(queue) >= self.max_queue:
+                if perf_counter() >= deadline:
+                    self.dropped += 1
+                    return False
+                time.sleep(0.0005)
+        queue.append((captain_name, language, message, time.time()))
+        self.reported += 1
+        return True
+    
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush everything still queued and stop the writer thread."""
+        self._stop.set()
+        self._thread.join(timeout)
+    
+    def stats(self) -> Dict:
+        return {
+            'queued': len(self._queue),
+            'reported': self.reported,
+            'dropped': self.dropped,
+            'written': self.written,
+            'batches': self.batches,
+            'rotations': self.rotations,
+        }
+    
+    def _run(self) -> None:
+        poll = min(self.flush_interval, 0.05)
+        batch: List[tuple] = []
+        last_flush = perf_counter()
+        while True:
+            stopping = self._stop.wait(poll)
+            queue = self._queue
+            while queue:
+                batch.append(queue.popleft())
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch, last_flush = [], perf_counter()
+            if batch and (stopping or perf_counter() - last_flush >= self.flush_interval):
+                self._write(batch)
+                batch, last_flush = [], perf_counter()
+            if stopping and not queue:
+                break
+        if self._file is not None:
+            self._file.close()
+    
+    def _write(self, batch: List[tuple]) -> None:
+        if self.filter is None:
+            self.filter = BadWordsFilter(name_cache_size=0)
+        find = self.filter.find_bad_words
+        data = ''.join(
+            f'{{"captain_name":{_json_string(captain_name)},"language":{_json_string(language)},'
+            f'"matched_terms":[{",".join(map(_json_string, find(message)))}],'
+            f'"timestamp":"{datetime.fromtimestamp(reported_at).isoformat()}"}}\n'
+            for captain_name, language, message, reported_at in batch
+        ).encode('utf-8')
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self.written += len(batch)
+        self.batches += 1
+    
+    def _rotate(self) -> None:
+        """Shift path -> path.1 -> ... -> path.N (like RotatingFileHandler)."""
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self.rotations += 1
+
+
+# ============================================
+# LANGUAGE DETECTION
+# ============================================
+
+# Frequent function words and support phrases per Latin-script language
+ARABIZI_TOKENS = frozenset([
+    'ana', 'enta', 'enty', 'inta', 'ya', 'el', 'il', 'w', 'we', 'fe', 'fi', 'men', 'mn',
+    'msh', 'mesh', 'mish', 'ezay', 'izay', 'leh', 'lih', 'keda', 'kda', 'emta', 'imta',
+    'fein', 'fen', 'feen', 'eh', 'ahlan', 'shokran', 'shukran', 'mashy', 'mashi', 'tab',
+    'yalla', 'lesa', 'lessa', 'howa', 'heya', 'ba2a', 'bas', 'kaman', 'talab', 'el7amdolillah',
+    '3ayez', '3awez', 'a3raf', '7alet', '3ala', '3an', 'm3a', '2ana', 'habibi', 'ma3lesh',
+])
+ENGLISH_TOKENS = frozenset([
+    'the', 'is', 'are', 'i', 'my', 'me', 'you', 'your', 'to', 'and', 'of', 'what', 'when',
+    'why', 'how', 'please', 'thanks', 'thank', 'hello', 'hi', 'status', 'registration',
+    'not', 'still', 'account', 'documents', 'approved', 'want', 'know', 'can', 'will',
+    'have', 'has', 'was', 'it', 'this', 'that', 'do', 'does', 'did', 'long', 'wait',
+])
+_WORD_TOKEN = re.compile(r'[^\W_]+')
+# A Latin token spelled with an Arabizi digit letter, except '2nd', '5pm', '3km'
+_ARABIZI_DIGIT_TOKEN = re.compile(r'(?![0-9]+[a-z]{1,2}$)(?=.*[a-z]).*[23578]')
+
+
+class LanguageDetector:
+    """
+    Script-based language detection with a per-captain cache.
+
+    One pass over the tokens of a short text prefix counts Arabic-block
+    tokens, Latin tokens spelled with Arabizi digit letters (3, 7, 5, 2, 8)
+    and hits in small Arabizi/English frequency tables. Arabic wins when
+    Arabic tokens outnumber Latin ones; otherwise Arabizi needs more
+    evidence than English, and plain Latin text defaults to English.
+
+    mode='fallback' only replaces a missing or unknown language.
+    mode='override' also replaces a valid one when the captain's own
+    message (now or earlier, via the cache) says otherwise.
+    
+    Names are not unique, so a language detected from a message is only
+    remembered under the captain id; name-only detections are cached
+    under the name.
+    """
+
+    MODES = ('fallback', 'override')
+
+    def __init__(self, mode: str = 'fallback', cache_size: int = 65536, sample_chars: int = 256):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown detection mode: {mode!r} (expected one of {self.MODES})")
+        self.mode = mode
+        self.sample_chars = sample_chars
+        # ('id', captain_id) -> language detected from their messages,
+        # ('name', captain_name) -> language detected from the name ('' if none)
+        self.cache = LRUCache(cache_size)
+
+    def detect(self, text: Optional[str]) -> Optional[str]:
+        """Return 'arabic', 'english' or 'arabizi', or None without evidence."""
+        if not text:
+            return None
+        arabic = latin = arabizi = english = 0
+        for token in _WORD_TOKEN.findall(text[:self.sample_chars].lower()):
+            if '\u0600' <= token[0] <= '\u06ff' or '\u0750' <= token[0] <= '\u077f':
+                arabic += 1
+            elif token.isascii():
+                latin += 1
+                if token in ARABIZI_TOKENS:
+                    arabizi += 1
+                elif token in ENGLISH_TOKENS:
+                    english += 1
+                elif not token.isalpha() and _ARABIZI_DIGIT_TOKEN.match(token):
+                    arabizi += 1
+        if arabic > latin:
+            return 'arabic'
+        if not latin:
+            return None
+        return 'arabizi' if arabizi > english else 'english'
+
+    def choose(
+        self,
+        captain_name: str,
+        language: str,
+        user_message: Optional[str] = None,
+        captain_id: Optional[str] = None
+    ) -> str:
+        """Pick the language to answer in; returns language unchanged when unsure."""
+        requested = language.lower().strip() if language else ''
+        valid = requested in CaptainSupportChatbot.VALID_LANGUAGES
+        if valid and self.mode == 'fallback':
+            return language
+        detected = self.detect(user_message)
+        if detected is not None:
+            if captain_id is not None:
+                self.cache.put(('id', captain_id), detected)
+            return detected
+        if captain_id is not None:
+            detected = self.cache.get(('id', captain_id))
+            if detected is not None:
+                return detected
+        if valid:
+            return language
+        key = ('name', captain_name)
+        detected = self.cache.get(key)
+        if detected is None:
+            detected = self.detect(captain_name) or ''
+            self.cache.put(key, detected)
+        return detected or language
+
+
+# ============================================
+# INTENT CLASSIFIER
+# ============================================
+
+# Keyword phrases per intent and language; a phrase is 1-3 tokens
+INTENT_PHRASES = {
+    'greeting': {
+        'english': ['hello', 'hi', 'hey', 'good morning', 'good evening', 'good afternoon', 'greetings'],
+        'arabic': ['مرحبا', 'اهلا', 'السلام عليكم', 'سلام', 'صباح الخير', 'مساء الخير', 'ازيك', 'هاي'],
+        'arabizi': ['ahlan', 'marhaba', 'salam', 'el salam 3aleko', 'salam 3alekom', 'sabah el kheir',
+                    'masa2 el kheir', 'ezayak', 'ezzayak', 'hai'],
+    },
+    'thank_you': {
+        'english': ['thanks', 'thank you', 'thx', 'ty', 'appreciate it', 'much appreciated', 'cheers'],
+        'arabic': ['شكرا', 'متشكر', 'متشكرين', 'تسلم', 'تسلمي', 'جزاك الله', 'الف شكر', 'مشكور'],
+        'arabizi': ['shokran', 'shukran', 'merci', 'mersi', 'teslam', 'motashakker', 'metshakkr',
+                    'alf shokr', 'mashkoor'],
+    },
+    'status': {
+        'english': ['status', 'registration', 'application', 'approved', 'approval', 'review',
+                    'documents', 'document', 'account', 'rejected', 'when', 'how long', 'still',
+                    'waiting', 'check', 'activate', 'activated', 'update', 'pending'],
+        'arabic': ['حاله', 'الطلب', 'طلب', 'التسجيل', 'تسجيل', 'امتى', 'متى', 'المستندات', 'الورق',
+                   'الاوراق', 'مراجعه', 'المراجعه', 'الموافقه', 'اتقبل', 'هيتقبل', 'مرفوض', 'الحساب',
+                   'لسه', 'تفعيل', 'منتظر'],
+        'arabizi': ['talab', 'el talab', 'tasjeel', 'tasgeel', '7alet', '7ala', 'emta', 'imta',
+                    'lesa', 'lessa', 'mostanadat', 'wara2', 'account', 'et2abal', 'hyet2abal',
+                    'mowaf2a', 'morag3a', 'mestani'],
+    },
+}
+# Intents the classifier can return
+INTENTS = ('greeting', 'thank_you', 'status', 'unknown')
+_ELONGATION = re.compile(r'(.)\1{2,}')
+
+
+class IntentClassifier:
+    """
+    Keyword/n-gram intent engine for user_message.
+
+    Phrases from INTENT_PHRASES are normalized once into a hash index
+    keyed by token tuple; a message is normalized (Arabic folding,
+    elongation collapse, lower case) and tokenized once, and each token
+    costs at most max_ngram dict lookups. Any status keyword routes to
+    'status' (so "hi, is my account approved?" gets the status reply);
+    otherwise the higher of greeting/thank_you wins, and a message with
+    no keyword at all is 'unknown'.
+    """
+
+    def __init__(self, phrases: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        self.index: Dict[tuple, str] = {}
+        self.max_ngram = 1
+        for intent, by_language in (phrases or INTENT_PHRASES).items():
+            if intent not in INTENTS:
+                raise ValueError(f"Unknown intent: {intent!r}")
+            for language_phrases in by_language.values():
+                for phrase in language_phrases:
+                    key = tuple(self.tokenize(phrase))
+                    if key:
+                        self.index[key] = intent
+                        self.max_ngram = max(self.max_ngram, len(key))
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        canonical = normalize_for_matching(text)[0].lower()
+        return _WORD_TOKEN.findall(_ELONGATION.sub(r'\1', canonical))
+
+    def score(self, text: str) -> Dict[str, int]:
+        """Count keyword hits per intent (longest phrase at each token)."""
+        scores = {'greeting': 0, 'thank_you': 0, 'status': 0}
+        index, max_ngram = self.index, self.max_ngram
+        tokens = self.tokenize(text) if text else []
+        i, count = 0, len(tokens)
+        while i < count:
+            for size in range(min(max_ngram, count - i), 0, -1):
+                intent = index.get(tuple(tokens[i:i + size]))
+                if intent is not None:
+                    scores[intent] += 1
+                    i += size
+                    break
+            else:
+                i += 1
+        return scores
+
+    def classify(self, text: str) -> str:
+        """Route a message to 'greeting', 'thank_you', 'status' or 'unknown'."""
+        scores = self.score(text)
+        if scores['status']:
+            return 'status'
+        if scores['thank_you'] or scores['greeting']:
+            return 'thank_you' if scores['thank_you'] >= scores['greeting'] else 'greeting'
+        return 'unknown'
+
+    def classify_many(self, texts: Iterable[str]) -> List[str]:
+        """Batch scoring; repeated messages ("hi", "thanks") are classified once."""
+        seen: Dict[str, str] = {}
+        classify = self.classify
+        results = []
+        for text in texts:
+            intent = seen.get(text)
+            if intent is None:
+                intent = classify(text)
+                if len(seen) < 4096:
+                    seen[text] = intent
+            results.append(intent)
+        return results
+
+
+# ============================================
+# SESSION STORE
+# ============================================
+
+@dataclass(slots=True)
+class Session:
+    """One captain's conversation state, as returned by SessionStore.get()."""
+    captain_id: str
+    clean_name: str
+    language: Optional[str]
+    status: Optional[str]
+    intent: Optional[str]
+    strikes: int
+    last_seen: int
+
+
+class SessionStore:
+    """
+    In-process per-captain session state with TTL and LRU eviction.
+    
+    Records are columns rather than objects: captain id and cleaned name
+    live in two lists, language/status/intent are one-byte codes into a
+    shared symbol table, strikes is one byte, last access is a uint32
+    of Unix seconds, and the LRU order is a doubly linked list threaded
+    through two int32 arrays. A dict maps captain id to its slot; freed
+    slots are reused.
+    
+    Sessions idle for longer than ttl seconds are dropped on access and
+    from the LRU tail on insert. Inserts evict least recently used
+    sessions while over max_sessions or over max_bytes (estimated from
+    the strings plus a fixed per-slot cost).
+    
+    Not thread-safe: use one store per worker, or guard it with a lock.
+    """
+    
+    # Approximate fixed cost of one session: dict entry, two list
+    # pointers and 16 bytes of arrays
+    ENTRY_OVERHEAD = 80
+    # Codes are single bytes; 0 means None
+    MAX_SYMBOLS = 256
+    SNAPSHOT_MAGIC = b'CAPTSES1'
+    
+    def __init__(self, ttl: float = 1800.0, max_sessions: Optional[int] = None, max_bytes: int = 256 << 20):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.index: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.names: List[Optional[str]] = []
+        self.languages = array('B')
+        self.statuses = array('B')
+        self.intents = array('B')
+        self.strikes = array('B')
+        self.seen = array('I')
+        # Linked list: prev points toward the most recent end, next toward the oldest
+        self.prev = array('i')
+        self.next = array('i')
+        self.head = -1  # most recently used slot
+        self.tail = -1  # least recently used slot
+        self.free: List[int] = []
+        self.symbols: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def __contains__(self, captain_id: str) -> bool:
+        return captain_id in self.index
+    
+    def _code(self, symbol: Optional[str]) -> int:
+        code = self.codes.get(symbol)
+        if code is None:
+            if len(self.symbols) >= self.MAX_SYMBOLS:
+                raise ValueError(f"More than {self.MAX_SYMBOLS - 1} distinct languages/statuses/intents")
+            code = self.codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return code
+    
+    def _size(self, captain_id: str, clean_name: str) -> int:
+        return sys.getsizeof(captain_id) + sys.getsizeof(clean_name) + self.ENTRY_OVERHEAD
+    
+    def _unlink(self, slot: int) -> None:
+        newer, older = self.prev[slot], self.next[slot]
+        if newer == -1:
+            self.head = older
+        else:
+            self.next[newer] = older
+        if older == -1:
+            self.tail = newer
+        else:
+            self.prev[older] = newer
+    
+    def _push_head(self, slot: int) -> None:
+        self.prev[slot] = -1
+        self.next[slot] = self.head
+        if self.head == -1:
+            self.tail = slot
+        else:
+            self.prev[self.head] = slot
+        self.head = slot
+    
+    def _remove(self, slot: int) -> None:
+        self._unlink(slot)
+        self.bytes -= self._size(self.ids[slot], self.names[slot])
+        del self.index[self.ids[slot]]
+        self.ids[slot] = self.names[slot] = None
+        self.free.append(slot)
+    
+    def get(self, captain_id: str) -> Optional[Session]:
+        """Return the captain's session (marking it recently used), or None."""
+        slot = self.index.get(captain_id)
+        if slot is None:
+            self.misses += 1
+            return None
+        now = int(time.time())
+        if now - self.seen[slot] > self.ttl:
+            self._remove(slot)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.seen[slot] = now
+        if slot != self.head:
+            self._unlink(slot)
+            self._push_head(slot)
+        symbols = self.symbols
+        return Session(
+            captain_id, self.names[slot], symbols[self.languages[slot]], symbols[self.statuses[slot]],
+            symbols[self.intents[slot]], self.strikes[slot], now
+        )
+    
+    def put(
+        self,
+        captain_id: str,
+        clean_name: str,
+        language: Optional[str] = None,
+        status: Optional[str] = None,
+        intent: Optional[str] = None,
+        strikes: int = 0
+    ) -> None:
+        """Create or replace the captain's session and mark it most recently used."""
+        codes = self._code(language), self._code(status), self._code(intent)
+        now = int(time.time())
+        slot = self.index.get(captain_id)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.ids[slot] = captain_id
+                self.names[slot] = clean_name
+            else:
+                slot = len(self.ids)
+                self.ids.append(captain_id)
+                self.names.append(clean_name)
+                for column in (self.languages, self.statuses, self.intents, self.strikes):
+                    column.append(0)
+                self.seen.append(0)
+                self.prev.append(-1)
+                self.next.append(-1)
+            self.index[captain_id] = slot
+        else:
+            self._unlink(slot)
+            self.bytes -= self._size(captain_id, self.names[slot])
+            self.names[slot] = clean_name
+        self.languages[slot], self.statuses[slot], self.intents[slot] = codes
+        self.strikes[slot] = min(max(strikes, 0), 255)
+        self.seen[slot] = now
+        self._push_head(slot)
+        self.bytes += self._size(captain_id, clean_name)
+        self._evict(now)
+    
+    def discard(self, captain_id: str) -> None:
+        slot = self.index.get(captain_id)
+        if slot is not None:
+            self._remove(slot)
+    
+    def _evict(self, now: int) -> None:
+        """Drop expired sessions from the tail, then LRU ones while over budget."""
+        while self.tail != -1 and now - self.seen[self.tail] > self.ttl:
+            self._remove(self.tail)
+            self.expirations += 1
+        while self.tail != -1 and (
+            self.bytes > self.max_bytes
+            or (self.max_sessions is not None and len(self.index) > self.max_sessions)
+        ):
+            self._remove(self.tail)
+            self.evictions += 1
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'sessions': len(self.index),
+            'slots': len(self.ids),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+    
+    # ---------- snapshot / restore ----------
+    
+    def _lru_order(self) -> List[int]:
+        """Live slots from least to most recently used."""
+        order, slot, prev = [], self.tail, self.prev
+        while slot != -1:
+            order.append(slot)
+            slot = prev[slot]
+        return order
+    
+    def snapshot(self, path: str) -> int:
+        """
+        Write every live session to path (atomically); returns the count.
+        
+        Layout: magic, a JSON header (symbols, section offsets), then raw
+        columns in LRU order and one UTF-8 blob of ids and names.
+        """
+        order = self._lru_order()
+        ids = [self.ids[slot] for slot in order]
+        names = [self.names[slot] for slot in order]
+        sections = [
+            ('languages', array('B', [self.languages[slot] for slot in order])),
+            ('statuses', array('B', [self.statuses[slot] for slot in order])),
+            ('intents', array('B', [self.intents[slot] for slot in order])),
+            ('strikes', array('B', [self.strikes[slot] for slot in order])),
+            ('seen', array('I', [self.seen[slot] for slot in order])),
+            ('id_lengths', array('I', map(len, ids))),
+            ('name_lengths', array('I', map(len, names))),
+        ]
+        blobs = [column.tobytes() for _, column in sections]
+        blobs.append((''.join(ids) + ''.join(names)).encode('utf-8'))
+        offsets, position = {}, 0
+        for name, blob in zip([name for name, _ in sections] + ['text'], blobs):
+            offsets[name] = [position, len(blob)]
+            position += len(blob)
+        header = json.dumps({
+            'count': len(order), 'symbols': self.symbols, 'byteorder': sys.byteorder,
+            'itemsize': array('I').itemsize, 'sections': offsets,
+        }).encode('utf-8')
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.SNAPSHOT_MAGIC + len(header).to_bytes(4, 'little') + header)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+        return len(order)
+    
+    @classmethod
+    def restore(cls, path: str, **options) -> 'SessionStore':
+        """
+        Rebuild a store from a snapshot through a read-only memory map.
+        
+        Sessions that expired meanwhile are skipped, and the oldest ones
+        are dropped if the snapshot exceeds this store's budget.
+        """
+        import mmap
+        store = cls(**options)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic = len(cls.SNAPSHOT_MAGIC)
+            if data[:magic] != cls.SNAPSHOT_MAGIC:
+                raise ValueError(f"{path}: not a session snapshot")
+            header_size = int.from_bytes(data[magic:magic + 4], 'little')
+            body = magic + 4 + header_size
+            header = json.loads(data[magic + 4:body])
+            if header['byteorder'] != sys.byteorder or header['itemsize'] != array('I').itemsize:
+                raise ValueError(f"{path}: snapshot written on an incompatible platform")
+            columns = {}
+            for name, (offset, length) in header['sections'].items():
+                chunk = data[body + offset:body + offset + length]
+                if name == 'text':
+                    text = chunk.decode('utf-8')
+                else:
+                    columns[name] = array('B' if name in ('languages', 'statuses', 'intents', 'strikes') else 'I')
+                    columns[name].frombytes(chunk)
+        count = header['count']
+        ends = list(accumulate(columns['id_lengths']))
+        starts = [0] + ends[:-1]
+        ids = [text[start:end] for start, end in zip(starts, ends)]
+        base = ends[-1] if ends else 0
+        ends = [base + end for end in accumulate(columns['name_lengths'])]
+        starts = [base] + ends[:-1]
+        names = [text[start:end] for start, end in zip(starts, ends)]
+        # Columns are oldest first and last access never decreases along them
+        keep = bisect_left(columns['seen'], int(time.time() - store.ttl))
+        if store.max_sessions is not None:
+            keep = max(keep, count - store.max_sessions)
+        total = (
+            sum(map(sys.getsizeof, ids[keep:])) + sum(map(sys.getsizeof, names[keep:]))
+            + store.ENTRY_OVERHEAD * (count - keep)
+        )
+        while keep < count and total > store.max_bytes:
+            total -= store._size(ids[keep], names[keep])
+            keep += 1
+        store._load(
+            ids[keep:], names[keep:], header['symbols'],
+            *(columns[name][keep:] for name in ('languages', 'statuses', 'intents', 'strikes', 'seen'))
+        )
+        store.bytes = total
+        return store
+    
+    def _load(self, ids, names, symbols, languages, statuses, intents, strikes, seen) -> None:
+        """Bulk-fill an empty store with columns ordered oldest first."""
+        count = len(ids)
+        self.symbols = list(symbols)
+        self.codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self.ids, self.names = ids, names
+        self.index = dict(zip(ids, range(count)))
+        self.languages, self.statuses, self.intents, self.strikes, self.seen = (
+            languages, statuses, intents, strikes, seen
+        )
+        # Slot i is older than slot i + 1
+        self.prev = array('i', range(1, count + 1))
+        self.next = array('i', range(-1, count - 1))
+        if count:
+            self.prev[-1] = -1
+        self.head, self.tail = count - 1, (0 if count else -1)
+
+
+# ============================================
+# RATE LIMITER
+# ============================================
+
+# Precomputed reply for captains over their rate limit (no name, no render)
+SLOW_DOWN_RESPONSES = {
+    'arabic': "⏳ أنت ترسل رسائل كثيرة بسرعة. من فضلك انتظر قليلاً ثم حاول مرة أخرى 🙏",
+    'english': "⏳ You're sending messages too quickly. Please wait a moment and try again 🙏",
+    'arabizi': "⏳ Enta bteb3at rasayel keteer besor3a. Law sama7t estanna shwaya w gareb tany 🙏",
+}
+
+
+class RateLimiter:
+    """
+    Per-captain token buckets in two preallocated float arrays.
+    
+    A captain id hashes to one of slots buckets (ids that collide share
+    a bucket, so keep slots well above the number of active captains).
+    Each bucket stores its token count and last refill time; allow()
+    refills at the rate of the call's status, caps at its burst and
+    takes one token. limits maps a registration status to (tokens per
+    second, burst), matched ignoring case and surrounding spaces like
+    the chatbot's own status validation; other statuses use default.
+    Lock-free: under contention a racing update can let an extra call
+    through.
+    """
+    
+    # Distinct raw status spellings whose limit lookup is remembered
+    MAX_STATUS_SPELLINGS = 1024
+    
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        default: Tuple[float, float] = (1.0, 10.0),
+        slots: int = 1 << 16,
+        responses: Optional[Dict[str, str]] = None
+    ):
+        if slots < 1 or slots & (slots - 1):
+            raise ValueError(f"slots must be a power of two, got {slots}")
+        self.limits = {status.lower().strip(): limit for status, limit in (limits or {}).items()}
+        # Raw status as sent -> (rate, burst), filled by _limit_for()
+        self._limit_by_status: Dict[Optional[str], Tuple[float, float]] = {}
+        self.default = default
+        self.mask = slots - 1
+        # Zero tokens at time zero: the first call refills to a full burst
+        self.tokens = array('d', bytes(8 * slots))
+        self.stamps = array('d', bytes(8 * slots))
+        self.responses = {**SLOW_DOWN_RESPONSES, **(responses or {})}
+        self.limited = 0
+    
+    def allow(self, captain_id: str, registration_status: Optional[str] = None) -> bool:
+        """Take one token from the captain's bucket; False when it is empty."""
+        limit = self._limit_by_status.get(registration_status)
+        if limit is None:
+            limit = self._limit_for(registration_status)
+        rate, burst = limit
+        slot = hash(captain_id) & self.mask
+        now = monotonic()
+        tokens, stamps = self.tokens, self.stamps
+        level = tokens[slot] + (now - stamps[slot]) * rate
+        if level > burst:
+            level = burst
+        stamps[slot] = now
+        if level < 1.0:
+            tokens[slot] = level
+            self.limited += 1
+            return False
+        tokens[slot] = level - 1.0
+        return True
+    
+    def _limit_for(self, registration_status: Optional[str]) -> Tuple[float, float]:
+        """Look up a raw status once and remember it (a bounded number of distinct values)."""
+        limit = self.default if registration_status is None else self.limits.get(
+            registration_status.lower().strip(), self.default
+        )
+        if len(self._limit_by_status) < self.MAX_STATUS_SPELLINGS:
+            self._limit_by_status[registration_status] = limit
+        return limit
+    
+    def slow_down(self, language: str) -> str:
+        """The precomputed slow-down reply in the captain's language (english fallback)."""
+        response = self.responses.get(language)
+        if response is None:
+            response = self.responses.get(language.lower().strip(), self.responses['english'])
+        return response
+
+
+# ============================================
+# RESPONSE CACHE
+# ============================================
+
+@dataclass(slots=True)
+class CachedResponse:
+    """One memoised reply: everything but the timestamp, plus its ETag."""
+    message: str
+    captain_name: str
+    language: str
+    status: str
+    success: bool
+    error: Optional[str]
+    template: 'CompiledTemplate'
+    etag: str
+    # Serialized body split around the timestamp value (None: not kept)
+    json_head: Optional[bytes]
+    json_tail: Optional[bytes]
+    expires: float
+    # Catalog and matchers the reply was rendered with
+    catalog: object
+    matchers: object
+    
+    def response(self, timestamp: str) -> 'ChatbotResponse':
+        response = ChatbotResponse(
+            self.message, self.captain_name, self.language, self.status,
+            timestamp, self.success, self.error
+        )
+        response._template = self.template
+        response._cached = self
+        return response
+
+
+class ResponseCache(LRUCache):
+    """
+    Rendered replies keyed by the raw (captain_name, language, status).
+    
+    A reply depends only on those three values, the template catalog and
+    the bad-words matchers, so a hit skips name cleaning, validation and
+    rendering. Entries expire after ttl seconds and are ignored once the
+    catalog is swapped or the bad-word list changes (counted in stale).
+    With serialize=True the JSON body is kept too, split around the
+    timestamp, so to_json_bytes() only stitches in the fresh timestamp.
+    The ETag is a weak validator over the body without its timestamp:
+    equal ETags mean the same reply, whenever it was generated.
+    Bounded by max_bytes (message, body and a fixed per-entry cost) and
+    max_entries, evicting least recently used entries.
+    """
+    
+    # Approximate size of a CachedResponse and its ETag string
+    RESPONSE_OVERHEAD = 240
+    
+    def __init__(
+        self,
+        max_bytes: Optional[int] = 16 << 20,
+        ttl: float = 300.0,
+        max_entries: int = 100_000,
+        serialize: bool = True
+    ):
+        super().__init__(max_entries, max_bytes)
+        import hashlib
+        self._digest = hashlib.blake2b
+        self.ttl = ttl
+        self.serialize = serialize
+        self.stale = 0
+    
+    def lookup(self, key: Tuple[str, str, str], catalog, matchers) -> Optional[CachedResponse]:
+        """The live entry for key, or None (missing, expired or rendered with old state)."""
+        entry = self.get(key)
+        if entry is not None and (
+            entry.catalog is not catalog or entry.matchers is not matchers or entry.expires < monotonic()
+        ):
+            self.stale += 1
+            return None
+        return entry
+    
+    def store(self, key: Tuple[str, str, str], response: 'ChatbotResponse', catalog, matchers) -> CachedResponse:
+        """Memoise a freshly rendered response and return its entry."""
+        body = response.to_json_bytes()
+        stamp = b',"timestamp":'
+        # Quotes inside string values are escaped: the first match is the field
+        head, _, tail = body.partition(stamp + _json_string(response.timestamp).encode('utf-8'))
+        head += stamp
+        etag = 'W/"%s"' % self._digest(head + tail, digest_size=8).hexdigest()
+        if not self.serialize:
+            head = tail = None
+        entry = CachedResponse(
+            response.message, response.captain_name, response.language, response.status,
+            response.success, response.error, response._template, etag, head, tail,
+            monotonic() + self.ttl, catalog, matchers
+        )
+        size = sys.getsizeof(response.message) + self.RESPONSE_OVERHEAD
+        if head is not None:
+            size += len(head) + len(tail)
+        self.put(key, entry, size)
+        return entry
+    
+    def stats(self) -> Dict:
+        return {**super().stats(), 'stale': self.stale}
+
+
 # ============================================
 # CHATBOT CLASS
 # ============================================
 
-@dataclass
-class ChatbotResponse:
+class _ResponseHandles:
+    """
+    Internal slots of ChatbotResponse that are not dataclass fields.
+    
+    Kept out of __init__, repr, eq and dataclasses.asdict(), which would
+    otherwise copy the whole catalog and matcher list of a cached reply.
+    """
+    
+    __slots__ = (
+        '_template',  # Compiled template the message came from, enables to_json_bytes()
+        '_cached',    # ResponseCache entry the response came from (body parts and ETag)
+    )
+
+
+@dataclass(slots=True)
+class ChatbotResponse(_ResponseHandles):
     """Structure for chatbot response."""
     message: str
     captain_name: str
@@ -434,12 +2447,81 @@ class ChatbotResponse:
     timestamp: str
     success: bool
     error: Optional[str] = None
+    
+    def __post_init__(self):
+        self._template = None
+        self._cached = None
+    
+    @property
+    def etag(self) -> Optional[str]:
+        """Weak ETag of the reply when it went through a ResponseCache."""
+        return None if self._cached is None else self._cached.etag
+    
+    def to_dict(self) -> Dict:
+        """Public fields as a plain dict (the get_response_dict shape)."""
+        return {
+            'message': self.message,
+            'captain_name': self.captain_name,
+            'language': self.language,
+            'status': self.status,
+            'timestamp': self.timestamp,
+            'success': self.success,
+            'error': self.error
+        }
+    
+    def to_json_bytes(self) -> bytes:
+        """
+        Serialize to compact UTF-8 JSON without building an intermediate dict.
+        
+        The message is assembled from the template's pre-escaped fragments,
+        so only the captain name and short fields are escaped per call.
+        Output equals json.dumps(self.to_dict(), ensure_ascii=False,
+        separators=(',', ':')).encode('utf-8'). A response served from a
+        ResponseCache stitches its timestamp into the cached body.
+        """
+        cached = self._cached
+        if cached is not None and cached.json_head is not None:
+            return cached.json_head + _json_string(self.timestamp).encode('utf-8') + cached.json_tail
+        template = self._template
+        name = _json_string(self.captain_name).encode('utf-8')
+        if template is not None and len(template.fields) == 1:
+            message = b'"' + template.render_json(name[1:-1]) + b'"'
+        else:
+            message = _json_string(self.message).encode('utf-8')
+        return b''.join((
+            b'{"message":', message,
+            b',"captain_name":', name,
+            b',"language":', _json_string(self.language).encode('utf-8'),
+            b',"status":', _json_string(self.status).encode('utf-8'),
+            b',"timestamp":', _json_string(self.timestamp).encode('utf-8'),
+            b',"success":', b'true' if self.success else b'false',
+            b',"error":', b'null' if self.error is None else _json_string(self.error).encode('utf-8'),
+            b'}'
+        ))
 
 
 class CaptainSupportChatbot:
     """
     Production-ready chatbot for captain registration support.
     Supports Arabic, English, and Arabizi.
+    
+    Concurrency contract (GIL and free-threaded builds): one instance,
+    including the module-level _chatbot, may be shared by any number of
+    threads. get_status_response, iter_status_responses, process_message
+    and the get_greeting family only read immutable state - the current
+    TemplateCatalog (replaced whole by swap_catalog), compiled templates
+    and matchers - and take no lock on their hot path. The shared caches
+    (name cache, language detector cache, lazily compiled templates and
+    matchers) tolerate concurrent use: lookups are lock-free, and only
+    inserting a miss into an LRUCache takes that cache's short internal
+    lock (exact byte accounting). Hit counters and the metrics counters
+    may lose a few increments under contention.
+    Configuration setters (swap_catalog, BadWordsFilter.set_bad_words,
+    enable_metrics) are safe to call while serving: each request sees
+    either the old or the new state. RateLimiter is lock-free and may
+    admit a few extra calls under races; ResponseCache locks only on a
+    miss. Not shared-safe: SessionStore (guard it or keep one per
+    thread) and StatusResolver (one event loop).
     """
     
     VALID_LANGUAGES = ['arabic', 'english', 'arabizi']
@@ -447,17 +2529,169 @@ class CaptainSupportChatbot:
         'under_review', 'documents_missing', 'approved',
         'rejected', 'background_check', 'system_delay'
     ]
+    GENERAL_KEYS = ['greeting', 'thank_you', 'unknown']
+    # Caps on what one batch memoises: raw (language, status) pairs,
+    # cleaned names and rendered (name, language, status) rows
+    MAX_BATCH_PAIRS = 1024
+    MAX_BATCH_NAMES = 65536
+    MAX_BATCH_MESSAGES = 4096
+    # Non-status intents and the method that answers them
+    INTENT_REPLIES = {
+        'greeting': 'get_greeting',
+        'thank_you': 'get_thank_you',
+        'unknown': 'get_unknown_response',
+    }
+    
+    def __init__(
+        self,
+        encode_templates: bool = False,
+        name_cache_size: int = 4096,
+        name_cache_bytes: Optional[int] = 1 << 20,
+        metrics: Optional[ChatbotMetrics] = None,
+        incident_log: Optional[IncidentLog] = None,
+        language_detector: Optional[LanguageDetector] = None,
+        intent_classifier: Optional[IntentClassifier] = None,
+        status_resolver=None,
+        session_store: Optional[SessionStore] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        response_cache: Optional[ResponseCache] = None,
+        words_filter: Optional[BadWordsFilter] = None
+    ):
+        # Pass a words_filter for normalized, obfuscation-resistant or
+        # token-engine matching; the name cache arguments then do not apply
+        self.filter = words_filter if words_filter is not None else BadWordsFilter(name_cache_size, name_cache_bytes)
+        self.metrics = None
+        self.incident_log = incident_log
+        if incident_log is not None and incident_log.filter is None:
+            # Log the terms this chatbot's own word lists matched
+            incident_log.filter = self.filter
+        # Picks the reply language when the requested one is missing/stale
+        self.language_detector = language_detector
+        # Routes user_message to greeting/thank_you/unknown replies
+        self.intent_classifier = intent_classifier
+        # Looks up registration_status by captain id (chatbot_capt_status)
+        self.status_resolver = status_resolver
+        # Per-captain conversation state for process_session_message
+        self.session_store = session_store
+        # Token buckets per captain id, checked before any moderation or rendering work
+        self.rate_limiter = rate_limiter
+        # Memoised status replies (get_status_response), with ETags
+        self.response_cache = response_cache
+        self.encode_templates = encode_templates
+        # Placeholders are checked now, so a malformed template fails at
+        # startup; templates and matchers are built on first use (fast import)
+        self.catalog = self.build_catalog(RESPONSES, GENERAL_RESPONSES)
+        if metrics is not None:
+            self.enable_metrics(metrics)
+    
+    # Read-only views of the current catalog
+    responses = property(lambda self: self.catalog.responses)
+    general_responses = property(lambda self: self.catalog.general_responses)
+    templates = property(lambda self: self.catalog.templates)
+    general_templates = property(lambda self: self.catalog.general_templates)
+    
+    def build_catalog(
+        self,
+        responses: Dict[str, Dict[str, str]],
+        general_responses: Dict[str, Dict[str, str]],
+        lazy: bool = True
+    ) -> TemplateCatalog:
+        """Compile templates for this chatbot's statuses and languages."""
+        return TemplateCatalog(
+            responses, general_responses, self.VALID_STATUSES, self.GENERAL_KEYS,
+            self.VALID_LANGUAGES, self.encode_templates, lazy=lazy
+        )
     
-    def __init__(self):
-        self.filter = BadWordsFilter()
-        self.responses = RESPONSES
-        self.general_responses = GENERAL_RESPONSES
+    def load_catalog(self, path: str) -> TemplateCatalog:
+        """Load, compile and swap in a JSON catalog (raises and keeps the old one if invalid)."""
+        catalog = TemplateCatalog.from_file(
+            path, self.VALID_STATUSES, self.GENERAL_KEYS, self.VALID_LANGUAGES, self.encode_templates
+        )
+        self.swap_catalog(catalog)
+        return catalog
+    
+    def swap_catalog(self, catalog: TemplateCatalog) -> None:
+        """Replace all templates at once; in-flight requests finish on the old catalog."""
+        self.catalog = catalog
+    
+    def enable_metrics(self, metrics: Optional[ChatbotMetrics] = None) -> ChatbotMetrics:
+        """
+        Switch get_status_response/process_message to instrumented versions.
+        
+        The instrumented methods are bound on the instance, so a chatbot
+        without metrics runs the plain methods with no per-call checks.
+        """
+        self.metrics = metrics or self.metrics or ChatbotMetrics()
+        self.get_status_response = self._instrumented_status_response
+        self.process_message = self._instrumented_process_message
+        return self.metrics
+    
+    def disable_metrics(self) -> None:
+        """Go back to the uninstrumented methods (collected data is kept)."""
+        self.__dict__.pop('get_status_response', None)
+        self.__dict__.pop('process_message', None)
+    
+    def _display_name(self, captain_name: str) -> str:
+        """Clean the captain name, falling back to 'Captain'."""
+        clean_name = self.filter.clean_name(captain_name)
+        if not clean_name or clean_name == '***':
+            clean_name = 'Captain'
+        return clean_name
+    
+    def _resolve(
+        self,
+        language: str,
+        registration_status: str
+    ) -> Tuple[str, str, CompiledTemplate, Optional[str]]:
+        """
+        Validate language and status and pick the compiled template.
+        
+        Returns:
+            (language, status, template, error) - error is None on success
+        """
+        # Validate and normalize language
+        language = language.lower().strip()
+        if language not in self.VALID_LANGUAGES:
+            language = 'english'
+        
+        # Validate status
+        registration_status = registration_status.lower().strip()
+        if registration_status not in self.VALID_STATUSES:
+            return (
+                language, 'unknown', self.catalog.general_templates['unknown'][language],
+                f"Invalid status: {registration_status}"
+            )
+        return language, registration_status, self.catalog.templates[registration_status][language], None
+    
+    def _respond(
+        self,
+        clean_name: str,
+        language: str,
+        status: str,
+        template: CompiledTemplate,
+        error: Optional[str],
+        timestamp: str
+    ) -> ChatbotResponse:
+        """Render a resolved template into a ChatbotResponse."""
+        response = ChatbotResponse(
+            message=template.render(clean_name),
+            captain_name=clean_name,
+            language=language,
+            status=status,
+            timestamp=timestamp,
+            success=error is None,
+            error=error
+        )
+        response._template = template
+        return response
     
     def get_status_response(
         self,
         captain_name: str,
         language: str,
-        registration_status: str
+        registration_status: str,
+        user_message: Optional[str] = None,
+        captain_id: Optional[str] = None
     ) -> ChatbotResponse:
         """
         Generate response based on captain's registration status.
@@ -466,81 +2700,224 @@ class CaptainSupportChatbot:
             captain_name: Name of the captain
             language: Language preference (arabic/english/arabizi)
             registration_status: Current registration status
+            user_message: Optional message, used for language detection
+            captain_id: Key for remembering the detected language
             
         Returns:
             ChatbotResponse object with the message
         """
-        # Clean and validate captain name
-        clean_name = self.filter.clean_name(captain_name)
-        if not clean_name or clean_name == '***':
-            clean_name = 'Captain'
+        if self.language_detector is not None:
+            language = self.language_detector.choose(captain_name, language, user_message, captain_id)
+        if self.response_cache is not None:
+            return self._cached_status_response(captain_name, language, registration_status)
+        clean_name = self._display_name(captain_name)
+        return self._respond(
+            clean_name,
+            *self._resolve(language, registration_status),
+            datetime.now().isoformat()
+        )
+    
+    def _cached_status_response(
+        self,
+        captain_name: str,
+        language: str,
+        registration_status: str
+    ) -> ChatbotResponse:
+        """get_status_response through the response cache (fresh timestamp either way)."""
+        cache = self.response_cache
+        key = (captain_name, language, registration_status)
+        # Read before rendering: a concurrent swap only makes the entry stale
+        catalog = self.catalog
+        matchers = self.filter.matchers
+        entry = cache.lookup(key, catalog, matchers)
+        timestamp = datetime.now().isoformat()
+        if entry is not None:
+            return entry.response(timestamp)
+        response = self._respond(
+            self._display_name(captain_name),
+            *self._resolve(language, registration_status),
+            timestamp
+        )
+        response._cached = cache.store(key, response, catalog, matchers)
+        return response
+    
+    async def get_status_response_by_id(
+        self,
+        captain_id: str,
+        captain_name: str,
+        language: str,
+        user_message: Optional[str] = None
+    ) -> ChatbotResponse:
+        """
+        Like get_status_response, with the status looked up by captain id.
         
-        # Validate and normalize language
-        language = language.lower().strip()
-        if language not in self.VALID_LANGUAGES:
-            language = 'english'
+        Needs a status_resolver (see chatbot_capt_status.StatusResolver).
+        An unknown captain id gets the general 'unknown' reply and an error.
+        """
+        if self.status_resolver is None:
+            raise RuntimeError("No status_resolver configured")
+        registration_status = await self.status_resolver.resolve(captain_id)
+        if registration_status is not None:
+            return self.get_status_response(captain_name, language, registration_status, user_message, captain_id)
+        response = self.get_status_response(captain_name, language, 'unknown', user_message, captain_id)
+        response.error = f"Unknown captain id: {captain_id}"
+        response._cached = None  # the cached body and ETag carry no error
+        return response
+    
+    def _iter_rendered(
+        self,
+        rows: Iterable[Tuple[str, str, str]]
+    ) -> Iterator[Tuple[str, str, str, str, Optional[str], CompiledTemplate]]:
+        """
+        (message, clean_name, language, status, error, template) per row.
         
-        # Validate status
-        registration_status = registration_status.lower().strip()
-        if registration_status not in self.VALID_STATUSES:
-            return ChatbotResponse(
-                message=self.general_responses['unknown'][language].format(captain_name=clean_name),
-                captain_name=clean_name,
-                language=language,
-                status='unknown',
-                timestamp=datetime.now().isoformat(),
-                success=False,
-                error=f"Invalid status: {registration_status}"
-            )
+        Validation and template lookup run once per distinct raw
+        (language, status) pair and name cleaning once per distinct name
+        of the batch; a repeated (name, language, status) row reuses the
+        rendered message.
+        """
+        resolved_by_pair = {}
+        clean_by_name = {}
+        rendered_by_row = {}
+        detector = self.language_detector
+        for captain_name, language, registration_status in rows:
+            row = (captain_name, language, registration_status)
+            rendered = rendered_by_row.get(row)
+            if rendered is not None:
+                yield rendered
+                continue
+            if detector is not None:
+                language = detector.choose(captain_name, language)
+            pair = (language, registration_status)
+            resolved = resolved_by_pair.get(pair)
+            if resolved is None:
+                resolved = self._resolve(language, registration_status)
+                if len(resolved_by_pair) < self.MAX_BATCH_PAIRS:
+                    resolved_by_pair[pair] = resolved
+            clean_name = clean_by_name.get(captain_name)
+            if clean_name is None:
+                clean_name = self._display_name(captain_name)
+                if len(clean_by_name) < self.MAX_BATCH_NAMES:
+                    clean_by_name[captain_name] = clean_name
+            language, status, template, error = resolved
+            rendered = (template.render(clean_name), clean_name, language, status, error, template)
+            if len(rendered_by_row) < self.MAX_BATCH_MESSAGES:
+                rendered_by_row[row] = rendered
+            yield rendered
+    
+    def iter_status_responses(
+        self,
+        rows: Iterable[Tuple[str, str, str]],
+        shared_timestamp: bool = False,
+        timestamp: Optional[str] = None
+    ) -> Iterator[ChatbotResponse]:
+        """
+        Lazily generate responses for many (name, language, status) rows.
         
-        # Get response template
-        try:
-            template = self.responses[registration_status][language]
-            message = template.format(captain_name=clean_name)
+        Each distinct (language, status) pair is validated once and each
+        distinct name cleaned once per batch. Results come out in input
+        order and are identical to get_status_response.
+        
+        Args:
+            rows: Iterable of (captain_name, language, registration_status)
+            shared_timestamp: Stamp every response with one batch timestamp
+            timestamp: Use this batch timestamp instead of generating one
             
-            return ChatbotResponse(
-                message=message,
-                captain_name=clean_name,
-                language=language,
-                status=registration_status,
-                timestamp=datetime.now().isoformat(),
-                success=True
-            )
-        except KeyError as e:
-            return ChatbotResponse(
-                message=self.general_responses['unknown'][language].format(captain_name=clean_name),
-                captain_name=clean_name,
-                language=language,
-                status=registration_status,
-                timestamp=datetime.now().isoformat(),
-                success=False,
-                error=f"Template error: {str(e)}"
+        Yields:
+            ChatbotResponse objects
+        """
+        batch_timestamp = timestamp or (datetime.now().isoformat() if shared_timestamp else None)
+        now = datetime.now
+        for message, clean_name, language, status, error, template in self._iter_rendered(rows):
+            response = ChatbotResponse(
+                message, clean_name, language, status, batch_timestamp or now().isoformat(), error is None, error
             )
+            response._template = template
+            yield response
+    
+    def iter_status_dicts(
+        self,
+        rows: Iterable[Tuple[str, str, str]],
+        shared_timestamp: bool = True,
+        timestamp: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        iter_status_responses as get_response_dict-shaped dicts.
+        
+        The dicts are built directly (no ChatbotResponse per row) and, by
+        default, share one timestamp taken when the batch starts.
+        """
+        batch_timestamp = timestamp or (datetime.now().isoformat() if shared_timestamp else None)
+        now = datetime.now
+        for message, clean_name, language, status, error, _ in self._iter_rendered(rows):
+            yield {
+                'message': message,
+                'captain_name': clean_name,
+                'language': language,
+                'status': status,
+                'timestamp': batch_timestamp or now().isoformat(),
+                'success': error is None,
+                'error': error
+            }
+    
+    def render_many_concurrently(
+        self,
+        rows: Iterable[Tuple[str, str, str]],
+        max_workers: Optional[int] = None,
+        shared_timestamp: bool = False,
+        chunk_size: int = 256,
+        executor=None
+    ) -> List[ChatbotResponse]:
+        """
+        Render many (name, language, status) rows on a thread pool.
+        
+        Rows are split into chunks of chunk_size, each rendered with
+        iter_status_responses by one task; results come back in input
+        order. Pass a long-lived concurrent.futures executor to avoid
+        starting threads per call. Rendering is CPU-bound, so on a GIL
+        build this mainly overlaps with I/O-bound threads of the caller;
+        free-threaded builds scale with cores.
+        """
+        from concurrent.futures import ThreadPoolExecutor  # ~25ms import, only for callers of this
+        rows = rows if isinstance(rows, list) else list(rows)
+        timestamp = datetime.now().isoformat() if shared_timestamp else None
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        
+        def render(chunk):
+            return list(self.iter_status_responses(chunk, timestamp=timestamp))
+        
+        if executor is None:
+            with ThreadPoolExecutor(max_workers) as pool:
+                parts = list(pool.map(render, chunks))
+        else:
+            parts = list(executor.map(render, chunks))
+        return [response for part in parts for response in part]
     
     def get_greeting(self, captain_name: str, language: str) -> str:
         """Get greeting message."""
         clean_name = self.filter.clean_name(captain_name)
         language = language.lower() if language.lower() in self.VALID_LANGUAGES else 'english'
-        return self.general_responses['greeting'][language].format(captain_name=clean_name)
+        return self.catalog.general_templates['greeting'][language].render(clean_name)
     
     def get_thank_you(self, captain_name: str, language: str) -> str:
         """Get thank you message."""
         clean_name = self.filter.clean_name(captain_name)
         language = language.lower() if language.lower() in self.VALID_LANGUAGES else 'english'
-        return self.general_responses['thank_you'][language].format(captain_name=clean_name)
+        return self.catalog.general_templates['thank_you'][language].render(clean_name)
     
     def get_unknown_response(self, captain_name: str, language: str) -> str:
         """Get response for unknown queries."""
         clean_name = self.filter.clean_name(captain_name)
         language = language.lower() if language.lower() in self.VALID_LANGUAGES else 'english'
-        return self.general_responses['unknown'][language].format(captain_name=clean_name)
+        return self.catalog.general_templates['unknown'][language].render(clean_name)
     
     def process_message(
         self,
         captain_name: str,
         language: str,
         registration_status: str,
-        user_message: Optional[str] = None
+        user_message: Optional[str] = None,
+        captain_id: Optional[str] = None
     ) -> str:
         """
         Main method to process captain message and return response.
@@ -551,18 +2928,185 @@ class CaptainSupportChatbot:
             captain_name: Captain's name
             language: Language preference
             registration_status: Current status
-            user_message: Optional message from captain (for future NLP)
+            user_message: Optional message from captain (moderation, language detection)
+            captain_id: Rate-limit and language-memory key (calls without one are not rate limited)
             
         Returns:
             Response message string
         """
+        limiter = self.rate_limiter
+        # Names are not unique: only calls with a captain id are limited
+        if limiter is not None and captain_id is not None and not limiter.allow(captain_id, registration_status):
+            return limiter.slow_down(language)
+        
         # Filter any bad words from user message if provided
         if user_message and self.filter.contains_bad_words(user_message):
-            # Log this incident (in production, you'd log to a proper system)
-            pass
+            # Queued only; the incident log writes from its own thread
+            if self.incident_log is not None:
+                self.incident_log.report(captain_name, language, user_message)
+        
+        if user_message and self.intent_classifier is not None:
+            reply = self._general_reply(captain_name, language, user_message, captain_id)
+            if reply is not None:
+                return reply
         
-        response = self.get_status_response(captain_name, language, registration_status)
+        response = self.get_status_response(captain_name, language, registration_status, user_message, captain_id)
         return response.message
+    
+    def process_session_message(
+        self,
+        captain_id: str,
+        captain_name: Optional[str] = None,
+        language: Optional[str] = None,
+        registration_status: Optional[str] = None,
+        user_message: Optional[str] = None
+    ) -> str:
+        """
+        process_message for a captain with a session (needs session_store).
+        
+        Name, language and status left out are taken from the captain's
+        session, so a follow-up turn ("thanks") only needs captain_id and
+        user_message, and the stored cleaned name skips the bad-word
+        filter. Abusive messages add a strike to the session.
+        """
+        store = self.session_store
+        if store is None:
+            raise RuntimeError("No session_store configured")
+        limiter = self.rate_limiter
+        if limiter is not None and not limiter.allow(captain_id, registration_status):
+            session = store.get(captain_id)
+            return limiter.slow_down(language or (session.language if session is not None else None) or '')
+        session = store.get(captain_id)
+        if captain_name is not None or session is None:
+            clean_name = self._display_name(captain_name or '')
+        else:
+            clean_name = session.clean_name
+        language = language or (session.language if session is not None else None) or ''
+        registration_status = (
+            registration_status or (session.status if session is not None else None) or 'under_review'
+        )
+        strikes = session.strikes if session is not None else 0
+        intent = None
+        if user_message:
+            if self.filter.contains_bad_words(user_message):
+                strikes += 1
+                if self.incident_log is not None:
+                    self.incident_log.report(clean_name, language, user_message)
+            if self.language_detector is not None:
+                language = self.language_detector.choose(clean_name, language, user_message, captain_id)
+            if self.intent_classifier is not None:
+                intent = self.intent_classifier.classify(user_message)
+        language, status, template, error = self._resolve(language, registration_status)
+        if intent is not None and intent != 'status':
+            template = self.catalog.general_templates[intent][language]
+        if error is not None:
+            status = session.status if session is not None else None
+        store.put(captain_id, clean_name, language, status, intent, strikes)
+        return template.render(clean_name)
+    
+    def _general_reply(
+        self,
+        captain_name: str,
+        language: str,
+        user_message: str,
+        captain_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Greeting/thank-you/unknown reply, or None when the message is about the status."""
+        intent = self.intent_classifier.classify(user_message)
+        if intent == 'status':
+            return None
+        if self.language_detector is not None:
+            language = self.language_detector.choose(captain_name, language, user_message, captain_id)
+        return getattr(self, self.INTENT_REPLIES[intent])(captain_name, language)
+    
+    def _instrumented_status_response(
+        self,
+        captain_name: str,
+        language: str,
+        registration_status: str,
+        user_message: Optional[str] = None,
+        captain_id: Optional[str] = None
+    ) -> ChatbotResponse:
+        """get_status_response with per-stage timings and outcome counters."""
+        metrics = self.metrics
+        if self.language_detector is not None:
+            language = self.language_detector.choose(captain_name, language, user_message, captain_id)
+        if self.response_cache is not None:
+            try:
+                response = self._cached_status_response(captain_name, language, registration_status)
+            except Exception as e:
+                metrics.count_error(type(e).__name__)
+                raise
+            metrics.count_response(response.language, response.status)
+            if response.language != language.lower().strip():
+                metrics.language_fallbacks += 1
+            if response.error is not None:
+                metrics.count_error('invalid_status' if response.status == 'unknown' else 'template')
+                metrics.unknown_fallbacks += 1
+            return response
+        try:
+            start = perf_counter()
+            clean_name = self._display_name(captain_name)
+            cleaned = perf_counter()
+            resolved_language, status, template, error = self._resolve(language, registration_status)
+            validated = perf_counter()
+            message = template.render(clean_name)
+            rendered = perf_counter()
+            timestamp = datetime.now().isoformat()
+            stamped = perf_counter()
+        except Exception as e:
+            metrics.count_error(type(e).__name__)
+            raise
+        metrics.observe('clean_name', cleaned - start)
+        metrics.observe('validate', validated - cleaned)
+        metrics.observe('render', rendered - validated)
+        metrics.observe('timestamp', stamped - rendered)
+        metrics.count_response(resolved_language, status)
+        if resolved_language != language.lower().strip():
+            metrics.language_fallbacks += 1
+        if error is not None:
+            metrics.count_error('invalid_status' if status == 'unknown' else 'template')
+            metrics.unknown_fallbacks += 1
+        response = ChatbotResponse(
+            message=message,
+            captain_name=clean_name,
+            language=resolved_language,
+            status=status,
+            timestamp=timestamp,
+            success=error is None,
+            error=error
+        )
+        response._template = template
+        return response
+    
+    def _instrumented_process_message(
+        self,
+        captain_name: str,
+        language: str,
+        registration_status: str,
+        user_message: Optional[str] = None,
+        captain_id: Optional[str] = None
+    ) -> str:
+        """process_message with the moderation check timed and counted."""
+        limiter = self.rate_limiter
+        # Names are not unique: only calls with a captain id are limited
+        if limiter is not None and captain_id is not None and not limiter.allow(captain_id, registration_status):
+            return limiter.slow_down(language)
+        if user_message:
+            start = perf_counter()
+            flagged = self.filter.contains_bad_words(user_message)
+            self.metrics.observe('moderation', perf_counter() - start)
+            if flagged:
+                self.metrics.moderation_hits += 1
+                if self.incident_log is not None:
+                    self.incident_log.report(captain_name, language, user_message)
+            if self.intent_classifier is not None:
+                reply = self._general_reply(captain_name, language, user_message, captain_id)
+                if reply is not None:
+                    return reply
+        return self.get_status_response(
+            captain_name, language, registration_status, user_message, captain_id
+        ).message
 
 
 # ============================================
@@ -576,16 +3120,20 @@ _chatbot = CaptainSupportChatbot()
 def get_captain_response(
     captain_name: str,
     language: str,
-    registration_status: str
+    registration_status: str,
+    captain_id: Optional[str] = None
 ) -> str:
     """
     Simple function to get chatbot response.
     
+    captain_id enables the global chatbot's rate limiter (if configured)
+    for this call.
+    
     Usage:
         message = get_captain_response("Ahmed", "arabic", "under_review")
         print(message)
     """
-    return _chatbot.process_message(captain_name, language, registration_status)
+    return _chatbot.process_message(captain_name, language, registration_status, captain_id=captain_id)
 
 
 def get_response_dict(
@@ -601,66 +3149,102 @@ def get_response_dict(
         # Returns: {"message": "...", "success": True, ...}
     """
     response = _chatbot.get_status_response(captain_name, language, registration_status)
-    return {
-        'message': response.message,
-        'captain_name': response.captain_name,
-        'language': response.language,
-        'status': response.status,
-        'timestamp': response.timestamp,
-        'success': response.success,
-        'error': response.error
-    }
+    return response.to_dict()
 
 
-# ============================================
-# FLASK API EXAMPLE
-# ============================================
+def _columns_to_rows(*columns: Iterable[str]) -> Iterator[Tuple[str, ...]]:
+    missing = object()
+    for row in zip_longest(*columns, fillvalue=missing):
+        if missing in row:
+            raise ValueError("Columnar input lists must have the same length")
+        yield row
 
-"""
-from flask import Flask, request, jsonify
 
-app = Flask(__name__)
+def get_response_json(
+    captain_name: str,
+    language: str,
+    registration_status: str
+) -> bytes:
+    """
+    Get response as a UTF-8 JSON body (fast path for HTTP handlers).
+    
+    Usage:
+        body = get_response_json("Ahmed", "arabic", "under_review")
+        # Returns: b'{"message":"...","captain_name":"Ahmed",...}'
+    """
+    return _chatbot.get_status_response(captain_name, language, registration_status).to_json_bytes()
+
 
-@app.route('/api/captain/message', methods=['POST'])
-def captain_message():
-    data = request.get_json()
+def get_response_dicts(
+    rows: Optional[Iterable[Union[Tuple[str, str, str], Dict]]] = None,
+    *,
+    captain_names: Optional[Iterable[str]] = None,
+    languages: Optional[Iterable[str]] = None,
+    registration_statuses: Optional[Iterable[str]] = None,
+    shared_timestamp: bool = True
+) -> Iterator[Dict]:
+    """
+    Batch version of get_response_dict (useful for backfills).
     
-    result = get_response_dict(
-        captain_name=data.get('captain_name', 'Captain'),
-        language=data.get('language', 'english'),
-        registration_status=data.get('registration_status', 'under_review')
-    )
+    Accepts either rows of (captain_name, language, registration_status)
+    tuples or dicts with those keys, or three parallel column iterables.
+    Results are yielded lazily in input order, so memory stays bounded.
+    Every dict carries the batch's start timestamp unless
+    shared_timestamp=False (one timestamp per row).
     
-    return jsonify(result)
-
-if __name__ == '__main__':
-    app.run(debug=True)
-"""
+    Usage:
+        for result in get_response_dicts([("Ahmed", "arabic", "approved")]):
+            ...
+        results = get_response_dicts(
+            captain_names=names, languages=langs, registration_statuses=statuses
+        )
+    """
+    if rows is None:
+        if captain_names is None or languages is None or registration_statuses is None:
+            raise ValueError("Pass rows or all of captain_names/languages/registration_statuses")
+        rows = _columns_to_rows(captain_names, languages, registration_statuses)
+    else:
+        rows = (
+            (row['captain_name'], row['language'], row['registration_status'])
+            if isinstance(row, dict) else row
+            for row in rows
+        )
+    return _chatbot.iter_status_dicts(rows, shared_timestamp=shared_timestamp)
+
+
+def render_prometheus_metrics(chatbot: Optional[CaptainSupportChatbot] = None) -> str:
+    """
+    Prometheus text exposition for a chatbot (default: the global one).
+    
+    Mount it on any server, e.g. GET /metrics returning this body with
+    PROMETHEUS_CONTENT_TYPE. Stage/outcome metrics appear once
+    chatbot.enable_metrics() has been called; name cache stats always do.
+    """
+    chatbot = chatbot or _chatbot
+    body = _render_cache_metrics(chatbot.filter.name_cache, 'captain_chatbot_name_cache')
+    if chatbot.metrics is not None:
+        body = chatbot.metrics.render_prometheus() + body
+    if chatbot.rate_limiter is not None:
+        body += (
+            '# TYPE captain_chatbot_rate_limited_total counter\n'
+            f'captain_chatbot_rate_limited_total {chatbot.rate_limiter.limited}\n'
+        )
+    if chatbot.response_cache is not None:
+        body += _render_cache_metrics(chatbot.response_cache, 'captain_chatbot_response_cache') + (
+            '# TYPE captain_chatbot_response_cache_stale_total counter\n'
+            f'captain_chatbot_response_cache_stale_total {chatbot.response_cache.stale}\n'
+        )
+    return body
 
 
 # ============================================
-# FASTAPI EXAMPLE
+# HTTP API
 # ============================================
 
-"""
-from fastapi import FastAPI
-from pydantic import BaseModel
-
-app = FastAPI()
-
-class CaptainRequest(BaseModel):
-    captain_name: str
-    language: str = 'english'
-    registration_status: str
-
-@app.post("/api/captain/message")
-async def captain_message(request: CaptainRequest):
-    return get_response_dict(
-        captain_name=request.captain_name,
-        language=request.language,
-        registration_status=request.registration_status
-    )
-"""
+# The ASGI service for /api/captain/message lives in chatbot_capt_server.py:
+#
+#     uvicorn chatbot_capt_server:app --host 0.0.0.0 --port 8000
+#     python chatbot_capt_server.py --port 8000      # no third-party deps
 
 
 # ============================================
@@ -0,0 +1,247 @@
+"""
+📦 CAPTAIN SUPPORT CHATBOT - BULK RENDERER
+==========================================
+Streaming JSONL renderer for bulk notifications (approval waves,
+system_delay backlogs).
+
+Every input line is a JSON object with captain_name, language and
+registration_status (same fields and defaults as the HTTP API). Every
+output line is the rendered response, or {"success": false, "error": ...,
+"line": n} for a line that could not be parsed (n counts from 1), so
+output line n always belongs to input line n.
+
+Lines are read in chunks and fanned out to a process pool. At most a few
+chunks per worker are in flight, so memory stays bounded however large
+the input is, and chunks are written back in input order as soon as the
+oldest one is ready.
+
+Run:
+    python chatbot_capt_batch.py captains.jsonl -o messages.jsonl --workers 4
+    cat captains.jsonl | python chatbot_capt_batch.py > messages.jsonl
+    python chatbot_capt_batch.py captains.jsonl -o messages.jsonl --resume
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import chatbot_capt
+import chatbot_capt_server
+
+
+# ============================================
+# RENDERING (runs in the workers)
+# ============================================
+
+def init_worker(detect_language: Optional[str] = None):
+    """Pool initializer: configure the global chatbot of a worker process."""
+    if detect_language:
+        chatbot_capt._chatbot.language_detector = chatbot_capt.LanguageDetector(detect_language)
+
+
+def error_line(line_number: int, error: str) -> bytes:
+    return json.dumps(
+        {'success': False, 'error': error, 'line': line_number},
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8') + b'\n'
+
+
+def render_chunk(first_line: int, lines: List[bytes], shared_timestamp: bool = False) -> Tuple[bytes, int]:
+    """
+    Render one chunk of raw JSONL lines into one output blob.
+
+    Returns (output bytes, number of error lines). Valid rows go through
+    iter_status_responses together, so template lookup runs once per
+    (language, status) pair of the chunk.
+    """
+    parse_row = chatbot_capt_server.CaptainSupportApp.parse_row
+    rows, errors = [], {}
+    for index, line in enumerate(lines):
+        try:
+            rows.append(parse_row(json.loads(line)))
+        except ValueError as e:  # includes JSONDecodeError and UnicodeDecodeError
+            errors[index] = error_line(first_line + index + 1, str(e))
+    responses = chatbot_capt._chatbot.iter_status_responses(rows, shared_timestamp=shared_timestamp)
+    output = [
+        errors[index] if index in errors else next(responses).to_json_bytes() + b'\n'
+        for index in range(len(lines))
+    ]
+    return b''.join(output), len(errors)
+
+
+# ============================================
+# STREAMING
+# ============================================
+
+def read_chunks(source: BinaryIO, chunk_size: int, offset: int = 0) -> Iterator[Tuple[int, List[bytes]]]:
+    """Yield (first line number, lines) chunks, skipping the first offset lines."""
+    lines = islice(source, offset, None)
+    line_number = offset
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield line_number, chunk
+        line_number += len(chunk)
+
+
+def completed_lines(path: str) -> int:
+    """
+    Count complete lines of a partial output file, dropping a torn last line.
+
+    An interrupted run can stop in the middle of a write; the file is
+    truncated back to its last newline so a resumed run appends cleanly.
+    """
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return 0
+    with f:
+        count, end = 0, 0
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count += block.count(b'\n')
+            last = block.rfind(b'\n')
+            if last >= 0:
+                end = f.tell() - len(block) + last + 1
+        f.truncate(end)
+    return count
+
+
+class Progress:
+    """Throughput reporting to a stream (stderr) every interval seconds."""
+
+    def __init__(self, stream=sys.stderr, interval: float = 2.0, offset: int = 0):
+        self.stream = stream
+        self.interval = interval
+        self.offset = offset
+        self.lines = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def update(self, lines: int, errors: int):
+        self.lines += lines
+        self.errors += errors
+        now = time.perf_counter()
+        if self.interval and now - self.reported >= self.interval:
+            self.reported = now
+            self.report(now)
+
+    def report(self, now: Optional[float] = None, final: bool = False):
+        elapsed = (now or time.perf_counter()) - self.started
+        rate = self.lines / elapsed if elapsed > 0 else 0.0
+        prefix = '✅ done:' if final else '⏳'
+        print(
+            f"{prefix} {self.lines:,} lines ({self.errors:,} errors) in {elapsed:.1f}s, "
+            f"{rate:,.0f} lines/s, next offset {self.offset + self.lines:,}",
+            file=self.stream, flush=True
+        )
+
+
+def render_stream(
+    source: BinaryIO,
+    sink: BinaryIO,
+    workers: int = os.cpu_count() or 1,
+    chunk_size: int = 2000,
+    offset: int = 0,
+    shared_timestamp: bool = False,
+    detect_language: Optional[str] = None,
+    progress: Optional[Progress] = None,
+    max_pending: Optional[int] = None
+) -> Progress:
+    """
+    Render every JSONL line of source into sink, in order.
+
+    workers=0 renders in this process (no pool). With a pool, at most
+    max_pending chunks (default 2 per worker) are queued or in flight,
+    and the oldest is written as soon as it completes. Output is flushed
+    after every chunk so an interrupted run can resume from the number of
+    lines already written.
+    """
+    progress = progress or Progress(interval=0, offset=offset)
+    chunks = read_chunks(source, chunk_size, offset)
+    if workers <= 0:
+        init_worker(detect_language)
+        for first_line, lines in chunks:
+            output, errors = render_chunk(first_line, lines, shared_timestamp)
+            sink.write(output)
+            sink.flush()
+            progress.update(len(lines), errors)
+        return progress
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(detect_language,)) as pool:
+        pending = deque()
+        for first_line, lines in chunks:
+            pending.append((len(lines), pool.submit(render_chunk, first_line, lines, shared_timestamp)))
+            # Wait for the oldest chunk first: results stay in input order
+            while len(pending) >= max_pending:
+                write_result(pending.popleft(), sink, progress)
+        while pending:
+            write_result(pending.popleft(), sink, progress)
+    return progress
+
+
+def write_result(item: Tuple[int, object], sink: BinaryIO, progress: Progress):
+    count, future = item
+    output, errors = future.result()
+    sink.write(output)
+    sink.flush()
+    progress.update(count, errors)
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Render captain responses for a JSONL file in bulk')
+    parser.add_argument('input', nargs='?', default='-', help='JSONL input (default: stdin)')
+    parser.add_argument('-o', '--output', default='-', help='JSONL output (default: stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (0: render in this process)')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='lines per worker task')
+    parser.add_argument('--offset', type=int, default=0, help='skip this many input lines')
+    parser.add_argument('--resume', action='store_true',
+                        help='append to --output, skipping as many input lines (after --offset) as it already holds')
+    parser.add_argument('--shared-timestamp', action='store_true', help='one timestamp per chunk')
+    parser.add_argument('--detect-language', choices=chatbot_capt.LanguageDetector.MODES,
+                        help='detect the reply language when it is missing (fallback) or stale (override)')
+    parser.add_argument('--progress-interval', type=float, default=2.0,
+                        help='seconds between progress lines on stderr (0: only the summary)')
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    offset = args.offset
+    if args.resume:
+        if args.output == '-':
+            parser.error('--resume needs --output')
+        offset += completed_lines(args.output)
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    sink = sys.stdout.buffer if args.output == '-' else open(args.output, 'ab' if args.resume else 'wb')
+    progress = Progress(interval=args.progress_interval, offset=offset)
+    try:
+        render_stream(
+            source, sink, args.workers, args.chunk_size, offset,
+            args.shared_timestamp, args.detect_language, progress
+        )
+    except KeyboardInterrupt:
+        progress.report()
+        print(f"⚠️ interrupted, resume with --offset {offset + progress.lines} or --resume", file=sys.stderr)
+        return 130
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+    progress.report(final=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1165 @@
+"""
+📊 CAPTAIN SUPPORT CHATBOT - BENCHMARKS
+=======================================
+Benchmark suite and micro-benchmarks for chatbot_capt.
+
+Usage:
+    python chatbot_capt_bench.py                  # run every benchmark
+    python chatbot_capt_bench.py matcher          # run selected benchmarks
+    python chatbot_capt_bench.py suite --json results.json
+    python chatbot_capt_bench.py suite --baseline baseline.json --max-regression 0.15
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import chatbot_capt
+import chatbot_capt_prefork
+import chatbot_capt_server
+
+
+# ============================================
+# HARNESS
+# ============================================
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {}
+# Machine-readable results recorded by benchmarks, written with --json
+RESULTS: Dict[str, Dict[str, float]] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark under a command-line name."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func: Callable, *args, min_time: float = 0.2) -> float:
+    """Call func(*args) repeatedly for at least min_time seconds, return ops/sec."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return loops / elapsed
+        loops *= 2
+
+
+def measure_latency(func: Callable, inputs: List[tuple], min_time: float = 0.2) -> Dict[str, float]:
+    """
+    Time func(*args) per call over the inputs, cycling until min_time.
+    
+    Returns ops/sec and p50/p99/p99.9 latency in microseconds.
+    """
+    timings = []
+    clock = time.perf_counter_ns
+    spent = 0
+    budget = min_time * 1e9
+    while spent < budget or len(timings) < 1000:
+        for args in inputs:
+            start = clock()
+            func(*args)
+            elapsed = clock() - start
+            timings.append(elapsed)
+            spent += elapsed
+    timings.sort()
+    count = len(timings)
+
+    def percentile(q: float) -> float:
+        return timings[min(count - 1, int(q * count))] / 1000
+
+    return {
+        'ops_per_sec': count / (spent / 1e9),
+        'p50_us': percentile(0.50),
+        'p99_us': percentile(0.99),
+        'p999_us': percentile(0.999),
+        'samples': count,
+    }
+
+
+def record(name: str, metrics: Dict[str, float]):
+    """Store a result for --json output and --baseline comparison."""
+    RESULTS[name] = metrics
+
+
+def compare_to_baseline(baseline: Dict[str, Dict[str, float]], max_regression: float) -> List[str]:
+    """Return a description of every result that regressed past the threshold."""
+    failures = []
+    for name, metrics in RESULTS.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if 'ops_per_sec' in base and metrics['ops_per_sec'] < base['ops_per_sec'] * (1 - max_regression):
+            failures.append(
+                f"{name}: {metrics['ops_per_sec']:,.0f} ops/s vs baseline {base['ops_per_sec']:,.0f}"
+            )
+        if 'p99_us' in base and metrics['p99_us'] > base['p99_us'] * (1 + max_regression):
+            failures.append(
+                f"{name}: p99 {metrics['p99_us']:.1f}us vs baseline {base['p99_us']:.1f}us"
+            )
+        for key in base:
+            if key.endswith('_ms') and metrics[key] > base[key] * (1 + max_regression):
+                failures.append(f"{name}: {key} {metrics[key]:.2f}ms vs baseline {base[key]:.2f}ms")
+    return failures
+
+
+def print_table(headers: List[str], rows: List[List]):
+    """Print rows as a fixed-width table."""
+    widths = [
+        max(len(str(header)), *(len(str(row[i])) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    print('  '.join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(c).rjust(w) for c, w in zip(row, widths)))
+
+
+# ============================================
+# SYNTHETIC DATA
+# ============================================
+
+def default_words() -> List[str]:
+    """Return the production bad-word lists in priority order."""
+    lists = chatbot_capt.BadWordsFilter().bad_words
+    return [word for lang_words in lists.values() for word in lang_words]
+
+
+def synthetic_words(count: int, seed: int = 7) -> List[str]:
+    """Production words padded with deterministic pseudo-words up to count."""
+    rng = random.Random(seed)
+    words = default_words()[:count]
+    alphabets = ['abcdefghijklmnopqrstuvwxyz2357', 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي']
+    seen = {word.lower() for word in words}
+    while len(words) < count:
+        alphabet = rng.choice(alphabets)
+        word = ''.join(rng.choice(alphabet) for _ in range(rng.randint(4, 9)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def legacy_filter_text(patterns: List[re.Pattern], text: str) -> str:
+    """The original one-regex-per-word masking loop."""
+    for pattern in patterns:
+        text = pattern.sub('***', text)
+    return text
+
+
+SAMPLE_TEXTS = [
+    'Ahmed Hassan',
+    'أحمد حسن',
+    'Ahmed damn shit',
+    'ya kelb ya 7mar',
+    ' '.join(['el talab beta3y fein ya basha'] * 20),
+    ' '.join(['مرحبا انا عايز اعرف حالة الطلب'] * 20 + ['كلب']),
+]
+
+
+def synthetic_rows(count: int, seed: int = 11) -> List[tuple]:
+    """Deterministic (name, language, status) rows for batch benchmarks."""
+    rng = random.Random(seed)
+    names = ['Ahmed Hassan', 'أحمد حسن', 'Mohamed', 'Sara Ahmed', 'Omar', 'محمود علي']
+    languages = chatbot_capt.CaptainSupportChatbot.VALID_LANGUAGES
+    statuses = chatbot_capt.CaptainSupportChatbot.VALID_STATUSES
+    return [
+        (f'{rng.choice(names)} {i % 997}', rng.choice(languages), rng.choice(statuses))
+        for i in range(count)
+    ]
+
+
+ARABIC_NAMES = ['أحمد', 'محمد', 'محمود', 'سارة', 'علي', 'حسن', 'فاطمة', 'عمر', 'يوسف', 'مريم']
+ENGLISH_NAMES = ['Ahmed', 'Mohamed', 'John', 'Sara', 'Ali', 'Hassan', 'Omar', 'Youssef', 'Mariam', 'Karim']
+ARABIZI_NAMES = ['A7med', 'Mo7amed', '3omar', 'Ma7moud', '7assan', 'Yousef', 'Sa3ed', 'Kh4led']
+MESSAGE_WORDS = {
+    'arabic': ['مرحبا', 'انا', 'عايز', 'اعرف', 'حالة', 'الطلب', 'بتاعي', 'امتى', 'هيتقبل', 'شكرا'],
+    'english': ['hello', 'i', 'want', 'to', 'know', 'my', 'registration', 'status', 'when', 'thanks'],
+    'arabizi': ['ahlan', 'ana', '3ayez', 'a3raf', '7alet', 'el', 'talab', 'emta', 'shokran', 'ya'],
+}
+
+
+def make_corpus(seed: int = 2024, size: int = 500) -> Dict[str, List[tuple]]:
+    """
+    Deterministic multilingual corpus for the benchmark suite.
+    
+    Returns rows (name, language, status, message) split into 'names'
+    (short, mostly clean), 'long' (multi-kilobyte messages) and
+    'profane' (messages dense in bad words).
+    """
+    rng = random.Random(seed)
+    names_by_language = {'arabic': ARABIC_NAMES, 'english': ENGLISH_NAMES, 'arabizi': ARABIZI_NAMES}
+    bad_words = default_words()
+    statuses = chatbot_capt.CaptainSupportChatbot.VALID_STATUSES + ['bogus_status']
+    corpus: Dict[str, List[tuple]] = {'names': [], 'long': [], 'profane': []}
+    for i in range(size):
+        language = rng.choice(list(names_by_language))
+        pool = names_by_language[language]
+        name = f'{rng.choice(pool)} {rng.choice(pool)}'
+        if rng.random() < 0.1:
+            name += ' ' + rng.choice(bad_words)
+        words = MESSAGE_WORDS[language]
+        status = rng.choice(statuses)
+        short = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+        long = ' '.join(rng.choice(words) for _ in range(rng.randint(300, 600)))
+        profane = ' '.join(
+            rng.choice(bad_words) if rng.random() < 0.5 else rng.choice(words)
+            for _ in range(rng.randint(10, 40))
+        )
+        corpus['names'].append((name, language, status, short))
+        corpus['long'].append((name, language, status, long))
+        corpus['profane'].append((name, language, status, profane))
+    return corpus
+
+
+# ============================================
+# BENCHMARKS
+# ============================================
+
+@benchmark('suite')
+def bench_suite(args: argparse.Namespace):
+    """Every public entry point on the multilingual corpus, with latency percentiles."""
+    corpus = make_corpus()
+    chatbot = chatbot_capt._chatbot
+    words_filter = chatbot.filter
+    uncached_filter = chatbot_capt.BadWordsFilter(name_cache_size=0)
+    cases = [
+        ('get_captain_response', chatbot_capt.get_captain_response, 'names', lambda r: r[:3]),
+        ('get_response_dict', chatbot_capt.get_response_dict, 'names', lambda r: r[:3]),
+        ('process_message/short', chatbot.process_message, 'names', lambda r: r),
+        ('process_message/long', chatbot.process_message, 'long', lambda r: r),
+        ('process_message/profane', chatbot.process_message, 'profane', lambda r: r),
+        ('filter_text/name', words_filter.filter_text, 'names', lambda r: (r[0],)),
+        ('filter_text/long', words_filter.filter_text, 'long', lambda r: (r[3],)),
+        ('filter_text/profane', words_filter.filter_text, 'profane', lambda r: (r[3],)),
+        ('contains_bad_words/short', words_filter.contains_bad_words, 'names', lambda r: (r[3],)),
+        ('contains_bad_words/long', words_filter.contains_bad_words, 'long', lambda r: (r[3],)),
+        ('contains_bad_words/profane', words_filter.contains_bad_words, 'profane', lambda r: (r[3],)),
+        ('clean_name/cached', words_filter.clean_name, 'names', lambda r: (r[0],)),
+        ('clean_name/uncached', uncached_filter.clean_name, 'names', lambda r: (r[0],)),
+    ]
+    rows = []
+    for name, func, section, pick in cases:
+        metrics = measure_latency(func, [pick(row) for row in corpus[section]], args.min_time)
+        record(name, metrics)
+        rows.append([
+            name, f"{metrics['ops_per_sec']:,.0f}", f"{metrics['p50_us']:.1f}",
+            f"{metrics['p99_us']:.1f}", f"{metrics['p999_us']:.1f}",
+        ])
+    print_table(['entry point', 'ops/s', 'p50 us', 'p99 us', 'p99.9 us'], rows)
+
+
+@benchmark('matcher')
+def bench_matcher(args: argparse.Namespace):
+    """Legacy per-word loop vs single-pass BadWordMatcher, by list size."""
+    rows = []
+    for size in (75, 300, 1000, 3000):
+        words = synthetic_words(size)
+        patterns = [
+            re.compile(rf'\b{re.escape(word)}\b', re.IGNORECASE | re.UNICODE)
+            for word in words
+        ]
+        matcher = chatbot_capt.BadWordMatcher(words)
+        for text in SAMPLE_TEXTS:
+            assert matcher.mask(text) == legacy_filter_text(patterns, text)
+
+        def run_legacy():
+            for text in SAMPLE_TEXTS:
+                legacy_filter_text(patterns, text)
+
+        def run_matcher():
+            for text in SAMPLE_TEXTS:
+                matcher.mask(text)
+
+        legacy = measure(run_legacy, min_time=args.min_time) * len(SAMPLE_TEXTS)
+        single = measure(run_matcher, min_time=args.min_time) * len(SAMPLE_TEXTS)
+        rows.append([size, f'{legacy:,.0f}', f'{single:,.0f}', f'{single / legacy:.1f}x'])
+    print_table(['words', 'legacy texts/s', 'matcher texts/s', 'speed-up'], rows)
+
+
+def mixed_script_messages(count: int = 200, seed: int = 5) -> List[str]:
+    """Long Arabic/Arabizi/English messages with tashkeel, tatweel and elongation."""
+    rng = random.Random(seed)
+    words = [word for lang_words in MESSAGE_WORDS.values() for word in lang_words]
+    variants = ['حِمَـــار', 'أحمق', 'كَلْب', 'shiiiit', 'hmar', 'ya 7maaar', 'sharmot', 'ghabi']
+    messages = []
+    for _ in range(count):
+        tokens = [rng.choice(words) for _ in range(rng.randint(200, 400))]
+        for _ in range(rng.randint(0, 3)):
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(variants))
+        messages.append(' '.join(tokens))
+    return messages
+
+
+@benchmark('normalize')
+def bench_normalize(args: argparse.Namespace):
+    """Exact vs normalized matching on long mixed-script messages."""
+    messages = mixed_script_messages()
+    words = default_words()
+    exact = chatbot_capt.BadWordMatcher(words)
+    normalized = chatbot_capt.BadWordMatcher(words, normalize=True)
+    rows = []
+    for label, matcher in (('exact', exact), ('normalized', normalized)):
+        hits = sum(len(matcher.find(text)) for text in messages)
+        metrics = measure_latency(matcher.mask, [(text,) for text in messages], args.min_time)
+        record(f'normalize/{label}', metrics)
+        rows.append([
+            label, f"{metrics['ops_per_sec']:,.0f}", f"{metrics['p50_us']:.1f}",
+            f"{metrics['p99_us']:.1f}", hits,
+        ])
+    print_table(['matcher', 'msgs/s', 'p50 us', 'p99 us', 'hits'], rows)
+
+
+ADVERSARIAL_INPUTS = {
+    'letters': 'a',
+    'spaced': 's ',
+    'dotted': 's.',
+    'confusables': '$',
+    'near-miss': 'as',
+    'zero-width': 'f\u200b',
+    'elongated': 'ssssss ',
+}
+
+
+@benchmark('obfuscation')
+def bench_obfuscation(args: argparse.Namespace):
+    """Worst-case scan cost of ObfuscationMatcher vs a naive separator-tolerant regex."""
+    matcher = chatbot_capt.ObfuscationMatcher(default_words())
+    rows = []
+    for label, unit in ADVERSARIAL_INPUTS.items():
+        per_char = []
+        for size in (1000, 10000, 100000):
+            text = (unit * size)[:size]
+            per_char.append(1e9 / (measure(matcher.spans, text, min_time=args.min_time) * size))
+        record(f'obfuscation/{label}', {'ns_per_char': per_char[-1]})
+        # Linear time: cost per character must not grow with input size
+        assert per_char[-1] < per_char[0] * 3, f'{label}: {per_char}'
+        rows.append([label] + [f'{cost:.0f}' for cost in per_char])
+    print_table(['input', 'ns/char @1k', 'ns/char @10k', 'ns/char @100k'], rows)
+
+    # One regex per variant with elongation and separators nests quantifiers
+    # and backtracks exponentially on a run that never completes.
+    naive = re.compile(r'(?:s+[\W_]*)+h+[\W_]*i+[\W_]*t', re.IGNORECASE)
+    rows = []
+    for size in (12, 16, 20):
+        text = 's' * size
+        rows.append([
+            size, f'{1e6 / measure(naive.search, text, min_time=args.min_time):,.1f}',
+            f'{1e6 / measure(matcher.spans, text, min_time=args.min_time):,.1f}',
+        ])
+    print_table(['run length', 'naive regex us', 'matcher us'], rows)
+
+
+def arabic_words(count: int, seed: int = 13) -> List[str]:
+    """Production Arabic words padded with deterministic Arabic pseudo-words."""
+    rng = random.Random(seed)
+    words = list(chatbot_capt.BadWordsFilter().bad_words['arabic'])
+    seen = set(words)
+    while len(words) < count:
+        word = ''.join(rng.choice('ابتثجحخدذرزسشصضطظعغفقكلمنهوي') for _ in range(rng.randint(4, 7)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+CLITIC_FORMS = ['والكلب', 'بالكلب', 'ياكلب', 'كلبك', 'الحمار', 'وحماره', 'يا غبي', 'ابن الكلب', 'وابن الكلب']
+
+
+@benchmark('engines')
+def bench_engines(args: argparse.Namespace):
+    """Regex vs token-hash engine on long Arabic messages, by list size."""
+    rng = random.Random(3)
+    messages = [
+        ' '.join(rng.choice(MESSAGE_WORDS['arabic']) for _ in range(rng.randint(200, 400)))
+        + ' ' + rng.choice(CLITIC_FORMS)
+        for _ in range(200)
+    ]
+    rows = []
+    for size in (24, 300, 3000):
+        words = arabic_words(size)
+        regex = chatbot_capt.BadWordMatcher(words, normalize=True)
+        token = chatbot_capt.TokenHashMatcher(
+            words, chatbot_capt.CLITIC_PREFIXES['arabic'], chatbot_capt.CLITIC_SUFFIXES['arabic']
+        )
+        row = [size]
+        for label, matcher in (('regex', regex), ('token', token)):
+            metrics = measure_latency(matcher.mask, [(text,) for text in messages], args.min_time)
+            record(f'engines/{label}/{size}', metrics)
+            row.append(f"{metrics['ops_per_sec']:,.0f}")
+        row += [
+            sum(bool(regex.search(form)) for form in CLITIC_FORMS),
+            sum(bool(token.search(form)) for form in CLITIC_FORMS),
+        ]
+        rows.append(row)
+    print_table(
+        ['words', 'regex msgs/s', 'token msgs/s', f'regex hits/{len(CLITIC_FORMS)}',
+         f'token hits/{len(CLITIC_FORMS)}'],
+        rows
+    )
+
+
+@benchmark('detect')
+def bench_detect(args: argparse.Namespace):
+    """LanguageDetector accuracy on the labelled corpus, and per-call latency."""
+    corpus = make_corpus()['names']
+    detector = chatbot_capt.LanguageDetector()
+    cases = [
+        ('name', lambda row: row[0]),
+        ('message', lambda row: row[3]),
+        ('name+message', lambda row: f'{row[0]} {row[3]}'),
+    ]
+    rows = []
+    for label, pick in cases:
+        texts = [pick(row) for row in corpus]
+        correct = sum(detector.detect(text) == row[1] for text, row in zip(texts, corpus))
+        metrics = measure_latency(detector.detect, [(text,) for text in texts], args.min_time)
+        record(f'detect/{label}', {**metrics, 'accuracy': correct / len(corpus)})
+        rows.append([
+            label, f'{correct / len(corpus):.1%}', f"{metrics['ops_per_sec']:,.0f}",
+            f"{metrics['p50_us']:.1f}", f"{metrics['p99_us']:.1f}",
+        ])
+    metrics = measure_latency(detector.choose, [(row[0], '') for row in corpus], args.min_time)
+    record('detect/cached', metrics)
+    rows.append([
+        'choose (cached)', '-', f"{metrics['ops_per_sec']:,.0f}",
+        f"{metrics['p50_us']:.1f}", f"{metrics['p99_us']:.1f}",
+    ])
+    print_table(['input', 'accuracy', 'ops/s', 'p50 us', 'p99 us'], rows)
+
+
+# Labelled user messages (message, expected intent) across all three languages
+INTENT_SAMPLES = [
+    ('hello', 'greeting'), ('hi there', 'greeting'), ('Hey!', 'greeting'),
+    ('good morning', 'greeting'), ('Good evening captain support', 'greeting'), ('hiii', 'greeting'),
+    ('مرحبا', 'greeting'), ('السلام عليكم', 'greeting'), ('اهلاً', 'greeting'),
+    ('صباح الخير', 'greeting'), ('مساء الخير يا جماعة', 'greeting'), ('ازيك', 'greeting'),
+    ('ahlan', 'greeting'), ('salam 3alekom', 'greeting'), ('marhaba', 'greeting'),
+    ('sabah el kheir', 'greeting'), ('ezayak ya basha', 'greeting'), ('ahlaaan', 'greeting'),
+    ('thanks', 'thank_you'), ('Thank you so much!', 'thank_you'), ('thx', 'thank_you'),
+    ('much appreciated', 'thank_you'), ('thanks a lot', 'thank_you'), ('thaaanks', 'thank_you'),
+    ('شكرا', 'thank_you'), ('شكراً جزيلاً', 'thank_you'), ('متشكر جدا', 'thank_you'),
+    ('تسلم ايدك', 'thank_you'), ('جزاك الله خيرا', 'thank_you'), ('الف شكر', 'thank_you'),
+    ('shokran', 'thank_you'), ('merci ya basha', 'thank_you'), ('shokraaan', 'thank_you'),
+    ('alf shokr', 'thank_you'), ('teslam', 'thank_you'), ('mersi', 'thank_you'),
+    ('what is my registration status?', 'status'), ('when will my account be approved', 'status'),
+    ('hi, is my application still under review?', 'status'), ('how long does the review take', 'status'),
+    ('I uploaded my documents, any update?', 'status'), ('why was I rejected', 'status'),
+    ('امتى الطلب هيتقبل', 'status'), ('عايز اعرف حالة الطلب', 'status'),
+    ('السلام عليكم، الحساب لسه متفعلش', 'status'), ('بعت المستندات امبارح', 'status'),
+    ('الطلب مرفوض ليه', 'status'), ('التسجيل بتاعي وصل لفين', 'status'),
+    ('ana 3ayez a3raf el talab', 'status'), ('el talab emta hyet2abal', 'status'),
+    ('ahlan, lesa mafish rad 3ala el tasjeel', 'status'), ('ba3at el wara2 ya basha', 'status'),
+    ('7alet el talab eh', 'status'), ('imta el account yeshtaghal', 'status'),
+    ('my car broke down', 'unknown'), ('can I change my phone number', 'unknown'),
+    ('where is the nearest office', 'unknown'), ('ok', 'unknown'),
+    ('العربية عطلانة', 'unknown'), ('عايز اغير رقم التليفون', 'unknown'), ('فين المكتب', 'unknown'),
+    ('tamam', 'unknown'), ('el 3arabeya 3atlana', 'unknown'), ('3ayez aghayar el rakam', 'unknown'),
+]
+
+
+@benchmark('intent')
+def bench_intent(args: argparse.Namespace):
+    """IntentClassifier accuracy on INTENT_SAMPLES, latency and batch throughput."""
+    classifier = chatbot_capt.IntentClassifier()
+    messages = [message for message, _ in INTENT_SAMPLES]
+    predicted = classifier.classify_many(messages)
+    rows = []
+    for intent in chatbot_capt.INTENTS:
+        labelled = [i for i, (_, label) in enumerate(INTENT_SAMPLES) if label == intent]
+        correct = sum(predicted[i] == intent for i in labelled)
+        rows.append([intent, len(labelled), f'{correct / len(labelled):.1%}'])
+    correct = sum(p == label for p, (_, label) in zip(predicted, INTENT_SAMPLES))
+    rows.append(['all', len(INTENT_SAMPLES), f'{correct / len(INTENT_SAMPLES):.1%}'])
+    print_table(['intent', 'samples', 'accuracy'], rows)
+    for (message, label), intent in zip(INTENT_SAMPLES, predicted):
+        if intent != label:
+            print(f'   miss: {message!r} -> {intent} (expected {label})')
+
+    metrics = measure_latency(classifier.classify, [(message,) for message in messages], args.min_time)
+    record('intent/classify', {**metrics, 'accuracy': correct / len(INTENT_SAMPLES)})
+    rows = [['classify', f"{metrics['ops_per_sec']:,.0f}", f"{metrics['p50_us']:.1f}", f"{metrics['p99_us']:.1f}"]]
+    rng = random.Random(17)
+    unique = [f'{message} {rng.randint(0, 10 ** 6)}' for message in messages * 50]
+    for label, batch in (('classify_many/repeated', messages * 50), ('classify_many/unique', unique)):
+        per_sec = measure(classifier.classify_many, batch, min_time=args.min_time) * len(batch)
+        record(f'intent/{label}', {'ops_per_sec': per_sec})
+        rows.append([label, f'{per_sec:,.0f}', '-', '-'])
+    print_table(['mode', 'msgs/s', 'p50 us', 'p99 us'], rows)
+
+
+@benchmark('severity')
+def bench_severity(args: argparse.Namespace):
+    """Hashed n-gram severity scorer (numpy), messages/sec by batch size."""
+    try:
+        import chatbot_capt_severity as severity
+        severity.require_numpy()
+    except ImportError as e:
+        print(f'   skipped: {e}')
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'weights.npy')
+        severity.train_seed_model(path)
+        scorer = severity.SeverityScorer.load(path)
+        # Regression check: a NUL inside a message must not shift later rows
+        probe = ['hello', 'nul\x00inside', 'you are stupid', '', 'شكرا']
+        if len(scorer.score(probe)) != len(probe):
+            raise AssertionError('severity: score() returned one value per separator, not per message')
+        corpus = make_corpus(size=2000)
+        # Same short/profane mix at every batch size
+        messages = [row[3] for pair in zip(corpus['names'], corpus['profane']) for row in pair] * 3
+        rows = []
+        for size in (1, 10, 100, 1000, 10000):
+            batch = messages[:size]
+            per_sec = measure(scorer.score, batch, min_time=args.min_time) * size
+            record(f'severity/batch_{size}', {'ops_per_sec': per_sec})
+            rows.append([size, f'{per_sec:,.0f}'])
+        contains = chatbot_capt._chatbot.filter.contains_bad_words
+        filter_per_sec = measure(lambda: [contains(m) for m in messages[:1000]], min_time=args.min_time) * 1000
+        rows.append(['filter loop (1000)', f'{filter_per_sec:,.0f}'])
+        print_table(['batch size', 'msgs/s'], rows)
+
+
+COLDSTART_PROBE = '''
+import time
+start = time.perf_counter()
+import chatbot_capt
+imported = time.perf_counter()
+bot = chatbot_capt._chatbot
+bot.get_status_response('Ahmed', 'en', 'approved')
+status = time.perf_counter()
+bot.process_message('Ahmed', 'ar', 'under_review', 'ya 7mar where is my account')
+done = time.perf_counter()
+print((imported - start) * 1e3, (status - imported) * 1e3, (done - status) * 1e3)
+'''
+
+
+@benchmark('coldstart')
+def bench_coldstart(args: argparse.Namespace):
+    """Import time and first-request latency in fresh processes, ms (median)."""
+    runs = 7
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', COLDSTART_PROBE],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(chatbot_capt.__file__))
+        ).stdout
+        samples.append([float(value) for value in output.split()])
+    medians = [sorted(column)[runs // 2] for column in zip(*samples)]
+    record('coldstart', dict(zip(['import_ms', 'first_status_ms', 'first_message_ms'], medians)))
+    print_table(['import', 'first status', 'first message'], [[f'{value:.2f}' for value in medians]])
+
+
+@benchmark('batch')
+def bench_batch(args: argparse.Namespace):
+    """get_response_dict loop vs get_response_dicts, rows/sec."""
+    rows = synthetic_rows(20000)
+
+    def run_loop():
+        for row in rows:
+            chatbot_capt.get_response_dict(*row)
+
+    def run_batch(shared_timestamp):
+        for _ in chatbot_capt.get_response_dicts(rows, shared_timestamp=shared_timestamp):
+            pass
+
+    loop = measure(run_loop, min_time=args.min_time) * len(rows)
+    batch = measure(run_batch, False, min_time=args.min_time) * len(rows)
+    shared = measure(run_batch, True, min_time=args.min_time) * len(rows)
+    print_table(['mode', 'rows/s', 'vs loop'], [
+        ['get_response_dict loop', f'{loop:,.0f}', '1.0x'],
+        ['get_response_dicts', f'{batch:,.0f}', f'{batch / loop:.1f}x'],
+        ['get_response_dicts shared ts', f'{shared:,.0f}', f'{shared / loop:.1f}x'],
+    ])
+
+
+@benchmark('bulk')
+def bench_bulk(args: argparse.Namespace):
+    """Streaming JSONL renderer, lines/sec by worker count."""
+    import io
+    import chatbot_capt_batch
+    body = b''.join(
+        json.dumps(dict(zip(('captain_name', 'language', 'registration_status'), row)),
+                   ensure_ascii=False).encode('utf-8') + b'\n'
+        for row in synthetic_rows(50000)
+    )
+    cpus = os.cpu_count() or 1
+    rows = []
+    for workers in sorted({0, 1, 2, cpus}):
+        start = time.perf_counter()
+        progress = chatbot_capt_batch.render_stream(io.BytesIO(body), io.BytesIO(), workers=workers)
+        per_sec = progress.lines / (time.perf_counter() - start)
+        record(f'bulk/workers_{workers}', {'ops_per_sec': per_sec})
+        rows.append([workers or 'in-process', f'{per_sec:,.0f}'])
+    print_table(['workers', 'lines/s'], rows)
+    print(f'({cpus} CPU(s) available: pool startup is included in every run)')
+
+
+@benchmark('status')
+def bench_status(args: argparse.Namespace):
+    """Burst of status lookups: backend calls and latency, direct vs resolver."""
+    import chatbot_capt_status as status
+    captains, burst = 50, 2000
+    statuses = chatbot_capt.CaptainSupportChatbot.VALID_STATUSES
+    rng = random.Random(3)
+    # Zipf-like burst: a few captains retry far more often than the rest
+    ids = [f'c-{min(int(rng.paretovariate(1.2)), captains) - 1}' for _ in range(burst)]
+
+    async def run(lookup) -> List[float]:
+        async def timed(captain_id):
+            start = time.perf_counter()
+            await lookup(captain_id)
+            return time.perf_counter() - start
+        return await asyncio.gather(*(timed(captain_id) for captain_id in ids))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'captains.sqlite')
+        status.seed_database(path, ((f'c-{i}', statuses[i % len(statuses)]) for i in range(captains)))
+        for mode in ('direct', 'resolver', 'resolver, slow db'):
+            provider = status.SQLiteStatusProvider(path, pool_size=4, latency=0.5 if 'slow' in mode else 0.002)
+            resolver = status.StatusResolver(provider, timeout=0.25)
+            lookup = provider.fetch if mode == 'direct' else resolver.resolve
+            start = time.perf_counter()
+            timings = sorted(asyncio.run(run(lookup)))
+            elapsed = time.perf_counter() - start
+            provider.close()
+            calls = burst if mode == 'direct' else resolver.backend_calls
+            p99 = timings[int(0.99 * len(timings))] * 1e3
+            record(f'status/{mode}', {'ops_per_sec': burst / elapsed, 'backend_calls': calls})
+            rows.append([mode, calls, resolver.timeouts, f'{elapsed * 1e3:,.0f}', f'{p99:,.1f}'])
+    print_table(['mode', 'backend calls', 'fallbacks', 'burst ms', 'p99 ms'], rows)
+    print(f'({burst} concurrent lookups over {len(set(ids))} captains, pool of 4 connections)')
+
+
+@benchmark('sessions')
+def bench_sessions(args: argparse.Namespace):
+    """Session store at 1M captains: bytes/session, get/put latency, snapshot."""
+    count = 1_000_000
+    languages = chatbot_capt.CaptainSupportChatbot.VALID_LANGUAGES
+    statuses = chatbot_capt.CaptainSupportChatbot.VALID_STATUSES
+    names = ENGLISH_NAMES + ARABIC_NAMES + ARABIZI_NAMES
+
+    def fill(put):
+        for i in range(count):
+            put(f'captain-{i}', f'{names[i % len(names)]} {i % 9973}', languages[i % 3], statuses[i % 6], None, i % 3)
+
+    def dict_put(table):
+        def put(captain_id, *fields):
+            table[captain_id] = chatbot_capt.Session(captain_id, *fields, 0)
+        return put
+
+    rows = []
+    for label, make in (
+        ('SessionStore', lambda: chatbot_capt.SessionStore(max_bytes=1 << 30)),
+        ('dict of Session', dict),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        store = make()
+        fill(store.put if isinstance(store, chatbot_capt.SessionStore) else dict_put(store))
+        fill_seconds = time.perf_counter() - start
+        per_session = tracemalloc.get_traced_memory()[0] / count
+        tracemalloc.stop()
+        rows.append([label, f'{per_session:.0f}', f'{count / fill_seconds:,.0f}'])
+        if isinstance(store, chatbot_capt.SessionStore):
+            sessions = store
+            estimate = store.bytes / count
+        del store
+    print_table(['layout', 'bytes/session', 'puts/s (traced)'], rows)
+    print(f'(store estimate used for max_bytes: {estimate:.0f} bytes/session)')
+
+    rng = random.Random(21)
+    keys = [(f'captain-{rng.randrange(count)}',) for _ in range(10000)]
+    get = measure_latency(sessions.get, keys, min_time=args.min_time)
+    put = measure_latency(
+        lambda key: sessions.put(key, 'Ahmed 1', 'arabic', 'approved', 'thank_you', 1), keys, min_time=args.min_time
+    )
+    record('sessions/get', get)
+    record('sessions/put', put)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        start = time.perf_counter()
+        sessions.snapshot(path)
+        written = time.perf_counter() - start
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        restored = chatbot_capt.SessionStore.restore(path, max_bytes=1 << 30)
+        loaded = time.perf_counter() - start
+    print_table(['operation', 'ops/s', 'p50 us', 'p99 us'], [
+        ['get (1M sessions)', f"{get['ops_per_sec']:,.0f}", f"{get['p50_us']:.2f}", f"{get['p99_us']:.2f}"],
+        ['put (1M sessions)', f"{put['ops_per_sec']:,.0f}", f"{put['p50_us']:.2f}", f"{put['p99_us']:.2f}"],
+    ])
+    print(f'snapshot: {size / count:.0f} bytes/session on disk, written in {written:.2f}s, '
+          f'restored {len(restored):,} sessions in {loaded:.2f}s')
+
+
+@benchmark('threads')
+def bench_threads(args: argparse.Namespace):
+    """Shared _chatbot under contention: responses/sec from 1 to 32 threads."""
+    from concurrent.futures import ThreadPoolExecutor
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    chatbot = chatbot_capt.CaptainSupportChatbot()
+    # Repeat names so most lookups hit the shared name cache
+    rows = synthetic_rows(20000)
+    per_thread = 20000
+
+    def worker(offset: int):
+        get_status_response = chatbot.get_status_response
+        for i in range(offset, offset + per_thread):
+            get_status_response(*rows[i % len(rows)])
+
+    worker(0)  # warm the name cache and templates before timing
+    table = []
+    for threads in (1, 2, 4, 8, 16, 32):
+        workers = [threading.Thread(target=worker, args=(i * 997,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        threaded = threads * per_thread / (time.perf_counter() - start)
+        with ThreadPoolExecutor(threads) as pool:
+            chatbot.render_many_concurrently(rows[:1000], executor=pool)  # start the threads
+            start = time.perf_counter()
+            chatbot.render_many_concurrently(rows, executor=pool)
+            pooled = len(rows) / (time.perf_counter() - start)
+        record(f'threads/{threads}', {'ops_per_sec': threaded, 'render_many_per_sec': pooled})
+        table.append([threads, f'{threaded:,.0f}', f'{pooled:,.0f}'])
+    print_table(['threads', 'get_status_response/s', 'render_many_concurrently rows/s'], table)
+    print(f"({sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} CPU(s): "
+          f"throughput only scales past 1 thread without the GIL and with spare cores)")
+
+
+@benchmark('ratelimit')
+def bench_ratelimit(args: argparse.Namespace):
+    """Token-bucket overhead per process_message call and cost of a limited call."""
+    ids = [f'captain-{i}' for i in range(10000)]
+    rows = [(f'Ahmed {i}', 'english', 'approved', 'hello, what is my status?', f'captain-{i}') for i in range(1000)]
+    plain = chatbot_capt.CaptainSupportChatbot()
+    # Generous limits: every call is admitted, so only the check is measured
+    limited = chatbot_capt.CaptainSupportChatbot(rate_limiter=chatbot_capt.RateLimiter(default=(1e9, 1e9)))
+    allow = limited.rate_limiter.allow
+
+    def check_all():
+        for captain_id in ids:
+            allow(captain_id, 'approved')
+
+    def call_all():
+        for captain_id in ids:
+            noop(captain_id, 'approved')
+
+    def noop(captain_id, status):
+        pass
+
+    # Amortized over a loop: per-call timers cost more than the check itself
+    check_ns = 1e9 / (measure(check_all, min_time=args.min_time) * len(ids))
+    call_ns = 1e9 / (measure(call_all, min_time=args.min_time) * len(ids))
+    record('ratelimit/allow', {'ops_per_sec': 1e9 / check_ns})
+    without = measure_latency(plain.process_message, rows, min_time=args.min_time)
+    admitted = measure_latency(limited.process_message, rows, min_time=args.min_time)
+    # Empty buckets: every call gets the precomputed slow-down reply
+    blocked = chatbot_capt.CaptainSupportChatbot(rate_limiter=chatbot_capt.RateLimiter(default=(1e-9, 1.0)))
+    for row in rows:
+        blocked.process_message(*row)
+    rejected = measure_latency(blocked.process_message, rows, min_time=args.min_time)
+    results = [
+        ('process_message, no limiter', without),
+        ('process_message, admitted', admitted),
+        ('process_message, slowed down', rejected),
+    ]
+    for label, metrics in results:
+        record(f"ratelimit/{label.replace(', ', '_').replace(' ', '_')}", metrics)
+    print_table(['path', 'calls/s', 'p50 us', 'p99 us'], [
+        [label, f"{m['ops_per_sec']:,.0f}", f"{m['p50_us']:.2f}", f"{m['p99_us']:.2f}"] for label, m in results
+    ])
+    buckets = limited.rate_limiter.tokens
+    print(f'RateLimiter.allow: {check_ns:.0f} ns/call ({check_ns - call_ns:.0f} ns over an empty call), '
+          f'{buckets.itemsize * 2 * len(buckets) // 1024} KiB of buckets')
+
+
+@benchmark('respcache')
+def bench_respcache(args: argparse.Namespace):
+    """Response cache hit path vs full render, get_status_response + to_json_bytes per call."""
+    rows = [(f'Ahmed {i}', ('arabic', 'english', 'arabizi')[i % 3], 'approved') for i in range(1000)]
+    plain = chatbot_capt.CaptainSupportChatbot()
+    cached = chatbot_capt.CaptainSupportChatbot(response_cache=chatbot_capt.ResponseCache())
+    unserialized = chatbot_capt.CaptainSupportChatbot(
+        response_cache=chatbot_capt.ResponseCache(serialize=False)
+    )
+    # No room for entries: every call renders, hashes the ETag and misses
+    missing = chatbot_capt.CaptainSupportChatbot(response_cache=chatbot_capt.ResponseCache(max_entries=0))
+    for chatbot in (plain, cached, unserialized, missing):
+        for row in rows:
+            chatbot.get_status_response(*row).to_json_bytes()
+
+    def reply(chatbot):
+        get_status_response = chatbot.get_status_response
+        return lambda *row: get_status_response(*row).to_json_bytes()
+
+    results = [
+        ('full render', measure_latency(reply(plain), rows, min_time=args.min_time)),
+        ('cache hit, stitched body', measure_latency(reply(cached), rows, min_time=args.min_time)),
+        ('cache hit, message only', measure_latency(reply(unserialized), rows, min_time=args.min_time)),
+        ('cache miss', measure_latency(reply(missing), rows, min_time=args.min_time)),
+    ]
+    for label, metrics in results:
+        record(f"respcache/{label.replace(', ', '_').replace(' ', '_')}", metrics)
+    print_table(['path', 'calls/s', 'p50 us', 'p99 us'], [
+        [label, f"{m['ops_per_sec']:,.0f}", f"{m['p50_us']:.2f}", f"{m['p99_us']:.2f}"] for label, m in results
+    ])
+    for label, chatbot in (('stitched body', cached), ('message only', unserialized)):
+        stats = chatbot.response_cache.stats()
+        print(f"{label}: {stats['bytes'] / stats['entries']:,.0f} bytes/entry, hit rate {stats['hit_rate']:.1%}")
+
+
+@benchmark('templates')
+def bench_templates(args: argparse.Namespace):
+    """str.format vs CompiledTemplate rendering, renders/sec."""
+    sources = [
+        source
+        for table in (chatbot_capt.RESPONSES, chatbot_capt.GENERAL_RESPONSES)
+        for by_language in table.values()
+        for source in by_language.values()
+    ]
+    compiled = [chatbot_capt.CompiledTemplate(source, encode=True) for source in sources]
+    name = 'أحمد حسن'
+
+    def run_format():
+        for source in sources:
+            source.format(captain_name=name)
+
+    def run_format_encode():
+        for source in sources:
+            source.format(captain_name=name).encode('utf-8')
+
+    def run_render():
+        for template in compiled:
+            template.render(name)
+
+    def run_render_bytes():
+        for template in compiled:
+            template.render_bytes(name)
+
+    results = [
+        ('str.format', measure(run_format, min_time=args.min_time)),
+        ('CompiledTemplate.render', measure(run_render, min_time=args.min_time)),
+        ('str.format + encode', measure(run_format_encode, min_time=args.min_time)),
+        ('CompiledTemplate.render_bytes', measure(run_render_bytes, min_time=args.min_time)),
+    ]
+    base = results[0][1]
+    print_table(['mode', 'renders/s', 'vs format'], [
+        [mode, f'{ops * len(sources):,.0f}', f'{ops / base:.1f}x'] for mode, ops in results
+    ])
+
+
+@benchmark('name_cache')
+def bench_name_cache(args: argparse.Namespace):
+    """clean_name with and without the LRU name cache, by population size."""
+    rng = random.Random(5)
+    rows = []
+    for population in (1000, 10000, 100000):
+        # Log-uniform traffic: a few captains contact support far more often
+        names = [f'Captain {int(population ** rng.random())}' for _ in range(20000)]
+        uncached = chatbot_capt.BadWordsFilter(name_cache_size=0)
+        cached = chatbot_capt.BadWordsFilter(name_cache_size=4096)
+
+        def run(words_filter):
+            for name in names:
+                words_filter.clean_name(name)
+
+        cold = measure(run, uncached, min_time=args.min_time) * len(names)
+        warm = measure(run, cached, min_time=args.min_time) * len(names)
+        stats = cached.name_cache.stats()
+        rows.append([
+            population, f'{cold:,.0f}', f'{warm:,.0f}', f'{warm / cold:.1f}x',
+            f"{stats['hit_rate']:.1%}", stats['evictions'], f"{stats['bytes'] / 1024:.0f} KiB",
+        ])
+    print_table(['captains', 'uncached/s', 'cached/s', 'speed-up', 'hit rate', 'evictions', 'memory'], rows)
+
+
+@dataclass
+class LegacyChatbotResponse:
+    """The original __dict__-backed response type, for comparison."""
+    message: str
+    captain_name: str
+    language: str
+    status: str
+    timestamp: str
+    success: bool
+    error: Optional[str] = None
+
+
+def allocated_per_object(factory: Callable, count: int = 10000) -> float:
+    """Average bytes allocated per object created by factory(i)."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return total / count
+
+
+@benchmark('response')
+def bench_response(args: argparse.Namespace):
+    """ChatbotResponse memory and JSON serialisation throughput."""
+    responses = [
+        chatbot_capt._chatbot.get_status_response(*row) for row in synthetic_rows(200)
+    ]
+    message = responses[0].message
+    fields = ('Ahmed', 'arabic', 'approved', '2024-01-01T00:00:00', True)
+    legacy = allocated_per_object(lambda i: LegacyChatbotResponse(message, *fields))
+    slotted = allocated_per_object(lambda i: chatbot_capt.ChatbotResponse(message, *fields))
+    print_table(['type', 'bytes/response (excl. strings)'], [
+        ['@dataclass (legacy)', f'{legacy:.0f}'],
+        ['@dataclass(slots=True)', f'{slotted:.0f}'],
+    ])
+    print()
+
+    def run_dumps():
+        for response in responses:
+            json.dumps(response.to_dict(), ensure_ascii=False).encode('utf-8')
+
+    def run_fast():
+        for response in responses:
+            response.to_json_bytes()
+
+    dumps = measure(run_dumps, min_time=args.min_time) * len(responses)
+    fast = measure(run_fast, min_time=args.min_time) * len(responses)
+    print_table(['serialisation', 'bodies/s', 'vs json.dumps'], [
+        ['json.dumps(to_dict())', f'{dumps:,.0f}', '1.0x'],
+        ['to_json_bytes()', f'{fast:,.0f}', f'{fast / dumps:.1f}x'],
+    ])
+
+
+@benchmark('metrics')
+def bench_metrics(args: argparse.Namespace):
+    """Cost of instrumentation: never enabled vs disabled vs enabled."""
+    rows = synthetic_rows(2000)
+    never = chatbot_capt.CaptainSupportChatbot()
+    disabled = chatbot_capt.CaptainSupportChatbot()
+    disabled.enable_metrics()
+    disabled.disable_metrics()
+    enabled = chatbot_capt.CaptainSupportChatbot()
+    enabled.enable_metrics()
+
+    def run(chatbot):
+        for row in rows:
+            chatbot.process_message(*row, 'hello there')
+
+    # Interleave rounds and keep the best of each so machine noise cancels out
+    chatbots = (('never enabled', never), ('disabled', disabled), ('enabled', enabled))
+    best = {label: 0.0 for label, _ in chatbots}
+    for _ in range(5):
+        for label, chatbot in chatbots:
+            best[label] = max(best[label], measure(run, chatbot, min_time=args.min_time) * len(rows))
+    results = list(best.items())
+    base = results[0][1]
+    print_table(['metrics', 'calls/s', 'ns/call overhead'], [
+        [label, f'{ops:,.0f}', f'{(1 / ops - 1 / base) * 1e9:+.0f}'] for label, ops in results
+    ])
+
+
+@benchmark('incidents')
+def bench_incidents(args: argparse.Namespace):
+    """Abuse storm: process_message latency with and without the incident log."""
+    corpus = make_corpus()['profane']
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in (
+            ('no incident log', None),
+            ('incident log, drop', {'policy': 'drop'}),
+            ('incident log, drop, tiny queue', {'policy': 'drop', 'max_queue': 64}),
+            ('incident log, block', {'policy': 'block'}),
+        ):
+            log = chatbot_capt.IncidentLog(os.path.join(tmp, f'{len(rows)}.jsonl'), **options) if options else None
+            chatbot = chatbot_capt.CaptainSupportChatbot(incident_log=log)
+            start = time.perf_counter()
+            metrics = measure_latency(chatbot.process_message, corpus, args.min_time * 5)
+            if log is not None:
+                log.close(timeout=30)
+                stats = log.stats()
+                elapsed = time.perf_counter() - start
+                written, dropped = stats['written'], stats['dropped']
+                rate = f'{written / elapsed:,.0f}'
+            else:
+                written = dropped = rate = '-'
+            rows.append([
+                label, f"{metrics['ops_per_sec']:,.0f}", f"{metrics['p99_us']:.1f}",
+                f"{metrics['p999_us']:.1f}", written, dropped, rate,
+            ])
+    print_table(['mode', 'calls/s', 'p99 us', 'p99.9 us', 'written', 'dropped', 'records/s'], rows)
+
+
+def start_server_thread(port: int = 0):
+    """Run the stand-in HTTP server in a background thread, return (server, port)."""
+    sock = chatbot_capt_server.bind_socket('127.0.0.1', port)
+    server = chatbot_capt_server.StandInServer(chatbot_capt_server.create_app())
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(sock),), daemon=True)
+    thread.start()
+    while server.server is None:
+        time.sleep(0.01)
+    return server, loop, thread, sock.getsockname()[1]
+
+
+async def keep_alive_client(port: int, body: bytes, requests: int):
+    """Send requests sequentially over one keep-alive connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = (
+        b'POST /api/captain/message HTTP/1.1\r\nhost: localhost\r\n'
+        b'content-type: application/json\r\ncontent-length: %d\r\n\r\n' % len(body)
+    ) + body
+    for _ in range(requests):
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(head.split(b'content-length: ')[1].split(b'\r\n')[0])
+        await reader.readexactly(length)
+    writer.close()
+
+
+@benchmark('http')
+def bench_http(args: argparse.Namespace):
+    """Stand-in ASGI server over keep-alive connections (client in-process), requests/sec."""
+    server, loop, thread, port = start_server_thread()
+    body = json.dumps({
+        'captain_name': 'أحمد حسن', 'language': 'arabic', 'registration_status': 'under_review'
+    }).encode('utf-8')
+    rows = []
+    for connections in (1, 8, 32):
+        per_connection = max(200, 4000 // connections)
+        start = time.perf_counter()
+
+        async def run():
+            await asyncio.gather(*(
+                keep_alive_client(port, body, per_connection) for _ in range(connections)
+            ))
+
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        rows.append([connections, f'{connections * per_connection / elapsed:,.0f}'])
+    loop.call_soon_threadsafe(server.stop)
+    thread.join(5)
+    print_table(['connections', 'requests/s'], rows)
+
+
+def _load_client_process(port: int, body: bytes, connections: int, requests: int) -> int:
+    async def run():
+        await asyncio.gather(*(
+            keep_alive_client(port, body, requests) for _ in range(connections)
+        ))
+    asyncio.run(run())
+    return connections * requests
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+@benchmark('prefork')
+def bench_prefork(args: argparse.Namespace):
+    """Pre-fork scaling: requests/sec and per-worker memory by worker count."""
+    body = json.dumps({
+        'captain_name': 'أحمد حسن', 'language': 'arabic', 'registration_status': 'under_review'
+    }).encode('utf-8')
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cpus})
+    rows = []
+    for workers in counts:
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        server = subprocess.Popen(
+            [sys.executable, chatbot_capt_prefork.__file__, '--workers', str(workers), '--port', str(port)],
+            stdout=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port(port)
+            clients = max(2, workers)
+            start = time.perf_counter()
+            with multiprocessing.Pool(clients) as pool:
+                total = sum(pool.starmap(
+                    _load_client_process, [(port, body, 8, 500)] * clients
+                ))
+            elapsed = time.perf_counter() - start
+            usage = [chatbot_capt_prefork.memory_usage(pid) for pid in chatbot_capt_prefork.child_pids(server.pid)]
+            rss = sum(u['rss'] for u in usage) / max(len(usage), 1)
+            pss = sum(u['pss'] for u in usage) / max(len(usage), 1)
+            rows.append([workers, f'{total / elapsed:,.0f}', f'{rss / 1024:.1f} MiB', f'{pss / 1024:.1f} MiB'])
+        finally:
+            server.terminate()
+            server.wait(20)
+    print_table(['workers', 'requests/s', 'RSS/worker', 'PSS/worker'], rows)
+    print(f'({cpus} CPU(s) available: requests/s only scales up to that many workers)')
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='chatbot_capt benchmarks')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum seconds per measurement')
+    parser.add_argument('--json', metavar='PATH',
+                        help='write recorded results as JSON')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='fail if results regress against this JSON file')
+    parser.add_argument('--max-regression', type=float, default=0.15,
+                        help='allowed fractional slowdown vs baseline (default 0.15)')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        print(f"\n{'=' * 60}\n📊 {name}: {BENCHMARKS[name].__doc__}\n{'-' * 60}")
+        BENCHMARKS[name](args)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': RESULTS}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        failures = compare_to_baseline(baseline, args.max_regression)
+        if failures:
+            print(f"\n❌ {len(failures)} regression(s) beyond {args.max_regression:.0%}:")
+            for failure in failures:
+                print(f"  • {failure}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,534 @@
+"""
+🚦 CAPTAIN SUPPORT CHATBOT - LOAD GENERATOR
+===========================================
+Replay a production-like traffic mix against the chatbot and record
+latency histograms.
+
+Requests are drawn from a TrafficMix: weighted languages and statuses,
+a range of name lengths, and the share of requests carrying a
+user_message (benign or abusive). Each worker replays its own seeded
+pool of requests against one target:
+
+    response    get_response_dict() in the worker process
+    message     process_message() in the worker process (moderation included)
+    http        POST /api/captain/message on a running server
+
+Closed loop (default) sends the next request as soon as the previous one
+returns. Open loop (--rate) sends on a fixed schedule, with the
+workers' sends interleaved on one shared clock; latency is timed from
+the scheduled send time, so a stall also counts against the requests
+that should have been sent during it. In closed loop the same
+coordinated-omission correction is applied by back-filling samples at
+the expected interval (--expected-interval, default: mean service time
+during warm-up).
+
+Latencies go into LatencyHistogram, an HDR-style log-bucketed histogram.
+Histograms of different workers and runs merge exactly: --json saves a
+run, --merge combines saved runs into one report.
+
+Run:
+    python chatbot_capt_load.py --target message --duration 10 --workers 2
+    python chatbot_capt_load.py --target http --url http://127.0.0.1:8000/api/captain/message --rate 2000
+    python chatbot_capt_load.py --merge run-a.json run-b.json
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from math import ceil
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import chatbot_capt
+
+
+# ============================================
+# HISTOGRAM
+# ============================================
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in integer nanoseconds.
+
+    Values below 2**precision_bits get one bucket each; above that every
+    power of two is split into 2**(precision_bits - 1) equal buckets, so
+    a reported value is at most 1/2**(precision_bits - 1) above the
+    recorded one (0.8% with the default 8 bits) whatever its magnitude.
+    Values above highest are counted as highest (and in clamped).
+    Histograms with the same highest and precision_bits merge exactly.
+    """
+
+    def __init__(self, highest: int = 60 * 10**9, precision_bits: int = 8):
+        if precision_bits < 2:
+            raise ValueError(f"precision_bits must be at least 2, got {precision_bits}")
+        self.highest = highest
+        self.precision_bits = precision_bits
+        self.counts = array('Q', bytes(8 * (self._index(highest) + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = highest
+        self.max = 0
+        self.clamped = 0
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.precision_bits
+        if shift <= 0:
+            return value
+        return (shift << (self.precision_bits - 1)) + (value >> shift)
+
+    def _value(self, index: int) -> int:
+        """Highest value that falls into bucket index."""
+        if index < 1 << self.precision_bits:
+            return index
+        shift = (index >> (self.precision_bits - 1)) - 1
+        return ((index - (shift << (self.precision_bits - 1)) + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1) -> None:
+        if value > self.highest:
+            value = self.highest
+            self.clamped += count
+        elif value < 0:
+            value = 0
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_corrected(self, value: int, expected_interval: int) -> None:
+        """
+        Record value plus the samples a stalled closed-loop client never sent.
+
+        A request that took value ns held back the requests due every
+        expected_interval ns meanwhile; they are recorded with the
+        latency they would have seen (value - interval, value - 2 * interval, ...).
+        """
+        self.record(value)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record(missing)
+            missing -= expected_interval
+
+    def percentile(self, percent: float) -> int:
+        """Value at or below which percent of the recorded values fall."""
+        if not self.count:
+            return 0
+        target = max(1, ceil(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        """Add another histogram's samples into this one."""
+        if (other.highest, other.precision_bits) != (self.highest, self.precision_bits):
+            raise ValueError("Only histograms with the same highest and precision_bits merge")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.clamped += other.clamped
+        return self
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly form (non-empty buckets only), see from_dict()."""
+        return {
+            'highest': self.highest,
+            'precision_bits': self.precision_bits,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'clamped': self.clamped,
+            'buckets': [[index, count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LatencyHistogram':
+        histogram = cls(data['highest'], data['precision_bits'])
+        for index, count in data['buckets']:
+            histogram.counts[index] = count
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.clamped = data['clamped']
+        return histogram
+
+    def summary(self, percentiles: Iterable[float] = (50, 90, 99, 99.9)) -> Dict[str, float]:
+        """Count, mean, percentiles and max in microseconds."""
+        summary = {'count': self.count, 'mean_us': self.mean / 1e3}
+        for percent in percentiles:
+            summary[f'p{percent:g}_us'] = self.percentile(percent) / 1e3
+        summary['max_us'] = self.max / 1e3
+        return summary
+
+
+# ============================================
+# TRAFFIC MIX
+# ============================================
+
+NAME_PARTS = {
+    'arabic': ['أحمد', 'محمد', 'حسن', 'علي', 'مصطفى', 'عمر', 'خالد', 'يوسف', 'إبراهيم', 'محمود', 'عبد الله'],
+    'latin': ['Ahmed', 'Mohamed', 'Hassan', 'Ali', 'Mostafa', 'Omar', 'Khaled', 'Youssef', 'Ibrahim',
+              'Mahmoud', 'Abdallah'],
+}
+
+BENIGN_MESSAGES = {
+    'arabic': ['السلام عليكم', 'ايه حالة الطلب بتاعي؟', 'شكرا جزيلا', 'امتى هتتم الموافقة؟', 'بعت الورق خلاص'],
+    'english': ['hello', 'what is my application status?', 'thanks a lot', 'when will I be approved?',
+                'I uploaded my documents'],
+    'arabizi': ['salam 3aleko', 'el talab bta3y 3amel eh?', 'shokran', 'emta hatet2ebel?', 'ba3at el wara2'],
+}
+
+
+@dataclass
+class TrafficMix:
+    """
+    Shape of the replayed traffic.
+
+    languages and statuses map values to relative weights. Names are
+    built from common names in the language's script and trimmed to a
+    length drawn uniformly from name_lengths. message_rate is the share
+    of requests with a user_message, abusive_rate the share of those
+    messages that contain a bad word.
+    """
+    languages: Dict[str, float] = field(default_factory=lambda: {
+        'arabic': 6, 'english': 3, 'arabizi': 1,
+    })
+    statuses: Dict[str, float] = field(default_factory=lambda: {
+        'under_review': 35, 'documents_missing': 20, 'approved': 20,
+        'rejected': 5, 'background_check': 10, 'system_delay': 10,
+    })
+    name_lengths: Tuple[int, int] = (3, 24)
+    message_rate: float = 0.5
+    abusive_rate: float = 0.05
+
+    def generate(self, count: int, seed: int = 0) -> List[Tuple[str, str, str, Optional[str]]]:
+        """count (captain_name, language, status, user_message) requests."""
+        rng = random.Random(seed)
+        bad_words = chatbot_capt._chatbot.filter.bad_words
+        languages, language_weights = zip(*self.languages.items())
+        statuses, status_weights = zip(*self.statuses.items())
+        requests = []
+        for language, status in zip(
+            rng.choices(languages, language_weights, k=count),
+            rng.choices(statuses, status_weights, k=count)
+        ):
+            parts = NAME_PARTS['arabic' if language == 'arabic' else 'latin']
+            length = rng.randint(*self.name_lengths)
+            name = ''
+            while len(name) < length:
+                name = f'{name} {rng.choice(parts)}' if name else rng.choice(parts)
+            name = name[:length].strip() or rng.choice(parts)
+            message = None
+            if rng.random() < self.message_rate:
+                message = rng.choice(BENIGN_MESSAGES.get(language, BENIGN_MESSAGES['english']))
+                if rng.random() < self.abusive_rate:
+                    message = f"{message} {rng.choice(bad_words.get(language, bad_words['english']))}"
+            requests.append((name, language, status, message))
+        return requests
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'arabic=6,english=3' -> {'arabic': 6.0, 'english': 3.0}"""
+    weights = {}
+    for item in spec.split(','):
+        key, _, weight = item.partition('=')
+        weights[key.strip()] = float(weight) if weight else 1.0
+    if not any(weights.values()):
+        raise ValueError(f"No positive weight in {spec!r}")
+    return weights
+
+
+# ============================================
+# TARGETS
+# ============================================
+
+TARGETS = ('response', 'message', 'http')
+
+
+class HttpTarget:
+    """POST requests to the message endpoint over one keep-alive connection."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.path = parts.path or '/api/captain/message'
+        self.timeout = timeout
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def __call__(self, request: Tuple[str, str, str, Optional[str]]) -> None:
+        name, language, status, message = request
+        data = {'captain_name': name, 'language': language, 'registration_status': status}
+        if message is not None:
+            data['user_message'] = message
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request(
+                'POST', self.path, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                {'content-type': 'application/json'}
+            )
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()  # reconnect on the next request
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def make_target(kind: str, url: Optional[str] = None) -> Callable[[Tuple], None]:
+    """A callable sending one request; it raises when the request fails."""
+    if kind == 'response':
+        get_response_dict = chatbot_capt.get_response_dict
+        return lambda request: get_response_dict(request[0], request[1], request[2])
+    if kind == 'message':
+        process_message = chatbot_capt._chatbot.process_message
+        return lambda request: process_message(*request)
+    if kind == 'http':
+        if not url:
+            raise ValueError("The http target needs a url")
+        return HttpTarget(url)
+    raise ValueError(f"Unknown target {kind!r}, expected one of {TARGETS}")
+
+
+# ============================================
+# LOAD LOOPS
+# ============================================
+
+# Open loop: time before a scheduled send spent spinning instead of
+# sleeping (keep workers below the number of idle cores)
+SPIN_NS = 200_000
+
+
+@dataclass
+class LoadOptions:
+    """One run, shared by all workers. rate is the total for all workers (None: closed loop)."""
+    target: str = 'message'
+    url: Optional[str] = None
+    duration: float = 10.0
+    warmup: float = 1.0
+    rate: Optional[float] = None
+    expected_interval: Optional[float] = None  # seconds, closed loop only
+    workers: int = 1
+    pool_size: int = 10_000
+    seed: int = 0
+    mix: TrafficMix = field(default_factory=TrafficMix)
+
+
+def run_worker(options: LoadOptions, worker: int = 0) -> Dict:
+    """
+    Replay this worker's request pool for options.duration seconds.
+
+    Returns {'requests', 'errors', 'elapsed', 'latency', 'service'} with
+    histograms in to_dict() form: latency is what callers saw
+    (coordinated-omission corrected), service the raw call time.
+    """
+    requests = options.mix.generate(options.pool_size, options.seed + worker)
+    target = make_target(options.target, options.url)
+    # System-wide clock: every worker's open-loop schedule shares one time base
+    clock = time.monotonic_ns
+    latency, service = LatencyHistogram(), LatencyHistogram()
+    errors = 0
+
+    # Warm-up (untimed, closed loop) also estimates the closed-loop interval
+    warmed = 0
+    start = clock()
+    deadline = start + int(options.warmup * 1e9)
+    while clock() < deadline:
+        try:
+            target(requests[warmed % len(requests)])
+        except Exception:
+            pass
+        warmed += 1
+    if options.expected_interval is not None:
+        expected_interval = int(options.expected_interval * 1e9)
+    else:
+        expected_interval = (clock() - start) // warmed if warmed else 0
+
+    interval = options.workers * 1e9 / options.rate if options.rate else 0.0
+    sent = 0
+    start = clock()
+    if interval:
+        # Schedule on a grid shared by all workers, worker i shifted by
+        # i / workers of an interval, so sends interleave at the total rate
+        # instead of arriving in bursts of one per worker
+        phase = int(worker * interval / options.workers)
+        start += (phase - start) % max(int(interval), 1)
+    deadline = start + int(options.duration * 1e9)
+    while True:
+        if interval:
+            # Open loop: time from the scheduled send, late or not
+            intended = start + int(sent * interval)
+            if intended >= deadline:
+                break
+            wait = intended - clock()
+            if wait > SPIN_NS:
+                time.sleep((wait - SPIN_NS) / 1e9)
+            # sleep() overshoots by tens of microseconds: spin the rest
+            begin = clock()
+            while begin < intended:
+                begin = clock()
+        else:
+            begin = intended = clock()
+            if begin >= deadline:
+                break
+        try:
+            target(requests[sent % len(requests)])
+        except Exception:
+            errors += 1
+        end = clock()
+        service.record(end - begin)
+        if interval:
+            latency.record(end - intended)
+        else:
+            latency.record_corrected(end - begin, expected_interval)
+        sent += 1
+    elapsed = (clock() - start) / 1e9
+    if isinstance(target, HttpTarget):
+        target.close()
+    return {
+        'requests': sent,
+        'errors': errors,
+        'elapsed': elapsed,
+        'latency': latency.to_dict(),
+        'service': service.to_dict(),
+    }
+
+
+def merge_results(results: Iterable[Dict]) -> Dict:
+    """Combine worker (or run) results: counts add, histograms merge, elapsed is the longest."""
+    merged = None
+    for result in results:
+        if merged is None:
+            merged = {
+                **result,
+                'latency': LatencyHistogram.from_dict(result['latency']),
+                'service': LatencyHistogram.from_dict(result['service']),
+            }
+            continue
+        merged['requests'] += result['requests']
+        merged['errors'] += result['errors']
+        merged['elapsed'] = max(merged['elapsed'], result['elapsed'])
+        merged['latency'].merge(LatencyHistogram.from_dict(result['latency']))
+        merged['service'].merge(LatencyHistogram.from_dict(result['service']))
+    if merged is None:
+        raise ValueError("No results to merge")
+    merged['latency'] = merged['latency'].to_dict()
+    merged['service'] = merged['service'].to_dict()
+    return merged
+
+
+def run_load(options: LoadOptions) -> Dict:
+    """Run all workers (workers=0: one worker in this process) and merge their results."""
+    if options.workers <= 0:
+        return merge_results([run_worker(LoadOptions(**{**vars(options), 'workers': 1}))])
+    with ProcessPoolExecutor(options.workers) as pool:
+        return merge_results(pool.map(run_worker, [options] * options.workers, range(options.workers)))
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def report(result: Dict, stream=sys.stdout):
+    elapsed = result['elapsed']
+    rate = result['requests'] / elapsed if elapsed > 0 else 0.0
+    print(f"{result['requests']:,} requests ({result['errors']:,} errors) in {elapsed:.1f}s, "
+          f"{rate:,.0f} requests/s", file=stream)
+    rows = [['', 'mean us', 'p50 us', 'p90 us', 'p99 us', 'p99.9 us', 'max us']]
+    for label in ('latency', 'service'):
+        summary = LatencyHistogram.from_dict(result[label]).summary()
+        rows.append([label] + [f"{summary[key]:,.1f}" for key in (
+            'mean_us', 'p50_us', 'p90_us', 'p99_us', 'p99.9_us', 'max_us'
+        )])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)), file=stream)
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replay a traffic mix against the captain chatbot')
+    parser.add_argument('--target', choices=TARGETS, default='message')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/captain/message', help='for --target http')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=1.0, help='untimed seconds before measuring')
+    parser.add_argument('--rate', type=float, help='open loop: total requests/s over all workers')
+    parser.add_argument('--expected-interval', type=float, metavar='US',
+                        help='closed loop: expected microseconds between requests for the '
+                             'coordinated-omission correction (default: warm-up mean, 0: off)')
+    parser.add_argument('--workers', type=int, default=1, help='client processes (0: run in this process)')
+    parser.add_argument('--pool-size', type=int, default=10_000, help='distinct requests per worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--languages', type=parse_weights, help="weights, e.g. 'arabic=6,english=3,arabizi=1'")
+    parser.add_argument('--statuses', type=parse_weights, help="weights, e.g. 'under_review=3,approved=1'")
+    parser.add_argument('--name-lengths', default='3:24', help='min:max characters per captain name')
+    parser.add_argument('--message-rate', type=float, default=0.5, help='share of requests with a user_message')
+    parser.add_argument('--abusive-rate', type=float, default=0.05, help='share of user messages with a bad word')
+    parser.add_argument('--json', metavar='PATH', help='save the merged result (histograms included)')
+    parser.add_argument('--merge', nargs='+', metavar='PATH', help='merge saved results instead of running')
+    args = parser.parse_args(argv)
+
+    if args.merge:
+        results = []
+        for path in args.merge:
+            with open(path) as f:
+                results.append(json.load(f))
+        result = merge_results(results)
+    else:
+        low, _, high = args.name_lengths.partition(':')
+        mix = TrafficMix(
+            name_lengths=(int(low), int(high or low)),
+            message_rate=args.message_rate,
+            abusive_rate=args.abusive_rate
+        )
+        if args.languages:
+            mix.languages = args.languages
+        if args.statuses:
+            mix.statuses = args.statuses
+        options = LoadOptions(
+            target=args.target, url=args.url, duration=args.duration, warmup=args.warmup,
+            rate=args.rate, workers=args.workers, pool_size=args.pool_size, seed=args.seed, mix=mix,
+            expected_interval=None if args.expected_interval is None else args.expected_interval / 1e6
+        )
+        mode = f'open loop at {args.rate:,.0f} requests/s' if args.rate else 'closed loop'
+        print(f"🚦 {args.target}, {mode}, {max(args.workers, 1)} worker(s), {args.duration:g}s", file=sys.stderr)
+        result = run_load(options)
+        result['options'] = asdict(options)
+    report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+🍴 CAPTAIN SUPPORT CHATBOT - PRE-FORK SERVER
+============================================
+Multi-process mode for the HTTP service (Linux/macOS, needs os.fork).
+
+The parent imports chatbot_capt once (global _chatbot), compiles the
+bad-word matchers and every template, warms every reply, runs gc.freeze()
+so the shared objects stay out of future collections, then forks N workers
+that accept on one shared listening socket. The supervisor restarts
+workers that crash and shuts them all down gracefully on SIGTERM/SIGINT.
+
+Run:
+    python chatbot_capt_prefork.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional
+
+import chatbot_capt
+import chatbot_capt_server
+
+
+# ============================================
+# MEMORY REPORTING
+# ============================================
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """
+    Return rss/pss/shared/private memory of a process in KiB (Linux).
+
+    PSS splits shared pages between the processes that map them, so the
+    sum of worker PSS is the real footprint of a pre-fork pool.
+    """
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+              'Private_Clean': 'private', 'Private_Dirty': 'private'}
+    usage = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    usage[fields[name]] += int(value.split()[0])
+    except OSError:
+        pass
+    return usage
+
+
+def child_pids(pid: int) -> list:
+    """Direct children of a process (Linux)."""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+# ============================================
+# SUPERVISOR
+# ============================================
+
+class PreforkSupervisor:
+    """Fork and babysit N stand-in server workers sharing one socket."""
+
+    def __init__(
+        self,
+        workers: int = os.cpu_count() or 1,
+        host: str = '127.0.0.1',
+        port: int = 8000,
+        app_factory: Callable = chatbot_capt_server.create_app,
+        graceful_timeout: float = 15.0,
+        min_uptime: float = 1.0,
+        max_restart_delay: float = 30.0,
+        catalog_path: Optional[str] = None
+    ):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.app_factory = app_factory
+        self.graceful_timeout = graceful_timeout
+        self.min_uptime = min_uptime
+        self.max_restart_delay = max_restart_delay
+        self.catalog_watcher = (
+            chatbot_capt.CatalogWatcher(chatbot_capt._chatbot, catalog_path) if catalog_path else None
+        )
+        self.sock: Optional[socket.socket] = None
+        self.app = None
+        self.children: Dict[int, int] = {}        # pid -> slot
+        self.started: Dict[int, float] = {}       # slot -> start time
+        self.restart_delay: Dict[int, float] = {}  # slot -> current backoff
+        self.restart_at: Dict[int, float] = {}     # slot -> when to respawn it
+        self.stopping = False
+
+    def warm_up(self):
+        """Build all shared state in the parent and freeze it for copy-on-write."""
+        chatbot = chatbot_capt._chatbot
+        if self.catalog_watcher is not None:
+            # Loaded once here so workers share it; each polls for changes
+            self.catalog_watcher.poll()
+        # Templates and matchers are built on first use: build them all
+        # (general templates included) before fork so workers share them
+        chatbot.catalog.compile_all()
+        chatbot.filter.matchers
+        for status in chatbot.VALID_STATUSES:
+            for language in chatbot.VALID_LANGUAGES:
+                chatbot.get_status_response('Captain', language, status).to_json_bytes()
+        self.app = self.app_factory()
+        # Objects created so far are moved to a permanent generation: the
+        # collector no longer touches their headers, so pages stay shared.
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                if self.catalog_watcher is not None:
+                    self.catalog_watcher.start()
+                chatbot_capt_server.run(self.app, sock=self.sock)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        self.started[slot] = time.monotonic()
+        return pid
+
+    def reap(self):
+        """Collect exited workers and schedule their restart unless shutting down."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            # Back off when a worker keeps dying right after start
+            uptime = time.monotonic() - self.started[slot]
+            delay = self.restart_delay.get(slot, 0.0)
+            delay = min(max(delay * 2, 0.1), self.max_restart_delay) if uptime < self.min_uptime else 0.0
+            self.restart_delay[slot] = delay
+            code = os.waitstatus_to_exitcode(status)
+            print(f"⚠️ worker {pid} (slot {slot}) exited with code {code}, restarting in {delay:.1f}s", flush=True)
+            self.restart_at[slot] = time.monotonic() + delay
+
+    def restart_due(self):
+        """Respawn workers whose backoff has elapsed (never while shutting down)."""
+        now = time.monotonic()
+        for slot, due in list(self.restart_at.items()):
+            if self.stopping:
+                return
+            if due <= now:
+                del self.restart_at[slot]
+                self.spawn(slot)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def shutdown(self):
+        """SIGTERM every worker, wait for graceful exit, then SIGKILL leftovers."""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.children.pop(pid, None)
+
+    def run(self):
+        self.sock = chatbot_capt_server.bind_socket(self.host, self.port)
+        self.warm_up()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for slot in range(self.workers):
+            self.spawn(slot)
+        print(f"🍴 {self.workers} workers serving on http://{self.host}:{self.sock.getsockname()[1]}", flush=True)
+        try:
+            while not self.stopping:
+                self.reap()
+                self.restart_due()
+                time.sleep(0.2)
+        finally:
+            self.shutdown()
+            self.sock.close()
+
+
+# ============================================
+# MAIN
+# ============================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-fork captain support chatbot server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--graceful-timeout', type=float, default=15.0)
+    parser.add_argument('--catalog', help='JSON template catalog, reloaded by every worker when it changes')
+    args = parser.parse_args()
+    PreforkSupervisor(
+        args.workers, args.host, args.port,
+        graceful_timeout=args.graceful_timeout, catalog_path=args.catalog
+    ).run()
@@ -0,0 +1,550 @@
+"""
+🌐 CAPTAIN SUPPORT CHATBOT - HTTP SERVICE
+=========================================
+Dependency-free ASGI application for chatbot_capt.
+
+Endpoints:
+    POST /api/captain/message    {"captain_name", "language", "registration_status", "user_message"?,
+                                 "captain_id"?} - captain_id is the rate-limit key (429 when over the
+                                 limit) and, with --status-db, replaces "registration_status"
+    GET  /api/captain/message    same fields as query parameters; with --response-cache replies
+                                 carry an ETag and a matching If-None-Match gets 304 (412 on POST)
+    POST /api/captain/messages   {"rows": [...], "shared_timestamp": false}
+    GET  /healthz
+    GET  /metrics                Prometheus text format
+
+Run:
+    uvicorn chatbot_capt_server:app --host 0.0.0.0 --port 8000
+    python chatbot_capt_server.py --port 8000      # stdlib stand-in server
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import socket
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import chatbot_capt
+
+
+# ============================================
+# ASGI APPLICATION
+# ============================================
+
+JSON_CONTENT_TYPE = b'application/json; charset=utf-8'
+METRICS_CONTENT_TYPE = chatbot_capt.PROMETHEUS_CONTENT_TYPE.encode()
+
+
+class CaptainSupportApp:
+    """
+    Raw ASGI callable serving the captain support chatbot.
+
+    Single messages are rendered inline (a few microseconds), larger
+    batches are rendered on the default thread pool so the event loop is
+    never blocked. On lifespan shutdown the app stops accepting work and
+    waits for in-flight requests before returning.
+    """
+
+    def __init__(
+        self,
+        chatbot: Optional[chatbot_capt.CaptainSupportChatbot] = None,
+        max_body_size: int = 64 * 1024,
+        enable_batch: bool = True,
+        max_batch_rows: int = 1000,
+        inline_batch_rows: int = 32,
+        shutdown_timeout: float = 10.0,
+        metrics: bool = False
+    ):
+        self.chatbot = chatbot or chatbot_capt._chatbot
+        if metrics:
+            self.chatbot.enable_metrics()
+        self.max_body_size = max_body_size
+        self.enable_batch = enable_batch
+        self.max_batch_rows = max_batch_rows
+        self.inline_batch_rows = inline_batch_rows
+        self.shutdown_timeout = shutdown_timeout
+        self.in_flight = 0
+        self.draining = False
+        self._idle: Optional[asyncio.Event] = None
+        # (method, path) -> (handler, response content type)
+        self.routes: Dict[Tuple[str, str], Tuple[Callable, bytes]] = {
+            ('POST', '/api/captain/message'): (self.handle_message, JSON_CONTENT_TYPE),
+            ('GET', '/api/captain/message'): (self.handle_message_query, JSON_CONTENT_TYPE),
+            ('GET', '/healthz'): (self.handle_health, JSON_CONTENT_TYPE),
+            ('GET', '/metrics'): (self.handle_metrics, METRICS_CONTENT_TYPE),
+        }
+        if enable_batch:
+            self.routes[('POST', '/api/captain/messages')] = (self.handle_batch, JSON_CONTENT_TYPE)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    # ---------- lifespan ----------
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._idle = asyncio.Event()
+                self._idle.set()
+                self.draining = False
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.drain()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def drain(self):
+        """Refuse new requests and wait for in-flight ones to finish."""
+        self.draining = True
+        if self._idle is not None and self.in_flight:
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- http ----------
+
+    async def http(self, scope, receive, send):
+        if self.draining:
+            await self.respond(send, 503, b'{"success":false,"error":"Shutting down"}', close=True)
+            return
+        route = self.routes.get((scope['method'], scope['path']))
+        if route is None:
+            if any(path == scope['path'] for _, path in self.routes):
+                await self.respond(send, 405, b'{"success":false,"error":"Method not allowed"}')
+            else:
+                await self.respond(send, 404, b'{"success":false,"error":"Not found"}')
+            return
+
+        self.in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            body = await self.read_body(scope, receive)
+            if body is None:
+                await self.respond(send, 413, b'{"success":false,"error":"Request body too large"}', close=True)
+                return
+            handler, content_type = route
+            status, payload, *headers = await handler(body, scope)
+            await self.respond(
+                send, status, payload, content_type=content_type if status == 200 else JSON_CONTENT_TYPE,
+                headers=headers[0] if headers else ()
+            )
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight and self._idle is not None:
+                self._idle.set()
+
+    async def read_body(self, scope, receive) -> Optional[bytes]:
+        """Read the request body, or return None if it exceeds max_body_size."""
+        for name, value in scope.get('headers', ()):
+            if name == b'content-length':
+                try:
+                    if int(value) > self.max_body_size:
+                        return None
+                except ValueError:
+                    return None
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    async def respond(self, send, status: int, body: bytes, close: bool = False,
+                      content_type: bytes = JSON_CONTENT_TYPE, headers=()):
+        if status == 304:
+            # Not Modified describes the cached representation: no body headers
+            headers = list(headers)
+        else:
+            headers = [(b'content-type', content_type), (b'content-length', str(len(body)).encode()), *headers]
+        if close:
+            headers.append((b'connection', b'close'))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # ---------- handlers ----------
+
+    @staticmethod
+    def parse_row(data) -> Tuple[str, str, str]:
+        """Extract (name, language, status) from a request object."""
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        row = (
+            data.get('captain_name', 'Captain'),
+            data.get('language', ''),  # missing -> english, or detected
+            data.get('registration_status', 'under_review'),
+        )
+        if not all(isinstance(value, str) for value in row):
+            raise ValueError("captain_name, language and registration_status must be strings")
+        return row
+
+    @staticmethod
+    def error_body(error: str) -> bytes:
+        return json.dumps(
+            {'success': False, 'error': error}, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    @staticmethod
+    def slow_down_body(message: str) -> bytes:
+        return json.dumps(
+            {'success': False, 'error': 'Too many requests', 'message': message},
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    @staticmethod
+    def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+        """Weak If-None-Match comparison against one ETag."""
+        if if_none_match.strip() == b'*':
+            return True
+        opaque = etag.removeprefix(b'W/')
+        return any(tag.strip().removeprefix(b'W/') == opaque for tag in if_none_match.split(b','))
+
+    async def handle_message(self, body: bytes, scope=None) -> Tuple:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            return 400, self.error_body(str(e))
+        # Not a safe method: a matching If-None-Match fails the precondition
+        return await self.reply(data, scope, 412)
+
+    async def handle_message_query(self, body: bytes, scope=None) -> Tuple:
+        query = (scope or {}).get('query_string', b'').decode('utf-8', 'replace')
+        return await self.reply(dict(parse_qsl(query)), scope, 304)
+
+    async def reply(self, data, scope, matched_status: int) -> Tuple:
+        """Render one message request; matched_status answers a matching If-None-Match."""
+        try:
+            row = self.parse_row(data)
+            user_message = data.get('user_message')
+            if user_message is not None and not isinstance(user_message, str):
+                raise ValueError("user_message must be a string")
+            captain_id = data.get('captain_id')
+            if captain_id is not None and not isinstance(captain_id, str):
+                raise ValueError("captain_id must be a string")
+        except ValueError as e:
+            return 400, self.error_body(str(e))
+        by_id = 'registration_status' not in data and self.chatbot.status_resolver is not None
+        limiter = self.chatbot.rate_limiter
+        # Names are not unique: only requests with a captain id are limited
+        if limiter is not None and captain_id is not None and not limiter.allow(
+            captain_id, None if by_id else row[2]
+        ):
+            return 429, self.slow_down_body(limiter.slow_down(row[1]))
+        if captain_id is not None and by_id:
+            response = await self.chatbot.get_status_response_by_id(captain_id, row[0], row[1], user_message)
+        else:
+            response = self.chatbot.get_status_response(*row, user_message, captain_id)
+        if response.etag is None:
+            return 200, response.to_json_bytes()
+        # Served from the response cache: clients holding this reply need no body
+        etag = response.etag.encode()
+        for name, value in (scope or {}).get('headers', ()):
+            if name == b'if-none-match' and self.etag_matches(value, etag):
+                if matched_status == 304:
+                    return 304, b'', [(b'etag', etag)]
+                return matched_status, self.error_body("Precondition failed"), [(b'etag', etag)]
+        return 200, response.to_json_bytes(), [(b'etag', etag)]
+
+    async def handle_batch(self, body: bytes, scope=None) -> Tuple[int, bytes]:
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict) or not isinstance(data.get('rows'), list):
+                raise ValueError('Expected {"rows": [...]}')
+            rows = [self.parse_row(item) for item in data['rows']]
+        except ValueError as e:
+            return 400, self.error_body(str(e))
+        if len(rows) > self.max_batch_rows:
+            return 413, self.error_body(f"At most {self.max_batch_rows} rows per batch")
+        shared_timestamp = bool(data.get('shared_timestamp', False))
+        if len(rows) <= self.inline_batch_rows:
+            return 200, self.render_batch(rows, shared_timestamp)
+        loop = asyncio.get_running_loop()
+        return 200, await loop.run_in_executor(None, self.render_batch, rows, shared_timestamp)
+
+    async def handle_health(self, body: bytes, scope=None) -> Tuple[int, bytes]:
+        return 200, b'{"status":"ok"}'
+
+    async def handle_metrics(self, body: bytes, scope=None) -> Tuple[int, bytes]:
+        return 200, chatbot_capt.render_prometheus_metrics(self.chatbot).encode('utf-8')
+
+    def render_batch(self, rows: List[Tuple[str, str, str]], shared_timestamp: bool) -> bytes:
+        responses = self.chatbot.iter_status_responses(rows, shared_timestamp=shared_timestamp)
+        return b'[' + b','.join(response.to_json_bytes() for response in responses) + b']'
+
+
+def create_app(**options) -> CaptainSupportApp:
+    """Build an ASGI app; options are passed to CaptainSupportApp."""
+    return CaptainSupportApp(**options)
+
+
+app = create_app()
+
+
+# ============================================
+# STDLIB STAND-IN SERVER
+# ============================================
+
+class _Lifespan:
+    """Drive an app's ASGI lifespan protocol from the stand-in server."""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def startup(self):
+        self.task = asyncio.create_task(
+            self.app({'type': 'lifespan', 'asgi': {'version': '3.0'}}, self.inbox.get, self.outbox.put)
+        )
+        await self.inbox.put({'type': 'lifespan.startup'})
+        await self.outbox.get()
+
+    async def shutdown(self):
+        await self.inbox.put({'type': 'lifespan.shutdown'})
+        await self.outbox.get()
+        await self.task
+
+
+class StandInServer:
+    """
+    Minimal HTTP/1.1 keep-alive server for running the ASGI app without
+    uvicorn (local load tests, pre-fork workers). Only Content-Length
+    request bodies are supported.
+    """
+
+    def __init__(
+        self,
+        asgi_app,
+        max_body_size: int = 64 * 1024,
+        keep_alive_timeout: float = 5.0
+    ):
+        self.app = asgi_app
+        self.max_body_size = max_body_size
+        self.keep_alive_timeout = keep_alive_timeout
+        self.connections: set = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.stopping: Optional[asyncio.Event] = None
+
+    async def serve(self, sock: socket.socket):
+        """Serve on an already bound, listening socket until stop() is called."""
+        self.stopping = asyncio.Event()
+        lifespan = _Lifespan(self.app)
+        await lifespan.startup()
+        self.server = await asyncio.start_server(self.handle_connection, sock=sock)
+        await self.stopping.wait()
+        # Stop accepting, let the app drain in-flight work, then drop idle sockets
+        self.server.close()
+        await lifespan.shutdown()
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                if not await self.handle_request(head, reader, writer):
+                    break
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def handle_request(self, head: bytes, reader, writer) -> bool:
+        """Serve one request; return whether the connection stays open."""
+        lines = head[:-4].split(b'\r\n')
+        try:
+            method, target, version = lines[0].split(b' ', 2)
+            headers = []
+            for line in lines[1:]:
+                name, _, value = line.partition(b':')
+                headers.append((name.strip().lower(), value.strip()))
+            header_map = dict(headers)
+            length = int(header_map.get(b'content-length', b'0'))
+        except ValueError:
+            await self.write_response(writer, 400, [], b'', keep_alive=False)
+            return False
+        if b'chunked' in header_map.get(b'transfer-encoding', b''):
+            await self.write_response(writer, 411, [], b'', keep_alive=False)
+            return False
+        if length > self.max_body_size:
+            await self.write_response(writer, 413, [], b'', keep_alive=False)
+            return False
+        try:
+            body = await reader.readexactly(length) if length else b''
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return False
+
+        keep_alive = version == b'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close'
+        path, _, query = target.partition(b'?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version[5:].decode(),
+            'method': method.decode(), 'scheme': 'http', 'path': path.decode('utf-8', 'replace'),
+            'raw_path': path, 'query_string': query, 'headers': headers,
+            'client': writer.get_extra_info('peername'), 'server': writer.get_extra_info('sockname'),
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {'type': 'http.disconnect'}
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        status = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = list(message.get('headers', []))
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            status, response_headers, chunks, keep_alive = 500, [], [], False
+        if any(name == b'connection' and value == b'close' for name, value in response_headers):
+            keep_alive = False
+        await self.write_response(writer, status, response_headers, b''.join(chunks), keep_alive)
+        return keep_alive
+
+    @staticmethod
+    async def write_response(writer, status: int, headers, body: bytes, keep_alive: bool):
+        lines = [b'HTTP/1.1 %d %s' % (status, _REASONS.get(status, b'OK'))]
+        if status != 304 and not any(name == b'content-length' for name, _ in headers):
+            lines.append(b'content-length: %d' % len(body))
+        lines.extend(name + b': ' + value for name, value in headers if name != b'connection')
+        lines.append(b'connection: keep-alive' if keep_alive else b'connection: close')
+        writer.write(b'\r\n'.join(lines) + b'\r\n\r\n' + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+_REASONS = {
+    200: b'OK', 304: b'Not Modified', 400: b'Bad Request', 404: b'Not Found', 405: b'Method Not Allowed',
+    411: b'Length Required', 412: b'Precondition Failed', 413: b'Payload Too Large',
+    429: b'Too Many Requests', 500: b'Internal Server Error', 503: b'Service Unavailable',
+}
+
+
+def bind_socket(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """Create a listening TCP socket (shareable between forked workers)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def run(asgi_app=None, host: str = '127.0.0.1', port: int = 8000, sock: Optional[socket.socket] = None):
+    """Run the stand-in server until SIGINT/SIGTERM, then shut down gracefully."""
+    server = StandInServer(asgi_app or app)
+    sock = sock or bind_socket(host, port)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, server.stop)
+        await server.serve(sock)
+
+    asyncio.run(main())
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def _engine_option(value: str) -> Tuple[str, str]:
+    """Parse a --word-engine LANGUAGE=ENGINE argument."""
+    language, _, engine = value.partition('=')
+    if not language or engine not in chatbot_capt.BadWordsFilter.ENGINES:
+        raise argparse.ArgumentTypeError(
+            f"expected LANGUAGE=ENGINE with ENGINE one of {', '.join(chatbot_capt.BadWordsFilter.ENGINES)}"
+        )
+    return language, engine
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Captain support chatbot HTTP service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--uvicorn', action='store_true', help='serve with uvicorn instead of the stand-in server')
+    parser.add_argument('--metrics', action='store_true', help='enable per-stage metrics on /metrics')
+    parser.add_argument('--detect-language', choices=chatbot_capt.LanguageDetector.MODES,
+                        help='detect the reply language when it is missing (fallback) or stale (override)')
+    parser.add_argument('--catalog', help='JSON template catalog, reloaded when the file changes')
+    parser.add_argument('--status-db', help='SQLite captains table for looking up statuses by captain_id')
+    parser.add_argument('--response-cache', type=int, metavar='MB',
+                        help='cache rendered replies in this many MB and send ETags (If-None-Match on GET -> 304)')
+    parser.add_argument('--rate-limit', type=float, nargs=2, metavar=('PER_SECOND', 'BURST'),
+                        help='token bucket per captain_id; requests over it get 429 and a slow-down reply')
+    parser.add_argument('--normalize-words', action='store_true',
+                        help='match bad words after folding diacritics, letter variants and elongation')
+    parser.add_argument('--detect-obfuscation', action='store_true',
+                        help='also match bad words split by separators, look-alikes or zero-width characters')
+    parser.add_argument('--word-engine', type=_engine_option, action='append', default=[],
+                        metavar='LANGUAGE=ENGINE', help='bad-word engine for one language: regex or token (repeatable)')
+    args = parser.parse_args()
+    if args.normalize_words or args.detect_obfuscation or args.word_engine:
+        chatbot_capt._chatbot.filter = chatbot_capt.BadWordsFilter(
+            normalize=args.normalize_words, detect_obfuscation=args.detect_obfuscation,
+            engines=dict(args.word_engine)
+        )
+        chatbot_capt._chatbot.filter.matchers  # compile before serving
+    if args.metrics:
+        chatbot_capt._chatbot.enable_metrics()
+    if args.detect_language:
+        chatbot_capt._chatbot.language_detector = chatbot_capt.LanguageDetector(args.detect_language)
+    if args.catalog:
+        chatbot_capt.CatalogWatcher(chatbot_capt._chatbot, args.catalog).start()
+    if args.status_db:
+        import chatbot_capt_status
+        chatbot_capt._chatbot.status_resolver = chatbot_capt_status.StatusResolver(
+            chatbot_capt_status.SQLiteStatusProvider(args.status_db)
+        )
+    if args.rate_limit:
+        chatbot_capt._chatbot.rate_limiter = chatbot_capt.RateLimiter(default=tuple(args.rate_limit))
+    if args.response_cache:
+        chatbot_capt._chatbot.response_cache = chatbot_capt.ResponseCache(args.response_cache << 20)
+    if args.uvicorn:
+        import uvicorn
+        uvicorn.run('chatbot_capt_server:app', host=args.host, port=args.port)
+    else:
+        print(f"🌐 Serving on http://{args.host}:{args.port}")
+        run(host=args.host, port=args.port)
@@ -0,0 +1,282 @@
+"""
+🧮 CAPTAIN SUPPORT CHATBOT - SEVERITY SCORER
+============================================
+Vectorized moderation severity for message batches (needs numpy).
+
+Messages are normalized like the bad-word filter (Arabic folding,
+tashkeel/tatweel removal, lower case, elongation collapse), split into
+character n-grams and hashed into a fixed number of buckets. A whole batch
+becomes one sparse (message, bucket) matrix, and a linear model over the
+buckets scores every message in one vectorized pass. Severity in [0, 1] is
+reported next to the existing BadWordsFilter boolean.
+
+Weights are a float32 .npy vector of dim + 1 values (the last is the bias)
+opened with memory mapping, so forked workers share one copy.
+
+Run:
+    python chatbot_capt_severity.py train severity_weights.npy
+    python chatbot_capt_severity.py score severity_weights.npy "ya 7mar" "thanks"
+"""
+
+import argparse
+import random
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, checked when a scorer is built
+    np = None
+
+import chatbot_capt
+
+
+# ============================================
+# FEATURE HASHING
+# ============================================
+
+# Multiplier of the rolling n-gram hash (64-bit wraparound)
+HASH_PRIME = 0x100000001B3
+# Final avalanche step so nearby hashes land in unrelated buckets
+HASH_MIX = 0x9E3779B97F4A7C15
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("chatbot_capt_severity needs numpy (pip install numpy)")
+
+
+def normalize_message(text: str) -> str:
+    """Canonical form used for hashing: folded, lower-cased, runs collapsed."""
+    canonical = chatbot_capt.normalize_for_matching(text)[0].lower()
+    return chatbot_capt._ELONGATION.sub(r'\1', ' '.join(canonical.split()))
+
+
+class HashedNgramVectorizer:
+    """
+    Character n-grams of a batch hashed into dim buckets in one pass.
+
+    transform() joins the normalized messages with NUL separators, builds
+    the rolling hash of every window with array shifts (no per-character
+    Python loop) and drops windows that cross a separator. Separator
+    positions come from the message lengths, so a NUL inside a message
+    is an ordinary character.
+    """
+
+    def __init__(self, ngram_range: Tuple[int, int] = (2, 4), dim: int = 1 << 18):
+        require_numpy()
+        if dim < 2 or dim & (dim - 1):
+            raise ValueError(f"dim must be a power of two, got {dim}")
+        self.ngram_range = ngram_range
+        self.dim = dim
+        # Buckets come from the top bits of the mixed hash
+        self._shift = np.uint64(64 - (dim.bit_length() - 1))
+
+    def transform(self, texts: Sequence[str]) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Return (rows, buckets): one entry per n-gram occurrence.
+
+        Together they are a COO sparse matrix of shape (len(texts), dim)
+        with implicit value 1 per occurrence.
+        """
+        # Pad with spaces so word starts and ends form their own n-grams
+        padded = [f' {normalize_message(text)} ' for text in texts]
+        joined = '\0'.join(padded)
+        codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        # Separator after every message but the last; separators[i] is the
+        # message id of position i
+        boundary = np.zeros(len(codes), dtype=np.int64)
+        ends = np.cumsum([len(text) + 1 for text in padded], dtype=np.int64)[:-1] - 1
+        boundary[ends] = 1
+        separators = np.concatenate(([0], np.cumsum(boundary)))
+        rows, buckets = [], []
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            windows = len(codes) - n + 1
+            if windows <= 0:
+                continue
+            hashes = np.full(windows, n, dtype=np.uint64)
+            for k in range(n):
+                hashes = hashes * np.uint64(HASH_PRIME) + codes[k:k + windows]
+            # Windows containing a separator span two messages
+            valid = separators[n:n + windows] == separators[:windows]
+            hashes = (hashes[valid] ^ (hashes[valid] >> np.uint64(29))) * np.uint64(HASH_MIX)
+            buckets.append(hashes >> self._shift)
+            rows.append(separators[:windows][valid])
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+        return np.concatenate(rows), np.concatenate(buckets)
+
+    def dense(self, texts: Sequence[str]) -> 'np.ndarray':
+        """Materialize the (len(texts), dim) count matrix (small batches only)."""
+        rows, buckets = self.transform(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (rows, buckets), 1.0)
+        return matrix
+
+
+# ============================================
+# LINEAR MODEL
+# ============================================
+
+class SeverityScorer:
+    """
+    Logistic model over hashed n-grams: severity = sigmoid(w . x + b).
+
+    Counts are log-scaled per message so a long message is not severe
+    just for being long. Scoring a batch is one gather (weights[buckets])
+    and one np.bincount over message ids.
+    """
+
+    # Messages vectorized at once inside one score() call
+    CHUNK_SIZE = 1024
+
+    def __init__(
+        self,
+        weights: Optional['np.ndarray'] = None,
+        vectorizer: Optional[HashedNgramVectorizer] = None,
+        words_filter: Optional[chatbot_capt.BadWordsFilter] = None
+    ):
+        require_numpy()
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        dim = self.vectorizer.dim
+        if weights is None:
+            weights = np.zeros(dim + 1, dtype=np.float32)
+        if weights.shape != (dim + 1,):
+            raise ValueError(f"Expected {dim + 1} weights (dim + bias), got shape {weights.shape}")
+        self.weights = weights
+        self.words_filter = words_filter or chatbot_capt._chatbot.filter
+
+    @classmethod
+    def load(cls, path: str, **options) -> 'SeverityScorer':
+        """Open a weights file read-only through memory mapping."""
+        require_numpy()
+        weights = np.load(path, mmap_mode='r')
+        if weights.ndim != 1 or weights.dtype != np.float32:
+            raise ValueError(f"{path}: expected a 1-D float32 weight vector")
+        dim = len(weights) - 1
+        vectorizer = options.pop('vectorizer', None) or HashedNgramVectorizer(dim=dim)
+        return cls(weights, vectorizer, **options)
+
+    def save(self, path: str):
+        np.save(path, np.asarray(self.weights, dtype=np.float32))
+
+    def _features(self, texts: Sequence[str]) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """(rows, buckets, values) with log-scaled counts per message."""
+        rows, buckets = self.vectorizer.transform(texts)
+        counts = np.bincount(rows, minlength=len(texts)).astype(np.float32)
+        values = 1.0 / np.log2(2.0 + counts[rows])
+        return rows, buckets, values
+
+    def decision(self, texts: Sequence[str]) -> 'np.ndarray':
+        """Raw linear scores for a batch."""
+        # Large batches go through in chunks so the n-gram arrays stay cache-sized
+        if len(texts) > self.CHUNK_SIZE:
+            return np.concatenate([
+                self.decision(texts[start:start + self.CHUNK_SIZE])
+                for start in range(0, len(texts), self.CHUNK_SIZE)
+            ])
+        rows, buckets, values = self._features(texts)
+        dim = self.vectorizer.dim
+        scores = np.bincount(rows, weights=self.weights[buckets] * values, minlength=len(texts))
+        return scores + float(self.weights[dim])
+
+    def score(self, texts: Sequence[str]) -> 'np.ndarray':
+        """Severity in [0, 1] for every message of the batch."""
+        return 1.0 / (1.0 + np.exp(-self.decision(texts)))
+
+    def moderate(self, texts: Sequence[str]) -> List[Tuple[bool, float]]:
+        """(contains_bad_words, severity) per message."""
+        contains = self.words_filter.contains_bad_words
+        return [(contains(text), float(severity)) for text, severity in zip(texts, self.score(texts))]
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[float],
+        epochs: int = 300,
+        learning_rate: float = 20.0,
+        l2: float = 1e-6
+    ) -> 'SeverityScorer':
+        """Full-batch logistic regression; gradients are bincounts too."""
+        rows, buckets, values = self._features(texts)
+        targets = np.asarray(labels, dtype=np.float64)
+        dim = self.vectorizer.dim
+        weights = np.zeros(dim + 1, dtype=np.float64)
+        for _ in range(epochs):
+            scores = np.bincount(rows, weights=weights[buckets] * values, minlength=len(texts)) + weights[dim]
+            errors = 1.0 / (1.0 + np.exp(-scores)) - targets
+            gradient = np.bincount(buckets, weights=errors[rows] * values, minlength=dim) / len(texts)
+            weights[:dim] -= learning_rate * (gradient + l2 * weights[:dim])
+            weights[dim] -= learning_rate * errors.mean()
+        self.weights = weights.astype(np.float32)
+        return self
+
+
+# ============================================
+# SEED TRAINING DATA
+# ============================================
+
+def seed_training_set(
+    words_filter: Optional[chatbot_capt.BadWordsFilter] = None,
+    size: int = 4000,
+    seed: int = 99
+) -> Tuple[List[str], List[int]]:
+    """
+    Labelled messages built from the response templates (clean) and the
+    filter's word lists (abusive), for a starting model before real
+    moderation data is available.
+    """
+    rng = random.Random(seed)
+    words_filter = words_filter or chatbot_capt._chatbot.filter
+    bad_words = [word for words in words_filter.bad_words.values() for word in words]
+    sentences = [
+        line.strip()
+        for templates in (chatbot_capt.RESPONSES, chatbot_capt.GENERAL_RESPONSES)
+        for by_language in templates.values()
+        for template in by_language.values()
+        for line in template.format(captain_name='').splitlines()
+        if len(line.strip()) > 3
+    ]
+    texts, labels = [], []
+    for i in range(size):
+        tokens = rng.choice(sentences).split()[:12]
+        if i % 2:
+            for _ in range(rng.randint(1, 2)):
+                tokens.insert(rng.randint(0, len(tokens)), rng.choice(bad_words))
+        texts.append(' '.join(tokens))
+        labels.append(i % 2)
+    return texts, labels
+
+
+def train_seed_model(path: str, dim: int = 1 << 18, **fit_options) -> SeverityScorer:
+    texts, labels = seed_training_set()
+    scorer = SeverityScorer(vectorizer=HashedNgramVectorizer(dim=dim)).fit(texts, labels, **fit_options)
+    scorer.save(path)
+    return scorer
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description='Hashed n-gram moderation severity scorer')
+    commands = parser.add_subparsers(dest='command', required=True)
+    train = commands.add_parser('train', help='train a seed model from the word lists and templates')
+    train.add_argument('path')
+    train.add_argument('--dim', type=int, default=1 << 18)
+    score = commands.add_parser('score', help='score messages with a weights file')
+    score.add_argument('path')
+    score.add_argument('messages', nargs='+')
+    args = parser.parse_args(argv)
+    if args.command == 'train':
+        train_seed_model(args.path, args.dim)
+        print(f"💾 weights written to {args.path}")
+    else:
+        scorer = SeverityScorer.load(args.path)
+        for message, (flagged, severity) in zip(args.messages, scorer.moderate(args.messages)):
+            print(f"{severity:.3f} {'🚫' if flagged else '  '} {message}")
+
+
+if __name__ == '__main__':
+    main()
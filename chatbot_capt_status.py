@@ -0,0 +1,194 @@
+"""
+🗂️ CAPTAIN SUPPORT CHATBOT - STATUS PROVIDERS
+=============================================
+Look up registration_status by captain id instead of asking every caller
+to fetch it first.
+
+A StatusProvider answers one lookup against the registration backend.
+StatusResolver sits in front of it and protects the backend during
+incidents:
+
+    - single-flight: concurrent lookups of one captain share one backend call
+    - short-TTL cache of statuses, plus a shorter TTL for unknown captains
+    - timeout: a slow backend answers 'system_delay' instead of blocking
+      the reply (the backend call keeps running and fills the cache)
+
+SQLiteStatusProvider is a local stand-in backend that queries a captains
+table on a bounded pool of connections.
+
+Usage:
+    provider = SQLiteStatusProvider('captains.sqlite', pool_size=4)
+    chatbot = chatbot_capt.CaptainSupportChatbot(status_resolver=StatusResolver(provider))
+    response = await chatbot.get_status_response_by_id('c-1042', 'Ahmed', 'arabic')
+"""
+
+import abc
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import chatbot_capt
+
+
+# ============================================
+# PROVIDERS
+# ============================================
+
+class StatusProvider(abc.ABC):
+    """
+    Interface of a registration-status backend.
+
+    fetch() returns the captain's registration_status, or None when the
+    captain id is unknown. Errors propagate to the resolver.
+    """
+
+    @abc.abstractmethod
+    async def fetch(self, captain_id: str) -> Optional[str]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStatusProvider(StatusProvider):
+    """
+    Stand-in backend: a SQLite captains(captain_id, registration_status) table.
+
+    Queries run on a pool of pool_size threads, each holding its own
+    connection, so at most pool_size connections exist and at most
+    pool_size queries run at once; further lookups queue. latency adds a
+    sleep per query to mimic a remote database.
+    """
+
+    QUERY = 'SELECT registration_status FROM captains WHERE captain_id = ?'
+
+    def __init__(self, path: str, pool_size: int = 4, latency: float = 0.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.latency = latency
+        self.queries = 0
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(pool_size, thread_name_prefix='status-db')
+
+    def _query(self, captain_id: str) -> Optional[str]:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, check_same_thread=False)
+        if self.latency:
+            time.sleep(self.latency)
+        self.queries += 1
+        row = connection.execute(self.QUERY, (captain_id,)).fetchone()
+        return row[0] if row else None
+
+    async def fetch(self, captain_id: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._query, captain_id)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def seed_database(path: str, rows: Iterable[Tuple[str, str]]) -> None:
+    """Create (or extend) the captains table from (captain_id, status) rows."""
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS captains ('
+            'captain_id TEXT PRIMARY KEY, registration_status TEXT NOT NULL)'
+        )
+        connection.executemany('INSERT OR REPLACE INTO captains VALUES (?, ?)', rows)
+    connection.close()
+
+
+# ============================================
+# RESOLVER
+# ============================================
+
+# Marks a backend call that raised (never cached)
+_FAILED = object()
+
+
+class StatusResolver:
+    """
+    Caching, coalescing front for a StatusProvider (one event loop).
+
+    resolve() returns the status, None for an unknown captain, or
+    fallback when the backend fails or takes longer than timeout.
+    Statuses are cached for ttl seconds, unknown captains for
+    negative_ttl; failures and timeouts are not cached, so the next
+    lookup after a failure tries the backend again.
+    """
+
+    def __init__(
+        self,
+        provider: StatusProvider,
+        ttl: float = 5.0,
+        negative_ttl: float = 1.0,
+        timeout: float = 0.25,
+        max_entries: int = 100_000,
+        fallback: str = 'system_delay'
+    ):
+        self.provider = provider
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.fallback = fallback
+        # captain_id -> (expires at, status or None)
+        self.cache = chatbot_capt.LRUCache(max_entries)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.lookups = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.backend_calls = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def resolve(self, captain_id: str) -> Optional[str]:
+        self.lookups += 1
+        entry = self.cache.get(captain_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        task = self._inflight.get(captain_id)
+        if task is None:
+            task = self._inflight[captain_id] = asyncio.ensure_future(self._fetch(captain_id))
+        else:
+            self.coalesced += 1
+        try:
+            # shield: a waiter timing out must not cancel the shared call
+            status = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return self.fallback
+        return self.fallback if status is _FAILED else status
+
+    async def _fetch(self, captain_id: str):
+        self.backend_calls += 1
+        try:
+            status = await self.provider.fetch(captain_id)
+        except Exception:
+            self.errors += 1
+            return _FAILED
+        finally:
+            del self._inflight[captain_id]
+        ttl = self.negative_ttl if status is None else self.ttl
+        self.cache.put(captain_id, (time.monotonic() + ttl, status))
+        return status
+
+    def invalidate(self, captain_id: Optional[str] = None) -> None:
+        """Forget one cached captain (after a status change) or all of them."""
+        if captain_id is None:
+            self.cache.clear()
+        else:
+            self.cache.put(captain_id, (0.0, None))  # already expired
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'lookups': self.lookups,
+            'cache_hits': self.hits,
+            'coalesced': self.coalesced,
+            'backend_calls': self.backend_calls,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+        }
@@ -0,0 +1,343 @@
+"""
+🧪 CAPTAIN SUPPORT CHATBOT - TESTS
+==================================
+Behaviour tests for chatbot_capt.
+
+Run:
+    python -m pytest -q
+"""
+
+import random
+import re
+
+import chatbot_capt
+
+
+def legacy_filter_text(words, text):
+    """The original one-regex-per-word masking loop."""
+    for word in words:
+        text = re.sub(rf'\b{re.escape(word)}\b', '***', text, flags=re.IGNORECASE | re.UNICODE)
+    return text
+
+
+def legacy_contains(words, text):
+    return any(re.search(rf'\b{re.escape(word)}\b', text, re.IGNORECASE | re.UNICODE) for word in words)
+
+
+# ============================================
+# SINGLE-PASS MATCHER
+# ============================================
+
+def test_filter_matches_legacy_loop_on_random_texts():
+    words_filter = chatbot_capt.BadWordsFilter(name_cache_size=0)
+    words = [word for lang_words in words_filter.bad_words.values() for word in lang_words]
+    tokens = words + [
+        'ya', 'el', 'ابن', 'ال', 'x', 'Ahmed', 'أحمد', 'SHIT', 'Ass', 'asshole', 'kelbs', '***',
+    ]
+    separators = ['', ' ', ' ', '  ', '.', ',', '-', '_']
+    rng = random.Random(1)
+    for _ in range(10000):
+        text = ''.join(
+            rng.choice(tokens) + rng.choice(separators) for _ in range(rng.randint(0, 8))
+        )
+        assert words_filter.filter_text(text) == legacy_filter_text(words, text), text
+        assert words_filter.contains_bad_words(text) == legacy_contains(words, text), text
+
+
+def test_matcher_matches_legacy_loop_on_random_word_lists():
+    # A tiny alphabet makes overlapping, nested and multi-word hits common
+    rng = random.Random(2)
+    alphabet = 'abc'
+
+    def token():
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 2)))
+
+    for _ in range(500):
+        words = [
+            ' '.join(token() for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 6))
+        ]
+        matcher = chatbot_capt.BadWordMatcher(words)
+        for _ in range(20):
+            text = ' '.join(
+                ''.join(rng.choice(alphabet + 'AB') for _ in range(rng.randint(1, 2)))
+                for _ in range(rng.randint(0, 8))
+            )
+            assert matcher.mask(text) == legacy_filter_text(words, text), (words, text)
+            assert matcher.search(text) == legacy_contains(words, text), (words, text)
+
+
+def test_matcher_handles_words_with_non_word_edges():
+    words = ['a.', '-b', 'c']
+    matcher = chatbot_capt.BadWordMatcher(words)
+    for text in ['a. b', 'x -b c', 'c-c', 'a.a. -b-b', '']:
+        assert matcher.mask(text) == legacy_filter_text(words, text)
+
+
+def test_clean_name_masks_and_truncates():
+    words_filter = chatbot_capt.BadWordsFilter()
+    assert words_filter.clean_name('Ahmed   damn  shit') == 'Ahmed *** ***'
+    # 'kelb' comes first in the list, so 'ya kelb' is never masked whole
+    assert words_filter.clean_name('ya kelb') == 'ya ***'
+    assert len(words_filter.clean_name('A' * 80)) == 50
+
+
+def test_name_cache_never_serves_names_cleaned_with_old_word_lists():
+    words_filter = chatbot_capt.BadWordsFilter()
+    assert words_filter.clean_name('Ahmed banana') == 'Ahmed banana'
+    old_matchers = words_filter.matchers
+    words_filter.set_bad_words('english', ['banana'])
+    # A clean_name call that started before set_bad_words() finishes after it
+    words_filter.name_cache.put('Ahmed banana', (old_matchers, 'Ahmed banana'))
+    assert words_filter.clean_name('Ahmed banana') == 'Ahmed ***'
+    assert words_filter.clean_name('Ahmed banana') == 'Ahmed ***'
+
+
+def test_chatbot_accepts_a_configured_filter():
+    plain = chatbot_capt.CaptainSupportChatbot()
+    normalized = chatbot_capt.CaptainSupportChatbot(
+        words_filter=chatbot_capt.BadWordsFilter(normalize=True, engines={'arabic': 'token'})
+    )
+    assert plain.get_status_response('Ahmed shiiit', 'english', 'approved').captain_name == 'Ahmed shiiit'
+    assert normalized.get_status_response('Ahmed shiiit', 'english', 'approved').captain_name == 'Ahmed ***'
+    assert normalized.get_status_response('أحمد والكلب', 'arabic', 'approved').captain_name == 'أحمد ***'
+
+
+# ============================================
+# TEMPLATES
+# ============================================
+
+def test_lazy_catalog_still_rejects_bad_placeholders():
+    import pytest
+
+    bot = chatbot_capt.CaptainSupportChatbot()
+    responses = {status: dict(by_language) for status, by_language in chatbot_capt.RESPONSES.items()}
+    responses['approved']['english'] = 'Hello {captian_name}'
+    with pytest.raises(ValueError, match='captian_name'):
+        bot.build_catalog(responses, chatbot_capt.GENERAL_RESPONSES)
+    catalog = bot.catalog
+    assert not catalog.templates['approved']  # nothing compiled until first use
+    message = bot.get_status_response('Ahmed', 'english', 'approved').message
+    assert message == chatbot_capt.RESPONSES['approved']['english'].format(captain_name='Ahmed')
+    catalog.compile_all()
+    assert set(catalog.general_templates['unknown']) == set(bot.VALID_LANGUAGES)
+
+
+# ============================================
+# BATCH API
+# ============================================
+
+def test_response_dicts_match_single_calls():
+    bot = chatbot_capt.CaptainSupportChatbot()
+    rows = [
+        ('Ahmed damn', 'english', 'approved'),
+        ('أحمد', 'ARABIC ', 'under_review'),
+        ('Ahmed damn', 'english', 'approved'),
+        ('Omar', 'klingon', 'nope'),
+    ]
+    for timestamp in (None, '2024-01-01T00:00:00'):
+        results = list(bot.iter_status_dicts(rows, timestamp=timestamp))
+        assert len({result['timestamp'] for result in results}) == 1
+        for row, result in zip(rows, results):
+            expected = bot.get_status_response(*row).to_dict()
+            del expected['timestamp'], result['timestamp']
+            assert result == expected
+    stamped = list(bot.iter_status_responses(rows, shared_timestamp=True))
+    assert [response.to_dict() for response in stamped] == list(
+        bot.iter_status_dicts(rows, timestamp=stamped[0].timestamp)
+    )
+
+
+# ============================================
+# RESPONSES
+# ============================================
+
+def test_response_fields_exclude_internal_handles():
+    import dataclasses
+    import json
+
+    bot = chatbot_capt.CaptainSupportChatbot(response_cache=chatbot_capt.ResponseCache())
+    for _ in range(2):
+        response = bot.get_status_response('Ahmed "7mar"', 'arabic', 'approved')
+        assert response.etag is not None
+        assert dataclasses.asdict(response) == response.to_dict()
+        assert json.loads(response.to_json_bytes()) == response.to_dict()
+
+
+# ============================================
+# INCIDENT LOG
+# ============================================
+
+def test_incident_log_uses_the_chatbot_filter(tmp_path):
+    import json
+
+    log = chatbot_capt.IncidentLog(str(tmp_path / 'incidents.jsonl'), flush_interval=0.01)
+    bot = chatbot_capt.CaptainSupportChatbot(incident_log=log)
+    bot.filter.set_bad_words('english', ['banana'])
+    bot.process_message('Ahmed', 'english', 'approved', 'you banana, damn')
+    log.close()
+    records = [json.loads(line) for line in (tmp_path / 'incidents.jsonl').read_text().splitlines()]
+    assert [record['matched_terms'] for record in records] == [['banana']]
+
+
+# ============================================
+# OBFUSCATION MATCHER
+# ============================================
+
+def obfuscation_matcher():
+    words_filter = chatbot_capt.BadWordsFilter()
+    return chatbot_capt.ObfuscationMatcher([word for words in words_filter.bad_words.values() for word in words])
+
+
+def test_obfuscation_matcher_sees_through_obfuscation():
+    matcher = obfuscation_matcher()
+    for text, masked in [
+        ('f.u.c.k you', '*** you'),
+        ('s h i t', '***'),
+        ('s-h-i-t!', '***!'),
+        ('a$$', '***'),
+        ('sh!t happens', '*** happens'),
+        ('fuuuck', '***'),
+        ('F\u200bU\u200bC\u200bK', '***'),
+        ('ｆｕｃｋ', '***'),
+        ('ك ل ب', '***'),
+        ('يا ك ل ب', 'يا ***'),
+        ('a s s, really', '***, really'),
+    ]:
+        assert matcher.mask(text) == masked, text
+
+
+def test_obfuscation_matcher_ignores_ordinary_text():
+    matcher = obfuscation_matcher()
+    for text in [
+        'he ll', 'as s', 'sh it happens', 'a s s e t', 'x f u c k', 'hello world',
+        'class assignment', 'sus pi ss', 'Hassan Ali',
+    ]:
+        assert matcher.mask(text) == text, text
+        assert not matcher.search(text), text
+
+
+# ============================================
+# SESSION STORE
+# ============================================
+
+def session_state(store):
+    """Every live session, least recently used first."""
+    symbols = store.symbols
+    return [
+        (
+            store.ids[slot], store.names[slot], symbols[store.languages[slot]], symbols[store.statuses[slot]],
+            symbols[store.intents[slot]], store.strikes[slot], store.seen[slot],
+        )
+        for slot in store._lru_order()
+    ]
+
+
+def test_session_store_evicts_least_recently_used():
+    store = chatbot_capt.SessionStore(max_sessions=3)
+    for captain_id in ('a', 'b', 'c'):
+        store.put(captain_id, captain_id.upper(), 'english', 'approved')
+    assert store.get('a').clean_name == 'A'  # touch: b is now the oldest
+    store.put('d', 'D')
+    assert 'b' not in store and [row[0] for row in session_state(store)] == ['c', 'a', 'd']
+    store.discard('a')
+    store.put('e', 'E')
+    store.put('c', 'C2')  # replacing a session also marks it recently used
+    store.put('f', 'F')
+    assert [row[0] for row in session_state(store)] == ['e', 'c', 'f']
+    assert store.get('c').clean_name == 'C2'
+    assert store.stats()['evictions'] == 2
+    assert len(store.ids) == 4  # the slot freed by discard was reused
+
+
+def test_session_store_lru_matches_a_reference_model():
+    from collections import OrderedDict
+
+    rng = random.Random(5)
+    store = chatbot_capt.SessionStore(max_sessions=8)
+    model = OrderedDict()
+    for step in range(5000):
+        captain_id = f'captain-{rng.randrange(20)}'
+        action = rng.random()
+        if action < 0.5:
+            store.put(captain_id, f'name {step}', rng.choice(['arabic', 'english', None]), 'approved')
+            model[captain_id] = f'name {step}'
+            model.move_to_end(captain_id)
+            while len(model) > 8:
+                model.popitem(last=False)
+        elif action < 0.85:
+            session = store.get(captain_id)
+            assert (session and session.clean_name) == model.get(captain_id)
+            if captain_id in model:
+                model.move_to_end(captain_id)
+        else:
+            store.discard(captain_id)
+            model.pop(captain_id, None)
+        assert [row[0] for row in session_state(store)] == list(model)
+        # Walking the list from the head gives the same order reversed
+        forward, slot = [], store.head
+        while slot != -1:
+            forward.append(store.ids[slot])
+            slot = store.next[slot]
+        assert forward == list(reversed(model))
+    assert store.bytes == sum(store._size(captain_id, name) for captain_id, name in model.items())
+
+
+def test_session_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'sessions.bin')
+    store = chatbot_capt.SessionStore()
+    for i in range(50):
+        store.put(f'captain-{i}', f'أحمد {i}' if i % 2 else f'Ahmed {i}', 'arabic', 'approved', 'greeting', i % 4)
+    store.get('captain-3')
+    store.discard('captain-7')
+    assert store.snapshot(path) == 49
+    restored = chatbot_capt.SessionStore.restore(path)
+    assert session_state(restored) == session_state(store)
+    assert restored.bytes == store.bytes
+    assert restored.get('captain-3').clean_name == 'أحمد 3'
+    restored.put('captain-new', 'New')
+    assert session_state(restored)[-1][0] == 'captain-new'
+
+    # A smaller store keeps the most recently used sessions
+    small = chatbot_capt.SessionStore.restore(path, max_sessions=10)
+    assert session_state(small) == session_state(store)[-10:]
+
+
+def test_session_snapshot_skips_expired_sessions(tmp_path):
+    path = str(tmp_path / 'sessions.bin')
+    store = chatbot_capt.SessionStore(ttl=60)
+    for captain_id in ('old', 'new'):
+        store.put(captain_id, captain_id)
+    store.seen[store.index['old']] -= 3600
+    store.snapshot(path)
+    restored = chatbot_capt.SessionStore.restore(path, ttl=60)
+    assert [row[0] for row in session_state(restored)] == ['new']
+
+
+# ============================================
+# RATE LIMITER
+# ============================================
+
+def test_rate_limiter_matches_statuses_like_the_chatbot():
+    limiter = chatbot_capt.RateLimiter(limits={'Approved': (1.0, 3.0)}, default=(1e6, 1e6))
+    assert [limiter.allow('captain-1', ' APPROVED ') for _ in range(4)] == [True, True, True, False]
+    assert all(limiter.allow('captain-2', 'under_review') for _ in range(100))
+
+
+def test_rate_limit_applies_per_captain_id():
+    bot = chatbot_capt.CaptainSupportChatbot(rate_limiter=chatbot_capt.RateLimiter(default=(1.0, 2.0)))
+    slow_down = chatbot_capt.SLOW_DOWN_RESPONSES['english']
+    replies = [bot.process_message('Ahmed', 'english', 'approved', captain_id='42') for _ in range(3)]
+    assert [reply == slow_down for reply in replies] == [False, False, True]
+    # Calls without an id are never limited: names are shared by many captains
+    assert all(bot.process_message('Ahmed', 'english', 'approved') != slow_down for _ in range(5))
+
+
+def test_get_captain_response_passes_the_captain_id(monkeypatch):
+    bot = chatbot_capt.CaptainSupportChatbot(rate_limiter=chatbot_capt.RateLimiter(default=(1.0, 1.0)))
+    monkeypatch.setattr(chatbot_capt, '_chatbot', bot)
+    assert chatbot_capt.get_captain_response('Ahmed', 'arabic', 'approved', captain_id='7') != (
+        chatbot_capt.SLOW_DOWN_RESPONSES['arabic']
+    )
+    assert chatbot_capt.get_captain_response('Ahmed', 'arabic', 'approved', captain_id='7') == (
+        chatbot_capt.SLOW_DOWN_RESPONSES['arabic']
+    )
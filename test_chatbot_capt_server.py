@@ -0,0 +1,136 @@
+"""
+🧪 CAPTAIN SUPPORT CHATBOT - HTTP SERVICE TESTS
+===============================================
+Requests go straight through the ASGI app (no sockets).
+
+Run:
+    python -m pytest -q
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+import chatbot_capt
+import chatbot_capt_server
+
+
+def request(app, method, path, body=b'', query=None, headers=()):
+    """Send one request through the ASGI app; returns (status, headers dict, body)."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': urlencode(query or {}).encode(), 'headers': list(headers),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, response = sent
+    return start['status'], dict(start['headers']), response['body']
+
+
+def post_message(app, data, headers=()):
+    return request(app, 'POST', '/api/captain/message', json.dumps(data).encode(), headers=headers)
+
+
+# ============================================
+# RATE LIMITING
+# ============================================
+
+def test_requests_with_a_captain_id_are_rate_limited():
+    bot = chatbot_capt.CaptainSupportChatbot(rate_limiter=chatbot_capt.RateLimiter(default=(1.0, 2.0)))
+    app = chatbot_capt_server.CaptainSupportApp(bot)
+    data = {'captain_name': 'Ahmed', 'language': 'english', 'registration_status': 'approved'}
+    statuses = [post_message(app, {**data, 'captain_id': '42'})[0] for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    status, _, body = post_message(app, {**data, 'captain_id': '42'})
+    assert json.loads(body)['message'] == chatbot_capt.SLOW_DOWN_RESPONSES['english']
+    assert [post_message(app, data)[0] for _ in range(5)] == [200] * 5
+
+
+# ============================================
+# CONDITIONAL REQUESTS
+# ============================================
+
+QUERY = {'captain_name': 'Ahmed', 'language': 'english', 'registration_status': 'approved'}
+
+
+def cached_app():
+    bot = chatbot_capt.CaptainSupportChatbot(response_cache=chatbot_capt.ResponseCache())
+    return chatbot_capt_server.CaptainSupportApp(bot)
+
+
+def test_weak_etag_ignores_the_timestamp():
+    bot = chatbot_capt.CaptainSupportChatbot(response_cache=chatbot_capt.ResponseCache(serialize=False))
+    first = bot.get_status_response('Ahmed', 'english', 'approved')
+    time.sleep(0.002)
+    bot.response_cache.clear()  # rendered and hashed again, with a new timestamp
+    second = bot.get_status_response('Ahmed', 'english', 'approved')
+    assert first.timestamp != second.timestamp
+    assert first.etag.startswith('W/"') and first.etag == second.etag
+    assert bot.get_status_response('Ahmed', 'arabic', 'approved').etag != first.etag
+
+
+def test_conditional_get_answers_304_without_body_headers():
+    app = cached_app()
+    status, headers, body = request(app, 'GET', '/api/captain/message', query=QUERY)
+    assert status == 200 and json.loads(body)['captain_name'] == 'Ahmed'
+    etag = headers[b'etag']
+    for if_none_match in (etag, etag.removeprefix(b'W/'), b'"other", ' + etag, b'*'):
+        status, headers, body = request(
+            app, 'GET', '/api/captain/message', query=QUERY, headers=[(b'if-none-match', if_none_match)]
+        )
+        assert (status, body) == (304, b'')
+        assert headers == {b'etag': etag}
+    status, _, _ = request(
+        app, 'GET', '/api/captain/message', query=QUERY, headers=[(b'if-none-match', b'W/"other"')]
+    )
+    assert status == 200
+
+
+def test_conditional_post_fails_the_precondition():
+    app = cached_app()
+    etag = post_message(app, QUERY)[1][b'etag']
+    status, headers, body = post_message(app, QUERY, headers=[(b'if-none-match', etag)])
+    assert status == 412 and headers[b'etag'] == etag
+    assert json.loads(body) == {'success': False, 'error': 'Precondition failed'}
+
+
+def test_replies_without_a_response_cache_carry_no_etag():
+    app = chatbot_capt_server.CaptainSupportApp(chatbot_capt.CaptainSupportChatbot())
+    status, headers, _ = request(app, 'GET', '/api/captain/message', query=QUERY, headers=[(b'if-none-match', b'*')])
+    assert status == 200 and b'etag' not in headers
+
+
+def test_stand_in_server_sends_304_without_content_length():
+    async def exchange():
+        server = chatbot_capt_server.StandInServer(cached_app())
+        sock = chatbot_capt_server.bind_socket('127.0.0.1', 0)
+        serving = asyncio.create_task(server.serve(sock))
+        await asyncio.sleep(0.05)
+        reader, writer = await asyncio.open_connection(*sock.getsockname())
+        target = '/api/captain/message?' + urlencode(QUERY)
+        writer.write(f'GET {target} HTTP/1.1\r\nhost: test\r\n\r\n'.encode())
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(next(
+            line.split(b':')[1] for line in head.split(b'\r\n') if line.lower().startswith(b'content-length')
+        ))
+        await reader.readexactly(length)
+        etag = next(line.split(b': ', 1)[1] for line in head.split(b'\r\n') if line.startswith(b'etag'))
+        writer.write(f'GET {target} HTTP/1.1\r\nhost: test\r\nif-none-match: {etag.decode()}\r\n\r\n'.encode())
+        head = await reader.readuntil(b'\r\n\r\n')
+        writer.close()
+        server.stop()
+        await serving
+        return head
+
+    lines = asyncio.run(exchange()).lower().split(b'\r\n')
+    assert lines[0] == b'http/1.1 304 not modified'
+    assert not any(line.startswith((b'content-length', b'content-type')) for line in lines)